@@ -0,0 +1,162 @@
+"""Агрегаты продаж по дням, ресторанам и блюдам (таблицы prodazhi_*).
+
+Заказ попадает в агрегаты в той же транзакции, в которой становится zavershen;
+аналитика читает только агрегаты, а не всю историю заказов. День продажи — дата
+завершения (data_zaversheniya), а не создания: корзина создаётся при первом
+просмотре и может ждать оформления неделями.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from database import insert_s_konfliktom
+from models import ArkhivPozitsii, ArkhivZakaza, Blyudo, PozitsiyaZakaza, ProdazhiBlyuda, ProdazhiRestorana, ProdazhiZaDen, StatusZakaza, Zakaz
+
+# Заказов за один проход пересчёта — память не растёт с размером истории
+RAZMER_PARTII = 1000
+# Строк в одном INSERT (лимит параметров SQLite)
+RAZMER_VSTAVKI = 1000
+
+
+def _zapros_pozitsij(zakaz=Zakaz, pozitsiya=PozitsiyaZakaza):
+    """Позиции заказов живых таблиц или (ArkhivZakaza, ArkhivPozitsii) — архива"""
+    return (
+        select(zakaz.id, zakaz.data_zaversheniya, Blyudo.restoran_id, pozitsiya.blyudo_id,
+               pozitsiya.kolichestvo, pozitsiya.cena_na_moment)
+        .join(pozitsiya, pozitsiya.zakaz_id == zakaz.id)
+        .join(Blyudo, Blyudo.id == pozitsiya.blyudo_id)
+    )
+
+
+async def _vstavit_s_dobavleniem(db, model, klyuch: list, polya: list, stroki: list[dict]):
+    """Upsert, который прибавляет значения полей к уже накопленным"""
+    for nachalo in range(0, len(stroki), RAZMER_VSTAVKI):
+        stmt = insert_s_konfliktom(model).values(stroki[nachalo:nachalo + RAZMER_VSTAVKI])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=klyuch,
+            set_={pole: getattr(model, pole) + getattr(stmt.excluded, pole) for pole in polya},
+        )
+        await db.execute(stmt)
+
+
+async def _dobavit(db, pozitsii, znak: int):
+    """Прибавляет (znak=1) или вычитает (znak=-1) позиции заказов из агрегатов.
+    Все позиции одного заказа должны прийти в одном вызове — иначе zakazov посчитается дважды."""
+    dni = defaultdict(lambda: [0.0, set(), 0])  # выручка, id заказов, штук
+    restorany = defaultdict(lambda: [0.0, set(), 0])
+    blyuda = {}
+    for zakaz_id, data_zaversheniya, restoran_id, blyudo_id, kolichestvo, cena in pozitsii:
+        den = data_zaversheniya.date()
+        vyruchka = kolichestvo * cena
+        for itog in (dni[den], restorany[(restoran_id, den)]):
+            itog[0] += vyruchka
+            itog[1].add(zakaz_id)
+            itog[2] += kolichestvo
+        b = blyuda.setdefault((blyudo_id, den), [restoran_id, 0.0, 0])
+        b[1] += vyruchka
+        b[2] += kolichestvo
+
+    if dni:
+        await _vstavit_s_dobavleniem(db, ProdazhiZaDen, ["den"], ["vyruchka", "zakazov", "pozitsij"], [
+            {"den": den, "vyruchka": znak * vyruchka, "zakazov": znak * len(zakazy), "pozitsij": znak * shtuk}
+            for den, (vyruchka, zakazy, shtuk) in dni.items()
+        ])
+        await _vstavit_s_dobavleniem(db, ProdazhiRestorana, ["restoran_id", "den"], ["vyruchka", "zakazov", "pozitsij"], [
+            {"restoran_id": restoran_id, "den": den, "vyruchka": znak * vyruchka,
+             "zakazov": znak * len(zakazy), "pozitsij": znak * shtuk}
+            for (restoran_id, den), (vyruchka, zakazy, shtuk) in restorany.items()
+        ])
+        await _vstavit_s_dobavleniem(db, ProdazhiBlyuda, ["blyudo_id", "den"], ["vyruchka", "kolichestvo"], [
+            {"blyudo_id": blyudo_id, "den": den, "restoran_id": restoran_id,
+             "vyruchka": znak * vyruchka, "kolichestvo": znak * shtuk}
+            for (blyudo_id, den), (restoran_id, vyruchka, shtuk) in blyuda.items()
+        ])
+
+
+async def uchest_zakaz(db, zakaz_id: int, znak: int = 1):
+    """Вызывать в транзакции перехода заказа в zavershen (znak=1).
+    Отмена уже завершённого заказа (возврат) — тот же вызов с znak=-1; отмена
+    незавершённого заказа агрегаты не меняет: они его ещё не учитывали."""
+    pozitsii = (await db.execute(_zapros_pozitsij().where(Zakaz.id == zakaz_id))).all()
+    await _dobavit(db, pozitsii, znak)
+
+
+_TABLICY = ((Zakaz, PozitsiyaZakaza), (ArkhivZakaza, ArkhivPozitsii))
+
+
+def _nachalo_dnya(den: date) -> datetime:
+    return datetime.combine(den, datetime.min.time())
+
+
+async def _sleduyushchij_den(engine, ne_ranshe: datetime) -> date | None:
+    """Ближайший день с завершёнными заказами (живыми или в архиве) — по индексу
+    (status, data_zaversheniya), без чтения самих заказов"""
+    vremena = []
+    async with engine.connect() as conn:
+        for zakaz, _ in _TABLICY:
+            vremya = await conn.scalar(
+                select(zakaz.data_zaversheniya)
+                .where(zakaz.status == StatusZakaza.zavershen, zakaz.data_zaversheniya >= ne_ranshe)
+                .order_by(zakaz.data_zaversheniya).limit(1)
+            )
+            if vremya is not None:
+                vremena.append(vremya)
+    return min(vremena).date() if vremena else None
+
+
+async def _pereschitat_den(engine, den: date) -> int:
+    """Одна транзакция на день: агрегаты дня удаляются и собираются заново.
+    Первая команда — запись: в SQLite транзакция сразу берёт блокировку, и заказ,
+    завершённый параллельно, учитывается либо здесь, либо своим uchest_zakaz — не дважды"""
+    vsego = 0
+    async with engine.begin() as conn:
+        for model in (ProdazhiZaDen, ProdazhiRestorana, ProdazhiBlyuda):
+            await conn.execute(delete(model).where(model.den == den))
+        for zakaz, pozitsiya in _TABLICY:
+            id_zakazov = (await conn.scalars(select(zakaz.id).where(
+                zakaz.status == StatusZakaza.zavershen,
+                zakaz.data_zaversheniya >= _nachalo_dnya(den),
+                zakaz.data_zaversheniya < _nachalo_dnya(den + timedelta(days=1)),
+            ))).all()
+            for nachalo in range(0, len(id_zakazov), RAZMER_PARTII):
+                pozitsii = (await conn.execute(_zapros_pozitsij(zakaz, pozitsiya).where(
+                    zakaz.id.in_(id_zakazov[nachalo:nachalo + RAZMER_PARTII])))).all()
+                await _dobavit(conn, pozitsii, 1)
+            vsego += len(id_zakazov)
+    return vsego
+
+
+async def pereschitat(engine) -> int:
+    """Пересчёт агрегатов из истории (живые заказы и архив), по транзакции на день:
+    блокировка записи держится не дольше пересчёта одного дня. Не запускать
+    одновременно с arkhiv.py: заказ, перенесённый посреди пересчёта, может выпасть"""
+    dni = set()
+    vsego = 0
+    den = await _sleduyushchij_den(engine, datetime.min)
+    while den is not None:
+        vsego += await _pereschitat_den(engine, den)
+        dni.add(den)
+        den = await _sleduyushchij_den(engine, _nachalo_dnya(den + timedelta(days=1)))
+
+    # Дни, от которых в истории не осталось заказов
+    async with engine.begin() as conn:
+        for model in (ProdazhiZaDen, ProdazhiRestorana, ProdazhiBlyuda):
+            lishnie = set((await conn.scalars(select(model.den).distinct())).all()) - dni
+            if lishnie:
+                await conn.execute(delete(model).where(model.den.in_(lishnie)))
+    return vsego
+
+
+if __name__ == "__main__":
+    # Пересчитать агрегаты из истории (после обновления или при расхождении): python analitika.py
+    from database import engine
+    from migratsii import podgotovit_skhemu
+
+    async def _main():
+        await podgotovit_skhemu(engine)
+        print(f"Zakazov uchteno: {await pereschitat(engine)}")
+        await engine.dispose()
+
+    asyncio.run(_main())
@@ -0,0 +1,94 @@
+"""Перенос старых завершённых и отменённых заказов в архивные таблицы.
+
+Живые запросы (корзина, свободные заказы, заказы курьера) смотрят только на
+незавершённые статусы; история только растёт. Архивация держит zakazy и
+pozitsii_zakaza маленькими: их индексы остаются в кэше страниц.
+
+id сохраняются, поэтому живые таблицы не выдают их повторно: в SQLite они с
+AUTOINCREMENT (models.py), в PostgreSQL последовательности и так не откатываются.
+
+Запуск: python arkhiv.py (порог — ARKHIV_POSLE_DNEJ дней от завершения или отмены заказа).
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from models import ArkhivPozitsii, ArkhivZakaza, PozitsiyaZakaza, StatusZakaza, Zakaz
+
+ARKHIV_POSLE_DNEJ = int(os.getenv("ARKHIV_POSLE_DNEJ", "90"))
+# Заказов в одной транзакции: блокировка записи держится недолго
+RAZMER_PARTII = 1000
+
+KONECHNYE_STATUSY = (StatusZakaza.zavershen, StatusZakaza.otmenen)
+
+_KOLONKI_ZAKAZA = ["id", "polzovatel_id", "kurer_id", "status", "data_sozdaniya",
+                   "adres_dostavki", "summa", "podtverzhden_polzovatelem", "data_zaversheniya"]
+_KOLONKI_POZITSII = ["id", "zakaz_id", "blyudo_id", "kolichestvo", "cena_na_moment"]
+
+
+def _kolonki(model, imena: list[str]):
+    return [getattr(model, imya) for imya in imena]
+
+
+async def _perenesti_partiyu(engine: AsyncEngine, id_partii: list[int]):
+    """Одна транзакция: копия в архив и удаление из живых таблиц. Первая команда —
+    запись, поэтому в SQLite транзакция сразу ждёт блокировку, а не упирается в неё
+    посреди работы"""
+    async with engine.begin() as conn:
+        await conn.execute(insert(ArkhivZakaza).from_select(
+            _KOLONKI_ZAKAZA, select(*_kolonki(Zakaz, _KOLONKI_ZAKAZA)).where(Zakaz.id.in_(id_partii))))
+        await conn.execute(insert(ArkhivPozitsii).from_select(
+            _KOLONKI_POZITSII, select(*_kolonki(PozitsiyaZakaza, _KOLONKI_POZITSII))
+            .where(PozitsiyaZakaza.zakaz_id.in_(id_partii))))
+        await conn.execute(delete(PozitsiyaZakaza).where(PozitsiyaZakaza.zakaz_id.in_(id_partii)))
+        await conn.execute(delete(Zakaz).where(Zakaz.id.in_(id_partii)))
+
+
+async def arkhivirovat(engine: AsyncEngine, posle_dnej: int = ARKHIV_POSLE_DNEJ,
+                       razmer_partii: int = RAZMER_PARTII) -> int:
+    """Переносит заказы, завершённые или отменённые больше posle_dnej дней назад;
+    возвращает их число. Живая таблица читается по первичному ключу окнами по
+    razmer_partii заказов — один проход по старой части без сортировок."""
+    granitsa = datetime.utcnow() - timedelta(days=posle_dnej)
+    vsego, posle_id = 0, 0
+    while True:
+        # Конечные статусы больше не меняются, поэтому окно читается вне транзакции переноса
+        async with engine.connect() as conn:
+            okno = (await conn.execute(
+                select(Zakaz.id, Zakaz.status, Zakaz.data_sozdaniya, Zakaz.data_zaversheniya)
+                .where(Zakaz.id > posle_id)
+                .order_by(Zakaz.id).limit(razmer_partii)
+            )).all()
+        # id растёт вместе с data_sozdaniya, а завершается заказ не раньше создания:
+        # дальше первого заказа, созданного после границы, переносить нечего
+        svezhij = next((i for i, stroka in enumerate(okno)
+                        if stroka.data_sozdaniya is not None and stroka.data_sozdaniya >= granitsa), None)
+        if svezhij is not None:
+            okno = okno[:svezhij]
+        id_partii = [
+            stroka.id for stroka in okno
+            if stroka.status in KONECHNYE_STATUSY
+            # Без времени завершения (заказы до его появления) — по дате создания
+            and (stroka.data_zaversheniya or stroka.data_sozdaniya or granitsa) < granitsa
+        ]
+        if id_partii:
+            await _perenesti_partiyu(engine, id_partii)
+            vsego += len(id_partii)
+        if svezhij is not None or len(okno) < razmer_partii:
+            return vsego
+        posle_id = okno[-1].id
+
+
+if __name__ == "__main__":
+    from database import engine
+    from migratsii import podgotovit_skhemu
+
+    async def _main():
+        await podgotovit_skhemu(engine)
+        print(f"Zakazov perenseno v arkhiv: {await arkhivirovat(engine)}")
+        await engine.dispose()
+
+    asyncio.run(_main())
@@ -1,46 +1,70 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from models import Polzovatel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Polzovatel, RolPolzovatelya
 from database import get_db
+from paroli import hash_password_async, verify_and_update_async
+from kesh import TTLKesh
 
 SECRET_KEY = "super-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Сколько секунд данные пользователя живут в кэше (ограничивает устаревание между воркерами)
+KESH_POLZOVATELEJ_TTL = 60
+KESH_POLZOVATELEJ_RAZMER = 10_000
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+@dataclass(frozen=True)
+class TekushchijPolzovatel:
+    """Данные авторизованного пользователя, достаточные для проверки прав"""
+    id: int
+    username: str
+    rol: RolPolzovatelya
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# username -> TekushchijPolzovatel
+_kesh_polzovatelej = TTLKesh(KESH_POLZOVATELEJ_RAZMER, KESH_POLZOVATELEJ_TTL)
+
+def sbrosit_kesh_polzovatelya(username: str):
+    """Вызывать при изменении роли или удалении пользователя"""
+    _kesh_polzovatelej.udalit(username)
 
 def create_access_token(data: dict):
+    from jose import jwt  # ~30 мс импорта (cryptography) — не при старте, а при первом запросе
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_polzovatel(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def sub_iz_tokena(token: str) -> str | None:
+    """sub из токена с проверенной подписью и сроком действия; None — токен недействителен"""
+    from jose import JWTError, jwt
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+async def get_current_polzovatel(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> TekushchijPolzovatel:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Ne udalos proverit uchetnye dannye",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    username = sub_iz_tokena(token)
+    if username is None:
         raise credentials_exception
 
-    polzovatel = db.query(Polzovatel).filter(Polzovatel.username == username).first()
+    tekushchij = _kesh_polzovatelej.poluchit(username)
+    if tekushchij is not None:
+        return tekushchij
+
+    polzovatel = await db.scalar(select(Polzovatel).where(Polzovatel.username == username))
     if polzovatel is None:
         raise credentials_exception
-    return polzovatel
\ No newline at end of file
+    tekushchij = TekushchijPolzovatel(id=polzovatel.id, username=polzovatel.username, rol=polzovatel.rol)
+    _kesh_polzovatelej.polozhit(username, tekushchij)
+    return tekushchij
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""Нагрузочные тесты и микробенчмарки API.
+
+    python -m benchmark zapolnit --masshtab small --baza /tmp/bench.db
+    python -m benchmark zapustit --baza /tmp/bench.db --rezhim inprocess
+    python -m benchmark zapustit --baza /tmp/bench.db --rezhim uvicorn --baseline benchmark/baseline.json
+"""
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+# Модули приложения импортируются только после того, как задан DATABASE_URL:
+# database.engine создаётся при импорте
+MASSHTABY = ["small", "medium", "large"]
+
+def _url_bazy(baza: str) -> str:
+    """Путь к файлу SQLite или готовый URL (например, postgresql+asyncpg://...)"""
+    if "://" in baza:
+        return baza
+    return f"sqlite+aiosqlite:///{os.path.abspath(baza)}"
+
+def percentil(znacheniya: list[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    uporyadocheno = sorted(znacheniya)
+    return uporyadocheno[max(0, min(len(uporyadocheno) - 1, round(p / 100 * len(uporyadocheno)) - 1))]
+
+def otchet(stat, dlitelnost: float) -> dict:
+    rezultat = {}
+    for imya, zaderzhki in sorted(stat.zaderzhki.items()):
+        rezultat[imya] = {
+            "zaprosov": len(zaderzhki),
+            "oshibok": stat.oshibki.get(imya, 0),
+            "rps": len(zaderzhki) / dlitelnost,
+            "p50_ms": percentil(zaderzhki, 50) * 1000,
+            "p95_ms": percentil(zaderzhki, 95) * 1000,
+            "p99_ms": percentil(zaderzhki, 99) * 1000,
+        }
+    vsego = sum(len(z) for z in stat.zaderzhki.values())
+    rezultat["_itogo"] = {"zaprosov": vsego, "rps": vsego / dlitelnost, "sekund": dlitelnost}
+    return rezultat
+
+def napechatat(rezultat: dict):
+    print(f"{'endpoint':45} {'n':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for imya, r in rezultat.items():
+        if imya.startswith("_"):
+            continue
+        print(f"{imya:45} {r['zaprosov']:>7} {r['oshibok']:>5} {r['rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+    itogo = rezultat["_itogo"]
+    print(f"\nитого: {itogo['zaprosov']} запросов за {itogo['sekund']:.1f} с, {itogo['rps']:.1f} rps")
+
+def sravnit_s_baseline(rezultat: dict, baseline: dict, dopusk: float) -> list[str]:
+    """Список регрессий: p95 вырос или общая пропускная способность упала больше допуска"""
+    regressii = []
+    for imya, bazovyj in baseline.items():
+        tekushchij = rezultat.get(imya)
+        if tekushchij is None:
+            continue
+        if imya == "_itogo":
+            if tekushchij["rps"] < bazovyj["rps"] * (1 - dopusk):
+                regressii.append(f"rps: {tekushchij['rps']:.1f} < {bazovyj['rps']:.1f}")
+        elif tekushchij["p95_ms"] > bazovyj["p95_ms"] * (1 + dopusk):
+            regressii.append(f"{imya} p95: {tekushchij['p95_ms']:.2f} ms > {bazovyj['p95_ms']:.2f} ms")
+        elif tekushchij["oshibok"] > bazovyj["oshibok"]:
+            regressii.append(f"{imya}: {tekushchij['oshibok']} ошибок 5xx")
+    return regressii
+
+async def _nagruzka(klient: httpx.AsyncClient, args, parametry: dict):
+    from benchmark.scenarii import Kontekst, Statistika, virtualnyj_polzovatel
+
+    stat = Statistika()
+    konteksty = [Kontekst(parametry, seed=args.seed + i) for i in range(args.parallelno)]
+    nachalo = time.perf_counter()
+    await asyncio.gather(*(virtualnyj_polzovatel(klient, ktx, stat, args.iteratsii) for ktx in konteksty))
+    return otchet(stat, time.perf_counter() - nachalo)
+
+async def _v_protsesse(args, parametry: dict) -> dict:
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as klient:
+            return await _nagruzka(klient, args, parametry)
+
+async def _pod_uvicorn(args, parametry: dict) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+        env={**os.environ, "DATABASE_URL": _url_bazy(args.baza)},
+    )
+    try:
+        limity = httpx.Limits(max_connections=args.parallelno)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limity, timeout=60) as klient:
+            for _ in range(100):
+                try:
+                    await klient.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            return await _nagruzka(klient, args, parametry)
+    finally:
+        server.terminate()
+        server.wait()
+
+async def _plany() -> list[str]:
+    """Планы SQL, которые роутеры выполняют на горячих маршрутах (база из zapolnit)"""
+    from auth import create_access_token
+    from benchmark.dannye import imya_kurera, imya_polzovatelya
+    from benchmark.plany import proverit_plany
+    from main import app
+
+    zagolovki = {
+        kto: {"Authorization": f"Bearer {create_access_token({'sub': imya})}"}
+        for kto, imya in (("klient", imya_polzovatelya(1)), ("kurer", imya_kurera(1)))
+    }
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as klient:
+            return await proverit_plany(klient, zagolovki)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmark")
+    komandy = parser.add_subparsers(dest="komanda", required=True)
+
+    p = komandy.add_parser("zapolnit", help="создать базу с синтетическими данными")
+    p.add_argument("--baza", required=True)
+    p.add_argument("--masshtab", choices=MASSHTABY, default="small")
+    p.add_argument("--seed", type=int, default=42)
+
+    p = komandy.add_parser("zapustit", help="прогнать сценарии и вывести задержки по эндпоинтам")
+    p.add_argument("--baza", required=True, help="база, заполненная командой zapolnit")
+    p.add_argument("--masshtab", choices=MASSHTABY, default="small", help="масштаб, с которым заполнялась база")
+    p.add_argument("--rezhim", choices=["inprocess", "uvicorn"], default="inprocess")
+    p.add_argument("--parallelno", type=int, default=20, help="число виртуальных пользователей")
+    p.add_argument("--iteratsii", type=int, default=20, help="сценариев на пользователя")
+    p.add_argument("--port", type=int, default=8077)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--baseline", help="JSON с прошлым результатом для сравнения")
+    p.add_argument("--sokhranit-baseline", action="store_true", help="записать результат в --baseline")
+    p.add_argument("--dopusk", type=float, default=0.2, help="допустимое ухудшение (0.2 = 20%%)")
+
+    p = komandy.add_parser("plany", help="EXPLAIN QUERY PLAN SQL горячих маршрутов; код выхода 1 при полном проходе или сортировке")
+    p.add_argument("--baza", required=True)
+
+    p = komandy.add_parser("import", help="время import main и его побочные эффекты; код выхода 1 сверх бюджета")
+    p.add_argument("--byudzhet-ms", type=float, default=1000, help="допустимая медиана времени импорта")
+    p.add_argument("--povtorov", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.komanda == "import":
+        from benchmark.import_main import proverit_import
+
+        mediana, oshibki = proverit_import(args.byudzhet_ms, args.povtorov)
+        print(f"import main: {mediana:.0f} ms (медиана из {args.povtorov})")
+        if oshibki:
+            print("\nНАРУШЕНИЯ:\n  " + "\n  ".join(oshibki))
+            sys.exit(1)
+        return
+
+    os.environ["DATABASE_URL"] = _url_bazy(args.baza)
+    # Все виртуальные клиенты приходят с одного адреса — лимиты на клиента мерили бы сами себя
+    os.environ.setdefault("OGRANICHENIYA", "0")
+    from benchmark import dannye
+
+    if args.komanda == "zapolnit":
+        if "://" not in args.baza and os.path.exists(args.baza):
+            sys.exit(f"{args.baza} уже существует")
+        nachalo = time.perf_counter()
+        asyncio.run(dannye.zapolnit(_url_bazy(args.baza), args.masshtab, args.seed))
+        print(f"{args.baza}: {dannye.MASSHTABY[args.masshtab]} за {time.perf_counter() - nachalo:.1f} с")
+        return
+
+    if args.komanda == "plany":
+        from database import ETO_SQLITE, engine
+        if not ETO_SQLITE:
+            sys.exit("plany: EXPLAIN QUERY PLAN проверяется только на SQLite")
+        oshibki = asyncio.run(_plany())
+        if oshibki:
+            print("\nПОЛНЫЙ ПРОХОД ИЛИ СОРТИРОВКА:\n  " + "\n  ".join(oshibki))
+            sys.exit(1)
+        return
+
+    parametry = dannye.MASSHTABY[args.masshtab]
+    zapusk = _v_protsesse if args.rezhim == "inprocess" else _pod_uvicorn
+    rezultat = asyncio.run(zapusk(args, parametry))
+    napechatat(rezultat)
+
+    if args.baseline and args.sokhranit_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(rezultat, f, indent=2, ensure_ascii=False)
+        print(f"baseline записан в {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressii = sravnit_s_baseline(rezultat, json.load(f), args.dopusk)
+        if regressii:
+            print("\nРЕГРЕССИИ:\n  " + "\n  ".join(regressii))
+            sys.exit(1)
+        print("регрессий нет")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Синтетические данные в форме data/food.db заданного масштаба"""
+import random
+from datetime import datetime, timedelta
+
+from passlib.context import CryptContext
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from analitika import pereschitat
+from migratsii import podgotovit_skhemu
+from models import Polzovatel, Restoran, Blyudo, Zakaz, PozitsiyaZakaza, RolPolzovatelya, StatusZakaza
+
+PAROL = "parol"
+
+# restorany, blyud na restoran, polzovatelej, kurerov, istoricheskikh zakazov
+MASSHTABY = {
+    "small": dict(restorany=20, blyuda_na_restoran=30, polzovateli=200, kurery=20, zakazy=2_000),
+    "medium": dict(restorany=200, blyuda_na_restoran=50, polzovateli=5_000, kurery=200, zakazy=100_000),
+    "large": dict(restorany=1_000, blyuda_na_restoran=100, polzovateli=50_000, kurery=1_000, zakazy=1_000_000),
+}
+
+RAZMER_PARTII = 5_000
+
+SLOVA = ["plov", "lagman", "manty", "shashlyk", "borshch", "salat", "pitstsa", "burger", "sup", "lepeshka",
+         "kurinyj", "govyazhij", "ostryj", "domashnij", "s syrom", "s zelenyu", "na uglyakh", "firmennyj"]
+
+def imya_polzovatelya(i: int) -> str:
+    return f"klient{i}"
+
+def imya_kurera(i: int) -> str:
+    return f"kurer{i}"
+
+async def _vstavit(conn, model, stroki):
+    for nachalo in range(0, len(stroki), RAZMER_PARTII):
+        await conn.execute(insert(model), stroki[nachalo:nachalo + RAZMER_PARTII])
+
+async def zapolnit(url: str, masshtab: str = "small", seed: int = 42):
+    """Создаёт схему и заполняет базу; возвращает параметры масштаба"""
+    parametry = MASSHTABY[masshtab]
+    rnd = random.Random(seed)
+    engine = create_async_engine(url)
+    await podgotovit_skhemu(engine)
+
+    # Один дешёвый хэш на всех — заполнение не должно упираться в bcrypt
+    hashed = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(PAROL)
+
+    async with engine.begin() as conn:
+        await _vstavit(conn, Restoran, [
+            {"id": r, "nazvanie": f"Restoran {r} {rnd.choice(SLOVA)}", "adres": f"ulitsa {r}", "opisanie": " ".join(rnd.sample(SLOVA, 4))}
+            for r in range(1, parametry["restorany"] + 1)
+        ])
+
+        blyuda = []
+        for r in range(1, parametry["restorany"] + 1):
+            for _ in range(parametry["blyuda_na_restoran"]):
+                blyuda.append({
+                    "id": len(blyuda) + 1, "restoran_id": r, "cena": float(rnd.randrange(100, 3000, 10)),
+                    "nazvanie": " ".join(rnd.sample(SLOVA, 2)), "opisanie": " ".join(rnd.sample(SLOVA, 6)),
+                })
+        await _vstavit(conn, Blyudo, blyuda)
+
+        polzovateli = [{"id": i, "username": imya_polzovatelya(i), "hashed_password": hashed, "rol": RolPolzovatelya.polzovatel}
+                       for i in range(1, parametry["polzovateli"] + 1)]
+        polzovateli += [{"id": parametry["polzovateli"] + i, "username": imya_kurera(i), "hashed_password": hashed, "rol": RolPolzovatelya.kurer}
+                        for i in range(1, parametry["kurery"] + 1)]
+        polzovateli.append({"id": len(polzovateli) + 1, "username": "admin", "hashed_password": hashed, "rol": RolPolzovatelya.admin})
+        await _vstavit(conn, Polzovatel, polzovateli)
+
+        # История: завершённые заказы за последний год
+        nachalo = datetime.utcnow() - timedelta(days=365)
+        zakazy, pozitsii = [], []
+        for z in range(1, parametry["zakazy"] + 1):
+            kurer_id = parametry["polzovateli"] + rnd.randint(1, parametry["kurery"])
+            summa = 0.0
+            for blyudo in rnd.sample(blyuda, rnd.randint(1, 5)):
+                kolichestvo = rnd.randint(1, 3)
+                summa += blyudo["cena"] * kolichestvo
+                pozitsii.append({"zakaz_id": z, "blyudo_id": blyudo["id"], "kolichestvo": kolichestvo, "cena_na_moment": blyudo["cena"]})
+            data_sozdaniya = nachalo + timedelta(seconds=z * 31_536_000 // parametry["zakazy"])
+            zakazy.append({
+                "id": z, "polzovatel_id": rnd.randint(1, parametry["polzovateli"]), "kurer_id": kurer_id,
+                "status": StatusZakaza.zavershen, "data_sozdaniya": data_sozdaniya,
+                "adres_dostavki": f"dom {z}", "summa": summa, "podtverzhden_polzovatelem": True,
+                "data_zaversheniya": data_sozdaniya + timedelta(minutes=45),
+            })
+            if len(pozitsii) >= RAZMER_PARTII:
+                await _vstavit(conn, Zakaz, zakazy)
+                await _vstavit(conn, PozitsiyaZakaza, pozitsii)
+                zakazy, pozitsii = [], []
+        await _vstavit(conn, Zakaz, zakazy)
+        await _vstavit(conn, PozitsiyaZakaza, pozitsii)
+
+        if conn.dialect.name == "postgresql":
+            # id вставлены явно — сдвигаем последовательности, иначе новые строки получат занятые id
+            for model in (Restoran, Blyudo, Polzovatel, Zakaz, PozitsiyaZakaza):
+                tablica = model.__tablename__
+                await conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{tablica}', 'id'), (SELECT MAX(id) FROM {tablica}))")
+
+    # Исторические заказы вставлены напрямую — агрегаты аналитики считаем из них
+    await pereschitat(engine)
+    await engine.dispose()
+    return parametry
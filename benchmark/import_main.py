@@ -0,0 +1,53 @@
+"""Проверка старта: время импорта main и отсутствие побочных эффектов.
+
+Каждый замер — отдельный процесс с `python -X importtime -c "import main"`,
+чтобы модули не оставались в кэше между замерами. Импорт не должен создавать
+базу и не должен тянуть модули, которые нужны только в запросах или в пуле bcrypt.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Импортируются лениво: jose — при первой проверке токена, passlib/bcrypt — в процессах пула
+ZAPRESHCHENNYE_MODULI = ("jose", "passlib", "bcrypt", "PIL")
+
+
+def _zamer(kornevaya_papka: str, url_bazy: str) -> tuple[float, set[str]]:
+    """(мс на import main, имена загруженных модулей верхнего уровня)"""
+    protsess = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=kornevaya_papka, env={**os.environ, "DATABASE_URL": url_bazy},
+        capture_output=True, text=True, check=True,
+    )
+    moduli, vremya_mks = set(), 0
+    for stroka in protsess.stderr.splitlines():
+        if not stroka.startswith("import time:") or "|" not in stroka:
+            continue
+        _, summarno, imya = stroka.split("|")
+        if not summarno.strip().isdigit():
+            continue  # заголовок таблицы
+        imya = imya.strip()
+        moduli.add(imya.split(".")[0])
+        if imya == "main":
+            vremya_mks = int(summarno)
+    return vremya_mks / 1000, moduli
+
+
+def proverit_import(byudzhet_ms: float, povtorov: int = 5) -> tuple[float, list[str]]:
+    """(медиана мс, список нарушений)"""
+    kornevaya_papka = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as papka:
+        baza = os.path.join(papka, "import.db")
+        zamery = [_zamer(kornevaya_papka, f"sqlite+aiosqlite:///{baza}") for _ in range(povtorov)]
+        oshibki = []
+        if os.path.exists(baza):
+            oshibki.append("import main создал файл базы")
+
+    mediana = statistics.median(ms for ms, _ in zamery)
+    if mediana > byudzhet_ms:
+        oshibki.append(f"import main: {mediana:.0f} ms > {byudzhet_ms:.0f} ms")
+    zagruzheny = set.union(*(moduli for _, moduli in zamery))
+    oshibki += [f"import main загрузил {imya}" for imya in ZAPRESHCHENNYE_MODULI if imya in zagruzheny]
+    return mediana, oshibki
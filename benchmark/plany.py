@@ -0,0 +1,72 @@
+"""Проверка планов запросов: EXPLAIN QUERY PLAN для горячих маршрутов.
+
+Запросы не переписываются вручную: команды, которые роутеры выполняют на
+маршрутах из MARSHRUTY, перехватываются и повторяются через EXPLAIN QUERY PLAN
+с теми же параметрами. Этим же пользуется tests/test_plany.py.
+Ошибка — полный проход по таблице (SCAN без индекса) и сортировка во временном
+B-дереве (USE TEMP B-TREE): индекс из models.py не создан или запрос перестал
+под него подходить.
+"""
+import re
+
+import httpx
+from sqlalchemy import event
+
+from database import Base, engine
+from menyu_kesh import uvelichit_versiyu
+
+# (URL, чей токен: "klient", "kurer" или None)
+MARSHRUTY = [
+    ("/zakazy/", "klient"),
+    ("/zakazy/?do_id=1000000", "klient"),
+    ("/zakazy/?status=zavershen", "klient"),
+    ("/zakazy/?status=oformlen", "klient"),
+    ("/zakazy/korzina", "klient"),
+    ("/zakazy/dostupnye-dlya-dostavki", "kurer"),
+    ("/zakazy/moi-zakazy", "kurer"),
+    ("/blyuda/?restoran_id=1", None),
+    ("/blyuda/?posle_id=1", None),
+    ("/restorany/?posle_id=1", None),
+]
+
+_POLNYJ_PROKHOD = re.compile(r"^SCAN (\w+)$")
+
+def plokhoj_shag(shag: str) -> bool:
+    # SCAN подзапроса (co-routine) — чтение уже отобранных строк, не таблицы
+    prokhod = _POLNYJ_PROKHOD.match(shag)
+    return "USE TEMP B-TREE" in shag or bool(prokhod and prokhod[1] in Base.metadata.tables)
+
+async def plany_marshruta(klient: httpx.AsyncClient, url: str, zagolovki: dict | None) -> list[tuple[str, list[str]]]:
+    """(SQL, план) для каждой команды, выполненной при GET url"""
+    # Первый запрос кладёт пользователя в кэш авторизации, сброс версии — мимо кэша меню
+    await klient.get(url, headers=zagolovki)
+    uvelichit_versiyu()
+    komandy = []
+
+    def zapisat(conn, cursor, statement, parameters, context, executemany):
+        komandy.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", zapisat)
+    try:
+        otvet = await klient.get(url, headers=zagolovki)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", zapisat)
+    otvet.raise_for_status()
+
+    plany = []
+    async with engine.connect() as conn:
+        for statement, parameters in komandy:
+            plan = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)).all()
+            plany.append((" ".join(statement.split()), [stroka[3] for stroka in plan]))
+    return plany
+
+async def proverit_plany(klient: httpx.AsyncClient, zagolovki: dict) -> list[str]:
+    """Печатает планы маршрутов и возвращает плохие шаги.
+    zagolovki — заголовки авторизации по ролям из MARSHRUTY."""
+    oshibki = []
+    for url, kto in MARSHRUTY:
+        print(url)
+        for sql, plan in await plany_marshruta(klient, url, zagolovki.get(kto)):
+            print(f"  {sql[:200]}\n    " + "\n    ".join(plan))
+            oshibki += [f"{url}: {shag}: {sql[:200]}" for shag in plan if plokhoj_shag(shag)]
+    return oshibki
@@ -0,0 +1,100 @@
+"""Сценарии нагрузки: просмотр меню, корзина и оформление, доставка курьером, вход"""
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+from auth import create_access_token
+from benchmark.dannye import PAROL, imya_polzovatelya, imya_kurera
+
+class Statistika:
+    """Задержки по эндпоинтам (шаблон пути, а не конкретный URL)"""
+
+    def __init__(self):
+        self.zaderzhki: dict[str, list[float]] = defaultdict(list)
+        self.oshibki: dict[str, int] = defaultdict(int)
+
+    def zapisat(self, imya: str, sekund: float, status_code: int):
+        self.zaderzhki[imya].append(sekund)
+        if status_code >= 500:
+            self.oshibki[imya] += 1
+
+class Kontekst:
+    def __init__(self, parametry: dict, seed: int):
+        self.parametry = parametry
+        self.rnd = random.Random(seed)
+        # Токены выписываем напрямую: bcrypt измеряется отдельным сценарием входа
+        self._tokeny: dict[str, dict] = {}
+
+    def zagolovki(self, username: str) -> dict:
+        if username not in self._tokeny:
+            self._tokeny[username] = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+        return self._tokeny[username]
+
+    def sluchajnyj_klient(self) -> str:
+        return imya_polzovatelya(self.rnd.randint(1, self.parametry["polzovateli"]))
+
+    def sluchajnyj_kurer(self) -> str:
+        return imya_kurera(self.rnd.randint(1, self.parametry["kurery"]))
+
+    def sluchajnoe_blyudo(self) -> int:
+        return self.rnd.randint(1, self.parametry["restorany"] * self.parametry["blyuda_na_restoran"])
+
+async def zapros(klient: httpx.AsyncClient, stat: Statistika, imya: str, metod: str, url: str, **kwargs) -> httpx.Response:
+    nachalo = time.perf_counter()
+    otvet = await klient.request(metod, url, **kwargs)
+    stat.zapisat(imya, time.perf_counter() - nachalo, otvet.status_code)
+    return otvet
+
+async def prosmotr_menyu(klient, ktx: Kontekst, stat: Statistika):
+    await zapros(klient, stat, "GET /restorany/", "GET", "/restorany/")
+    restoran_id = ktx.rnd.randint(1, ktx.parametry["restorany"])
+    await zapros(klient, stat, "GET /restorany/{id}", "GET", f"/restorany/{restoran_id}")
+    await zapros(klient, stat, "GET /blyuda/", "GET", "/blyuda/", params={"restoran_id": restoran_id})
+    await zapros(klient, stat, "GET /blyuda/{id}", "GET", f"/blyuda/{ktx.sluchajnoe_blyudo()}")
+    await zapros(klient, stat, "GET /poisk/", "GET", "/poisk/", params={"q": ktx.rnd.choice(["pl", "lagm", "sup", "ostr", "burg"])})
+
+async def korzina_i_oformlenie(klient, ktx: Kontekst, stat: Statistika):
+    zagolovki = ktx.zagolovki(ktx.sluchajnyj_klient())
+    for _ in range(3):
+        await zapros(klient, stat, "POST /zakazy/korzina/dobavit", "POST", "/zakazy/korzina/dobavit",
+                     json={"blyudo_id": ktx.sluchajnoe_blyudo(), "kolichestvo": ktx.rnd.randint(1, 2)}, headers=zagolovki)
+    await zapros(klient, stat, "GET /zakazy/korzina", "GET", "/zakazy/korzina", headers=zagolovki)
+    await zapros(klient, stat, "POST /zakazy/oformit", "POST", "/zakazy/oformit",
+                 json={"adres_dostavki": "ulitsa Benchmark 1"}, headers=zagolovki)
+    await zapros(klient, stat, "GET /zakazy/", "GET", "/zakazy/", headers=zagolovki)
+
+async def dostavka(klient, ktx: Kontekst, stat: Statistika):
+    zagolovki = ktx.zagolovki(ktx.sluchajnyj_kurer())
+    otvet = await zapros(klient, stat, "GET /zakazy/dostupnye-dlya-dostavki", "GET", "/zakazy/dostupnye-dlya-dostavki",
+                         params={"limit": 20}, headers=zagolovki)
+    dostupnye = otvet.json() if otvet.status_code == 200 else []
+    if not dostupnye:
+        return
+    zakaz = ktx.rnd.choice(dostupnye)
+    otvet = await zapros(klient, stat, "POST /zakazy/{id}/vzyat-v-dostavku", "POST", f"/zakazy/{zakaz['id']}/vzyat-v-dostavku", headers=zagolovki)
+    if otvet.status_code != 200:
+        return  # другой курьер успел раньше — это нормальный исход гонки
+    await zapros(klient, stat, "GET /zakazy/moi-zakazy", "GET", "/zakazy/moi-zakazy", headers=zagolovki)
+    await zapros(klient, stat, "POST /zakazy/{id}/dostavlen-kurerom", "POST", f"/zakazy/{zakaz['id']}/dostavlen-kurerom", headers=zagolovki)
+    await zapros(klient, stat, "POST /zakazy/{id}/podtverdit-poluchenie", "POST", f"/zakazy/{zakaz['id']}/podtverdit-poluchenie",
+                 headers=ktx.zagolovki(imya_polzovatelya(zakaz["polzovatel_id"])))
+
+async def vkhod(klient, ktx: Kontekst, stat: Statistika):
+    await zapros(klient, stat, "POST /auth/login", "POST", "/auth/login",
+                 data={"username": ktx.sluchajnyj_klient(), "password": PAROL})
+
+# Сценарий и его вес в смеси нагрузки
+SCENARII = [
+    (prosmotr_menyu, 60),
+    (korzina_i_oformlenie, 25),
+    (dostavka, 12),
+    (vkhod, 3),
+]
+
+async def virtualnyj_polzovatel(klient: httpx.AsyncClient, ktx: Kontekst, stat: Statistika, iteratsii: int):
+    funktsii, vesa = zip(*SCENARII)
+    for _ in range(iteratsii):
+        scenarij = ktx.rnd.choices(funktsii, weights=vesa)[0]
+        await scenarij(klient, ktx, stat)
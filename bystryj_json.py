@@ -0,0 +1,90 @@
+"""Быстрая сериализация списков: JSON строится прямо из строк результата через orjson,
+без валидации каждого объекта Pydantic. Поля и их порядок — как в схемах schemas.py,
+поэтому response_model (и схема OpenAPI) у эндпоинтов остаются прежними."""
+from collections import defaultdict
+
+import orjson
+from fastapi import Response
+from sqlalchemy import select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from foto import url_varianta
+from models import ArkhivPozitsii, ArkhivZakaza, Blyudo, PozitsiyaZakaza, Restoran, Zakaz
+
+# Порядок колонок = порядок полей в RestoranOut / BlyudoOut / ZakazOut / PozitsiyaZakazaOut
+KOLONKI_RESTORANA = (Restoran.nazvanie, Restoran.adres, Restoran.opisanie, Restoran.id)
+KOLONKI_BLYUDA = (
+    Blyudo.nazvanie, Blyudo.opisanie, Blyudo.cena, Blyudo.restoran_id, Blyudo.id, Blyudo.foto_url,
+    Blyudo.foto_varianty,
+)
+KOLONKI_ZAKAZA = (
+    Zakaz.id, Zakaz.status, Zakaz.data_sozdaniya, Zakaz.adres_dostavki, Zakaz.summa,
+    Zakaz.podtverzhden_polzovatelem, Zakaz.polzovatel_id, Zakaz.kurer_id,
+)
+KOLONKI_ARKHIVA = (
+    ArkhivZakaza.id, ArkhivZakaza.status, ArkhivZakaza.data_sozdaniya, ArkhivZakaza.adres_dostavki,
+    ArkhivZakaza.summa, ArkhivZakaza.podtverzhden_polzovatelem, ArkhivZakaza.polzovatel_id, ArkhivZakaza.kurer_id,
+)
+
+
+def _kolonki_pozitsii(pozitsiya):
+    return (pozitsiya.zakaz_id, pozitsiya.blyudo_id, pozitsiya.kolichestvo, pozitsiya.id, pozitsiya.cena_na_moment)
+
+
+def restoran_v_dict(nazvanie, adres, opisanie, id) -> dict:
+    return {"nazvanie": nazvanie, "adres": adres, "opisanie": opisanie, "id": id}
+
+
+def blyudo_v_dict(nazvanie, opisanie, cena, restoran_id, id, foto_url, foto_varianty) -> dict:
+    return {
+        "nazvanie": nazvanie, "opisanie": opisanie, "cena": cena, "restoran_id": restoran_id,
+        "id": id, "foto_url": foto_url,
+        "foto_mini_url": url_varianta(foto_url, "mini", foto_varianty),
+        "foto_sred_url": url_varianta(foto_url, "sred", foto_varianty),
+    }
+
+
+async def zakazy_v_dict(db: AsyncSession, stroki, arkhiv: bool = False) -> list[dict]:
+    """Строки KOLONKI_ZAKAZA -> заказы с позициями; позиции и блюда — одним запросом на всю страницу.
+    arkhiv=True — среди заказов есть архивные: позиции ищутся и в архиве."""
+    zakazy = [
+        {"id": id, "status": status.value, "data_sozdaniya": data_sozdaniya, "adres_dostavki": adres_dostavki,
+         "summa": summa, "podtverzhden_polzovatelem": podtverzhden, "polzovatel_id": polzovatel_id,
+         "kurer_id": kurer_id, "pozitsii": []}
+        for id, status, data_sozdaniya, adres_dostavki, summa, podtverzhden, polzovatel_id, kurer_id in stroki
+    ]
+    if not zakazy:
+        return zakazy
+
+    pozitsii = defaultdict(list)
+    id_zakazov = [z["id"] for z in zakazy]
+    zaprosy = [
+        select(*_kolonki_pozitsii(pozitsiya), *KOLONKI_BLYUDA)
+        .join(Blyudo, Blyudo.id == pozitsiya.blyudo_id)
+        .where(pozitsiya.zakaz_id.in_(id_zakazov))
+        for pozitsiya in ((PozitsiyaZakaza, ArkhivPozitsii) if arkhiv else (PozitsiyaZakaza,))
+    ]
+    # Порядок uq-индекса, как при selectinload; у UNION ALL — слиянием двух индексов
+    if arkhiv:
+        vse = union_all(*zaprosy)
+        zapros = vse.order_by(vse.selected_columns.zakaz_id, vse.selected_columns.blyudo_id)
+    else:
+        zapros = zaprosy[0].order_by(PozitsiyaZakaza.zakaz_id, PozitsiyaZakaza.blyudo_id)
+    rezultat = await db.execute(zapros)
+    for zakaz_id, blyudo_id, kolichestvo, id, cena_na_moment, *blyudo in rezultat:
+        pozitsii[zakaz_id].append({
+            "blyudo_id": blyudo_id, "kolichestvo": kolichestvo, "id": id,
+            "cena_na_moment": cena_na_moment, "blyudo": blyudo_v_dict(*blyudo),
+        })
+    for zakaz in zakazy:
+        zakaz["pozitsii"] = pozitsii[zakaz["id"]]
+    return zakazy
+
+
+def v_bajty(obekt) -> bytes:
+    return orjson.dumps(obekt)
+
+
+def json_otvet(obekt) -> Response:
+    """Готовый ответ: FastAPI не валидирует и не перекодирует возвращённый Response"""
+    return Response(content=orjson.dumps(obekt), media_type="application/json")
@@ -1,18 +1,61 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import event, make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-SQLITE_DATABASE_URL = "sqlite:///data/food.db"
+# Переопределяется переменной окружения: база для нагрузочных тестов или
+# PostgreSQL (postgresql+asyncpg://...) для нескольких воркеров uvicorn
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///data/food.db")
+ETO_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
 
-engine = create_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False})
+# Пул соединений на процесс; у SQLite писатель всё равно один
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Проверка соединения перед выдачей из пула — нужна сетевой базе, а не файлу
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0" if ETO_SQLITE else "1") == "1"
+# Пересоздавать соединения старше N секунд (-1 — никогда)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1" if ETO_SQLITE else "1800"))
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+)
+
+def insert_s_konfliktom(model):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущей базы"""
+    return (sqlite.insert if ETO_SQLITE else postgresql.insert)(model)
+
+def narushena_unikalnost(oshibka: IntegrityError) -> bool:
+    """IntegrityError из-за уникального индекса, а не внешнего ключа или NOT NULL"""
+    if ETO_SQLITE:
+        return getattr(oshibka.orig, "sqlite_errorname", None) in ("SQLITE_CONSTRAINT_UNIQUE", "SQLITE_CONSTRAINT_PRIMARYKEY")
+    return getattr(oshibka.orig, "sqlstate", None) == "23505"
+
+def nastroit_sqlite(dbapi_connection, connection_record):
+    """Прагмы SQLite для каждого нового соединения"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")       # читатели не ждут писателя
+    cursor.execute("PRAGMA synchronous=NORMAL")     # в режиме WAL fsync только на checkpoint
+    cursor.execute("PRAGMA busy_timeout=5000")      # ждём блокировку вместо "database is locked"
+    cursor.execute("PRAGMA cache_size=-65536")      # ~64 МБ кэша страниц на соединение
+    cursor.execute("PRAGMA mmap_size=268435456")    # 256 МБ файла читаем через mmap
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+if ETO_SQLITE:
+    event.listen(engine.sync_engine, "connect", nastroit_sqlite)
+
+# expire_on_commit=False: после commit объекты остаются загруженными,
+# иначе обращение к атрибутам вызвало бы неявный (и в async запрещённый) SELECT
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,114 @@
+import os
+from uuid import uuid4
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# Папка для хранения фото блюд
+UPLOAD_DIR = "static/blyuda"
+URL_PREFIX = "/static/blyuda"
+
+MAKS_RAZMER_FOTO = int(os.getenv("MAKS_RAZMER_FOTO", str(10 * 1024 * 1024)))
+RAZMER_CHANKA = 256 * 1024
+
+# Уменьшенные копии для списков: имя варианта -> максимальная сторона в пикселях
+VARIANTY = {"mini": 256, "sred": 800}
+
+# Форматы, которые принимаем от Pillow, и расширения для них
+RASSHIRENIYA = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+def _put_kopii(foto_url: str, variant: str) -> str:
+    """/static/blyuda/1_abc.png -> static/blyuda/1_abc_mini.webp"""
+    return os.path.join(UPLOAD_DIR, f"{os.path.basename(foto_url).rsplit('.', 1)[0]}_{variant}.webp")
+
+def url_varianta(foto_url: str | None, variant: str, gotovy: bool) -> str | None:
+    """URL уменьшенной WebP-копии: /static/blyuda/1_abc.png -> /static/blyuda/1_abc_mini.webp.
+    gotovy — флаг Blyudo.foto_varianty: фоновая задача выставляет его, когда копии созданы.
+    Пока флага нет (копии ещё создаются или создать их не удалось) — URL оригинала"""
+    if not foto_url:
+        return None
+    if not gotovy:
+        return foto_url
+    return f"{foto_url.rsplit('.', 1)[0]}_{variant}.webp"
+
+def _proverit_izobrazhenie(path: str) -> str:
+    """Проверяет, что файл — изображение поддерживаемого формата; возвращает формат"""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as img:
+            fmt = img.format
+            img.verify()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise HTTPException(status_code=400, detail="Fajl ne yavlyaetsya izobrazheniem")
+    if fmt not in RASSHIRENIYA:
+        raise HTTPException(status_code=400, detail="Nepodderzhivaemyj format izobrazheniya")
+    return fmt
+
+async def sokhranit_foto(foto: UploadFile, blyudo_id: int) -> str:
+    """Потоково пишет загруженное фото на диск (с ограничением размера) и проверяет его.
+    Возвращает URL сохранённого файла."""
+    if foto.size is not None and foto.size > MAKS_RAZMER_FOTO:
+        raise HTTPException(status_code=413, detail="Slishkom bolshoj fajl")
+
+    imya = f"{blyudo_id}_{uuid4().hex}"
+    vremennyj_put = os.path.join(UPLOAD_DIR, f"{imya}.upload")
+    zapisano = 0
+    try:
+        async with await anyio.open_file(vremennyj_put, "wb") as buffer:
+            while chunk := await foto.read(RAZMER_CHANKA):
+                zapisano += len(chunk)
+                if zapisano > MAKS_RAZMER_FOTO:
+                    raise HTTPException(status_code=413, detail="Slishkom bolshoj fajl")
+                await buffer.write(chunk)
+
+        # Декодирование — CPU-работа, выполняем вне цикла событий
+        fmt = await run_in_threadpool(_proverit_izobrazhenie, vremennyj_put)
+        filename = f"{imya}.{RASSHIRENIYA[fmt]}"
+        await anyio.Path(vremennyj_put).rename(os.path.join(UPLOAD_DIR, filename))
+    except BaseException:
+        await anyio.Path(vremennyj_put).unlink(missing_ok=True)
+        raise
+    return f"{URL_PREFIX}/{filename}"
+
+def sozdat_varianty(foto_url: str):
+    """Создаёт WebP-копии из VARIANTY рядом с оригиналом (запускается в фоне)"""
+    from PIL import Image
+
+    put = os.path.join(UPLOAD_DIR, os.path.basename(foto_url))
+    with Image.open(put) as img:
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        for variant, storona in VARIANTY.items():
+            kopiya = img.copy()
+            kopiya.thumbnail((storona, storona))
+            kopiya.save(_put_kopii(foto_url, variant), "WEBP", quality=80, method=4)
+
+async def _dozapolnit_varianty():
+    """Копии и флаг foto_varianty для фото, загруженных до появления копий"""
+    from sqlalchemy import select, update
+
+    from database import SessionLocal, engine
+    from migratsii import podgotovit_skhemu
+    from models import Blyudo
+
+    await podgotovit_skhemu(engine)
+    async with SessionLocal() as db:
+        blyuda = (await db.execute(select(Blyudo.id, Blyudo.foto_url).where(
+            Blyudo.foto_url.is_not(None), Blyudo.foto_varianty.is_(False)))).all()
+        for blyudo_id, foto_url in blyuda:
+            if not os.path.exists(os.path.join(UPLOAD_DIR, os.path.basename(foto_url))):
+                print(f"{foto_url}: net fajla")
+                continue
+            if not all(os.path.exists(_put_kopii(foto_url, variant)) for variant in VARIANTY):
+                sozdat_varianty(foto_url)
+            await db.execute(update(Blyudo).where(Blyudo.id == blyudo_id).values(foto_varianty=True))
+            await db.commit()
+            print(foto_url)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    # Дозаполнить варианты для фото, загруженных до их появления: python foto.py
+    import asyncio
+
+    asyncio.run(_dozapolnit_varianty())
@@ -0,0 +1,180 @@
+"""Групповая запись (group commit) для изменений заказов.
+
+Включается переменной GRUPPOVAYA_ZAPIS=1, только на SQLite: у неё и так один
+писатель на базу, а PostgreSQL партия лишь сериализовала бы независимые транзакции.
+Изменения из параллельных запросов ставятся в очередь; один писатель собирает
+их за короткое окно и выполняет
+в одной транзакции — каждое в своей точке сохранения (SAVEPOINT), так что
+ошибка одного запроса не откатывает остальные. Один commit (и один fsync)
+на партию вместо одного на запрос. При остановке приложения уже поставленные
+изменения выполняются, новые отклоняются.
+
+Без флага zapisat() просто выполняет изменение в сессии запроса и фиксирует его.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database import DATABASE_URL, DB_POOL_PRE_PING, DB_POOL_RECYCLE, ETO_SQLITE, nastroit_sqlite
+from metriki import Gistogramma, GRANITSY_KOLICHESTVA, podklyuchit_k_dvizhku
+
+logger = logging.getLogger(__name__)
+
+GRUPPOVAYA_ZAPIS = os.getenv("GRUPPOVAYA_ZAPIS", "0") == "1"
+# Сколько ждать попутчиков после первого изменения в партии
+OKNO_MS = float(os.getenv("GRUPPOVAYA_ZAPIS_OKNO_MS", "2"))
+MAKS_PARTIYA = int(os.getenv("GRUPPOVAYA_ZAPIS_PARTIYA", "64"))
+
+T = TypeVar("T")
+Izmenenie = Callable[[AsyncSession], Awaitable[T]]
+
+# Метка в очереди: после неё писатель останавливается
+_STOP = object()
+
+razmer_partii = Gistogramma("group_commit_batch_size", "Izmenenij v odnoj tranzakcii", granitsy=GRANITSY_KOLICHESTVA)
+
+
+def _sozdat_dvizhok():
+    """Отдельный движок писателя: одно соединение, транзакции с блокировкой записи сразу"""
+    dvizhok = create_async_engine(
+        DATABASE_URL, pool_size=1, max_overflow=0,
+        pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE,
+    )
+    podklyuchit_k_dvizhku(dvizhok)
+    if ETO_SQLITE:
+        event.listen(dvizhok.sync_engine, "connect", nastroit_sqlite)
+
+        @event.listens_for(dvizhok.sync_engine, "connect")
+        def _bez_avtotranzaktsij(dbapi_connection, connection_record):
+            # sqlite3 сам начинает транзакцию перед DML и ломает SAVEPOINT —
+            # управляем транзакциями явно (рецепт из документации SQLAlchemy)
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(dvizhok.sync_engine, "begin")
+        def _nachat(conn):
+            # Блокировка записи берётся до первых чтений партии: они видят последнее
+            # зафиксированное состояние, и запись не упрётся в чужой снимок
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    return dvizhok
+
+
+class Pisatel:
+    def __init__(self, okno_ms: float = OKNO_MS, maks_partiya: int = MAKS_PARTIYA):
+        self.okno = okno_ms / 1000
+        self.maks_partiya = maks_partiya
+        self.dvizhok = _sozdat_dvizhok()
+        self._sessii = async_sessionmaker(self.dvizhok, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        self._ochered: asyncio.Queue = asyncio.Queue()
+        self._zadacha: asyncio.Task | None = None
+        self._prinimaet = True
+
+    def zapustit(self):
+        self._zadacha = asyncio.create_task(self._tsikl())
+
+    async def ostanovit(self):
+        """Выполняет изменения, уже стоящие в очереди, и останавливается: запросы,
+        ждущие своей партии, получают ответ, а не зависают при остановке приложения"""
+        self._prinimaet = False
+        if self._zadacha is not None:
+            self._ochered.put_nowait(_STOP)
+            await self._zadacha
+            self._zadacha = None
+        await self.dvizhok.dispose()
+
+    async def vypolnit(self, izmenenie: Izmenenie) -> T:
+        """Ставит изменение в очередь и ждёт фиксации партии; возвращает результат или
+        поднимает исключение именно этого изменения"""
+        if not self._prinimaet:
+            raise RuntimeError("Pisatel ostanovlen")
+        budushchee = asyncio.get_running_loop().create_future()
+        self._ochered.put_nowait((izmenenie, budushchee))
+        return await budushchee
+
+    async def _sobrat_partiyu(self) -> list:
+        partiya = [await self._ochered.get()]
+        srok = asyncio.get_running_loop().time() + self.okno
+        while len(partiya) < self.maks_partiya and partiya[-1] is not _STOP:
+            ostalos = srok - asyncio.get_running_loop().time()
+            try:
+                partiya.append(self._ochered.get_nowait() if ostalos <= 0 else
+                               await asyncio.wait_for(self._ochered.get(), ostalos))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return partiya
+
+    async def _tsikl(self):
+        while True:
+            partiya = await self._sobrat_partiyu()
+            ostanovka = partiya[-1] is _STOP
+            if ostanovka:
+                partiya.pop()
+            if partiya:
+                razmer_partii.nablyudat(len(partiya))
+                await self._vypolnit_partiyu(partiya)
+            if ostanovka:
+                return
+
+    async def _vypolnit_partiyu(self, partiya: list):
+        rezultaty = []
+        try:
+            async with self._sessii() as db, db.begin():
+                for izmenenie, budushchee in partiya:
+                    if budushchee.done():  # клиент ушёл, не дождавшись
+                        rezultaty.append(None)
+                        continue
+                    try:
+                        async with db.begin_nested():
+                            rezultaty.append((True, await izmenenie(db)))
+                    except Exception as e:
+                        rezultaty.append((False, e))
+                    # Каждое изменение видит базу, а не объекты соседей по партии
+                    db.expunge_all()
+        except Exception as e:
+            # Не удался сам commit — ошибка у всех
+            for _, budushchee in partiya:
+                if not budushchee.done():
+                    budushchee.set_exception(e)
+            return
+
+        for (_, budushchee), rezultat in zip(partiya, rezultaty):
+            if budushchee.done() or rezultat is None:
+                continue
+            uspekh, znachenie = rezultat
+            if uspekh:
+                budushchee.set_result(znachenie)
+            else:
+                budushchee.set_exception(znachenie)
+
+
+pisatel: Pisatel | None = None
+
+
+def zapustit_pisatelya():
+    """Из lifespan приложения: очередь и задача писателя живут в его цикле событий"""
+    global pisatel
+    if GRUPPOVAYA_ZAPIS and not ETO_SQLITE:
+        logger.warning("GRUPPOVAYA_ZAPIS=1 ignoriruetsya: gruppovaya zapis tolko dlya SQLite")
+    elif GRUPPOVAYA_ZAPIS:
+        pisatel = Pisatel()
+        pisatel.zapustit()
+
+
+async def ostanovit_pisatelya():
+    global pisatel
+    if pisatel is not None:
+        await pisatel.ostanovit()
+        pisatel = None
+
+
+async def zapisat(db: AsyncSession, izmenenie: Izmenenie) -> T:
+    """Выполняет изменение и фиксирует его. izmenenie не вызывает commit сам:
+    при групповой записи фиксирует писатель, иначе — здесь, в сессии запроса."""
+    if pisatel is not None:
+        return await pisatel.vypolnit(izmenenie)
+    rezultat = await izmenenie(db)
+    await db.commit()
+    return rezultat
@@ -0,0 +1,78 @@
+"""Заголовок Idempotency-Key для POST, которые мобильные клиенты повторяют при сбоях сети.
+
+Успешный ответ запоминается по (пользователь, ключ) на IDEMPOTENTNOST_TTL секунд;
+повтор с тем же ключом получает сохранённый ответ, не касаясь таблиц заказов.
+Повтор, пришедший, пока первый запрос ещё выполняется, ждёт его результата.
+Ошибки не запоминаются — повтор после 4xx/5xx выполнится заново. Хранилище —
+в памяти процесса: при нескольких воркерах повтор, попавший в другой воркер,
+выполнится ещё раз.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Header, HTTPException, Request, Response
+
+from kesh import TTLKesh
+
+IDEMPOTENTNOST_TTL = int(os.getenv("IDEMPOTENTNOST_TTL", "86400"))
+IDEMPOTENTNOST_RAZMER = int(os.getenv("IDEMPOTENTNOST_RAZMER", "100000"))
+
+# (polzovatel_id, ключ) -> (отпечаток запроса, тело ответа)
+_otvety = TTLKesh(IDEMPOTENTNOST_RAZMER, IDEMPOTENTNOST_TTL)
+# (polzovatel_id, ключ) -> (отпечаток запроса, завершается вместе с первым запросом)
+_vypolnyayutsya: dict[tuple[int, str], tuple[str, asyncio.Future]] = {}
+
+
+async def klyuch_idempotentnosti(
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+) -> Optional[str]:
+    return idempotency_key
+
+
+async def _otpechatok(request: Request) -> str:
+    """Маршрут и тело: тот же ключ с другим запросом — ошибка клиента, а не повтор"""
+    telo = await request.body()
+    return hashlib.blake2b(request.url.path.encode() + b"\0" + telo, digest_size=16).hexdigest()
+
+
+def _proverit_otpechatok(sokhranennyj: str, otpechatok: str):
+    if sokhranennyj != otpechatok:
+        raise HTTPException(status_code=422, detail="Idempotency-Key uzhe ispolzovan s drugim zaprosom")
+
+
+def _otvet(telo: bytes, povtor: bool) -> Response:
+    headers = {"Idempotent-Replayed": "true"} if povtor else None
+    return Response(content=telo, media_type="application/json", headers=headers)
+
+
+async def odin_raz(request: Request, polzovatel_id: int, klyuch: Optional[str],
+                   vypolnit: Callable[[], Awaitable[bytes]]) -> Response:
+    """Выполняет запрос (vypolnit возвращает JSON ответа) не больше одного раза на ключ"""
+    if klyuch is None:
+        return _otvet(await vypolnit(), povtor=False)
+
+    zapis = (polzovatel_id, klyuch)
+    otpechatok = await _otpechatok(request)
+    while True:
+        sokhranennyj = _otvety.poluchit(zapis)
+        if sokhranennyj is not None:
+            _proverit_otpechatok(sokhranennyj[0], otpechatok)
+            return _otvet(sokhranennyj[1], povtor=True)
+        vypolnyaetsya = _vypolnyayutsya.get(zapis)
+        if vypolnyaetsya is None:
+            break
+        _proverit_otpechatok(vypolnyaetsya[0], otpechatok)
+        # shield: отмена ожидающего повтора не должна отменять чужой future
+        await asyncio.shield(vypolnyaetsya[1])
+
+    gotovo = asyncio.get_running_loop().create_future()
+    _vypolnyayutsya[zapis] = (otpechatok, gotovo)
+    try:
+        telo = await vypolnit()
+        _otvety.polozhit(zapis, (otpechatok, telo))
+    finally:
+        del _vypolnyayutsya[zapis]
+        gotovo.set_result(None)
+    return _otvet(telo, povtor=False)
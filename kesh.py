@@ -0,0 +1,37 @@
+import time
+from collections import OrderedDict
+
+class TTLKesh:
+    """Ограниченный LRU-кэш в памяти процесса; записи живут не дольше ttl секунд"""
+
+    def __init__(self, maks_razmer: int, ttl: float):
+        self.maks_razmer = maks_razmer
+        self.ttl = ttl
+        self._dannye: OrderedDict = OrderedDict()
+
+    def poluchit(self, klyuch, default=None):
+        zapis = self._dannye.get(klyuch)
+        if zapis is None:
+            return default
+        istekaet, znachenie = zapis
+        if istekaet < time.monotonic():
+            del self._dannye[klyuch]
+            return default
+        self._dannye.move_to_end(klyuch)
+        return znachenie
+
+    def polozhit(self, klyuch, znachenie):
+        self._dannye[klyuch] = (time.monotonic() + self.ttl, znachenie)
+        self._dannye.move_to_end(klyuch)
+        # Вытесняем самые давно использованные записи
+        while len(self._dannye) > self.maks_razmer:
+            self._dannye.popitem(last=False)
+
+    def udalit(self, klyuch):
+        self._dannye.pop(klyuch, None)
+
+    def ochistit(self):
+        self._dannye.clear()
+
+    def __len__(self):
+        return len(self._dannye)
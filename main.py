@@ -1,19 +1,51 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from database import Base, engine
-from routers import auth_router, restorany_router, blyuda_router, zakazy_router
+from database import engine
+from metriki import MetrikiMiddleware, podklyuchit_k_dvizhku, v_tekste
+from ogranicheniya import OcheredZaprosov
+from migratsii import podgotovit_skhemu
+from gruppovaya_zapis import zapustit_pisatelya, ostanovit_pisatelya
+from paroli import ostanovit_pul
+from staticheskie_fajly import FotoStaticFiles
+from foto import UPLOAD_DIR
+from routers import auth_router, restorany_router, blyuda_router, zakazy_router, poisk_router, analitika_router
 
-app = FastAPI(title="Food Delivery API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Импорт main не трогает ни базу, ни файловую систему — всё при старте
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    await podgotovit_skhemu(engine)
+    zapustit_pisatelya()
+    yield
+    await ostanovit_pisatelya()
+    ostanovit_pul()
+    await engine.dispose()
 
-Base.metadata.create_all(bind=engine)
+app = FastAPI(title="Food Delivery API", lifespan=lifespan)
+# Метрики снаружи: отказы очереди (503) тоже попадают в задержки
+app.add_middleware(OcheredZaprosov)
+app.add_middleware(MetrikiMiddleware)
+podklyuchit_k_dvizhku(engine)
 
+# Фото блюд — отдельно: неизменяемые файлы с вечным кэшированием
+app.mount("/static/blyuda", FotoStaticFiles(directory=UPLOAD_DIR, check_dir=False), name="foto")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(auth_router.router)
 app.include_router(restorany_router.router)
 app.include_router(blyuda_router.router)
 app.include_router(zakazy_router.router)
+app.include_router(poisk_router.router)
+app.include_router(analitika_router.router)
 
 @app.get("/")
-def root():
-    return {"message": "Dobro pozhalovat v API dostavki edy!"}
\ No newline at end of file
+async def root():
+    return {"message": "Dobro pozhalovat v API dostavki edy!"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(v_tekste(), media_type="text/plain; version=0.0.4")
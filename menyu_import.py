@@ -0,0 +1,166 @@
+"""Потоковый импорт и экспорт меню в CSV / JSONL.
+
+Тело запроса читается построчно, строки проверяются схемой BlyudoCreate и
+вставляются партиями — по одной транзакции на партию. Экспорт отдаёт блюда
+страницами по первичному ключу, не загружая каталог в память целиком.
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal
+from models import Blyudo, Restoran
+from schemas import BlyudoCreate
+
+Format = Literal["csv", "jsonl"]
+
+RAZMER_PARTII = 5000
+MAKS_OSHIBOK_V_OTVETE = 1000
+KOLONKI_EKSPORTA = ["id", "nazvanie", "opisanie", "cena", "restoran_id", "foto_url"]
+
+
+async def _fizicheskie_stroki(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Байтовые куски тела -> строки (без перевода строки)"""
+    ostatok = b""
+    async for chunk in chunks:
+        ostatok += chunk
+        *stroki, ostatok = ostatok.split(b"\n")
+        for stroka in stroki:
+            yield stroka.rstrip(b"\r").decode("utf-8-sig")
+    if ostatok.strip():
+        yield ostatok.rstrip(b"\r").decode("utf-8-sig")
+
+
+async def _zapisi_csv(chunks) -> AsyncIterator[tuple[int, dict | str]]:
+    """(номер строки, словарь) либо (номер, текст ошибки разбора). Первая строка — заголовок."""
+    zagolovok = None
+    nakopleno, nachalo = [], 0
+    nomer = 0
+    async for stroka in _fizicheskie_stroki(chunks):
+        nomer += 1
+        if not nakopleno:
+            nachalo = nomer
+        nakopleno.append(stroka)
+        zapis = "\n".join(nakopleno)
+        # Нечётное число кавычек — поле в кавычках продолжается на следующей строке
+        if zapis.count('"') % 2:
+            continue
+        nakopleno = []
+        if not zapis.strip():
+            continue
+        znacheniya = next(csv.reader([zapis]))
+        if zagolovok is None:
+            zagolovok = [k.strip() for k in znacheniya]
+            continue
+        if len(znacheniya) != len(zagolovok):
+            yield nachalo, f"ozhidalos {len(zagolovok)} kolonok, polucheno {len(znacheniya)}"
+            continue
+        yield nachalo, dict(zip(zagolovok, znacheniya))
+    if nakopleno:
+        yield nachalo, "nezakrytye kavychki"
+
+
+async def _zapisi_jsonl(chunks) -> AsyncIterator[tuple[int, dict | str]]:
+    nomer = 0
+    async for stroka in _fizicheskie_stroki(chunks):
+        nomer += 1
+        if not stroka.strip():
+            continue
+        try:
+            zapis = json.loads(stroka)
+        except json.JSONDecodeError as e:
+            yield nomer, f"nekorrektnyj JSON: {e.msg}"
+            continue
+        yield nomer, zapis if isinstance(zapis, dict) else "ozhidalsya JSON-obekt"
+
+
+def _proverit(zapis: dict) -> dict | str:
+    """Словарь строки -> поля Blyudo или текст ошибки"""
+    if zapis.get("opisanie") == "":
+        zapis["opisanie"] = None
+    try:
+        blyudo = BlyudoCreate.model_validate(zapis)
+    except ValidationError as e:
+        return "; ".join(f"{'.'.join(map(str, o['loc']))}: {o['msg']}" for o in e.errors())
+    if blyudo.cena < 0:
+        return "cena: Cena ne mozhet byt otricatelnoj"
+    return blyudo.model_dump()
+
+
+async def _vstavit_partiyu(db: AsyncSession, partiya: list, izvestnye: set, oshibki: list) -> int:
+    """Проверяет рестораны партии одним запросом, вставляет корректные строки, фиксирует"""
+    novye = {polya["restoran_id"] for _, polya in partiya} - izvestnye
+    if novye:
+        izvestnye.update(await db.scalars(select(Restoran.id).where(Restoran.id.in_(novye))))
+    stroki = []
+    for nomer, polya in partiya:
+        if polya["restoran_id"] in izvestnye:
+            stroki.append(polya)
+        else:
+            oshibki.append((nomer, f"restoran_id: Restoran {polya['restoran_id']} ne najden"))
+    if stroki:
+        await db.execute(insert(Blyudo), stroki)
+        await db.commit()
+    return len(stroki)
+
+
+async def importirovat(db: AsyncSession, chunks: AsyncIterator[bytes], format: Format) -> dict:
+    """Импорт блюд из потока; ошибочные строки пропускаются и перечисляются в ответе"""
+    zapisi = _zapisi_csv(chunks) if format == "csv" else _zapisi_jsonl(chunks)
+    dobavleno = 0
+    oshibki: list[tuple[int, str]] = []
+    izvestnye_restorany: set[int] = set()
+    partiya = []
+    async for nomer, zapis in zapisi:
+        polya = _proverit(zapis) if isinstance(zapis, dict) else zapis
+        if isinstance(polya, str):
+            oshibki.append((nomer, polya))
+            continue
+        partiya.append((nomer, polya))
+        if len(partiya) >= RAZMER_PARTII:
+            dobavleno += await _vstavit_partiyu(db, partiya, izvestnye_restorany, oshibki)
+            partiya = []
+    if partiya:
+        dobavleno += await _vstavit_partiyu(db, partiya, izvestnye_restorany, oshibki)
+
+    oshibki.sort()
+    return {
+        "dobavleno": dobavleno,
+        "oshibok": len(oshibki),
+        "oshibki": [{"stroka": nomer, "oshibka": tekst} for nomer, tekst in oshibki[:MAKS_OSHIBOK_V_OTVETE]],
+    }
+
+
+async def eksportirovat(format: Format, restoran_id: int | None = None, razmer_stranitsy: int = 1000) -> AsyncIterator[str]:
+    """Генератор строк экспорта. Своя сессия: ответ отдаётся уже после выхода из эндпоинта."""
+    if format == "csv":
+        bufer = io.StringIO()
+        pisatel = csv.writer(bufer, lineterminator="\n")
+        pisatel.writerow(KOLONKI_EKSPORTA)
+    kolonki = [getattr(Blyudo, k) for k in KOLONKI_EKSPORTA]
+    posle_id = 0
+    async with SessionLocal() as db:
+        while True:
+            query = select(*kolonki).where(Blyudo.id > posle_id)
+            if restoran_id is not None:
+                query = query.where(Blyudo.restoran_id == restoran_id)
+            stranitsa = (await db.execute(query.order_by(Blyudo.id).limit(razmer_stranitsy))).all()
+            if not stranitsa:
+                break
+            if format == "csv":
+                pisatel.writerows(stranitsa)
+                yield bufer.getvalue()
+                bufer.seek(0)
+                bufer.truncate()
+            else:
+                yield "".join(json.dumps(dict(zip(KOLONKI_EKSPORTA, stroka)), ensure_ascii=False) + "\n" for stroka in stranitsa)
+            posle_id = stranitsa[-1][0]
+            # Соединение не держим, пока клиент читает страницу
+            await db.close()
+    if format == "csv" and bufer.tell():
+        yield bufer.getvalue()
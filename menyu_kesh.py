@@ -0,0 +1,51 @@
+"""Кэш ответов каталога (рестораны, блюда, поиск) с ETag.
+
+Кэш и версия живут в памяти процесса: uvelichit_versiyu сбрасывает только кэш
+своего воркера, остальные воркеры отдают старое меню до истечения ttl.
+"""
+import hashlib
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from kesh import TTLKesh
+
+# Версия каталога: растёт при каждом изменении ресторанов или блюд.
+# Ключ кэша включает версию, поэтому старые ответы после изменения не отдаются.
+_versiya = 0
+_otvety = TTLKesh(maks_razmer=4096, ttl=600)
+
+def uvelichit_versiyu():
+    """Вызывать после commit любого изменения ресторанов или блюд"""
+    global _versiya
+    _versiya += 1
+    _otvety.ochistit()
+
+def _klyuch(request: Request):
+    return (_versiya, request.url.path, request.url.query)
+
+def _otvet(request: Request, etag: str, telo: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=telo, media_type="application/json", headers=headers)
+
+def otvet_iz_kesha(request: Request) -> Response | None:
+    """Готовый ответ (200 или 304) без обращения к БД, если он есть в кэше.
+    Ключ запоминается до чтения из БД: если каталог изменится во время чтения,
+    устаревший ответ ляжет под старую версию и больше не будет отдан"""
+    klyuch = request.state.klyuch_kesha = _klyuch(request)
+    zapis = _otvety.poluchit(klyuch)
+    if zapis is None:
+        return None
+    return _otvet(request, *zapis)
+
+def v_json(adapter: TypeAdapter, obekt) -> bytes:
+    """Сериализация ORM-объекта(ов) по схеме ответа — так же, как это делает response_model"""
+    return adapter.dump_json(adapter.validate_python(obekt, from_attributes=True))
+
+def zakeshirovat(request: Request, telo: bytes) -> Response:
+    """Сохраняет сериализованный ответ и отдаёт его с сильным ETag.
+    Вызывается после otvet_iz_kesha того же запроса"""
+    etag = '"' + hashlib.blake2b(telo, digest_size=16).hexdigest() + '"'
+    _otvety.polozhit(request.state.klyuch_kesha, (etag, telo))
+    return _otvet(request, etag, telo)
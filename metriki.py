@@ -0,0 +1,227 @@
+"""Метрики производительности в текстовом формате Prometheus.
+
+Счётчики живут в памяти процесса: при нескольких воркерах uvicorn
+каждый отдаёт свои, суммирует их сам Prometheus.
+"""
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Запросы дольше порога попадают в лог вместе с самыми долгими SQL
+MEDLENNYJ_ZAPROS_MS = float(os.getenv("MEDLENNYJ_ZAPROS_MS", "500"))
+SQL_V_LOGE = 3
+
+GRANITSY_VREMENI = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GRANITSY_RAZMERA = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+GRANITSY_KOLICHESTVA = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _ekranirovat(znachenie) -> str:
+    return str(znachenie).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metki_v_tekst(imena: tuple, znacheniya: tuple, le: str | None = None) -> str:
+    pary = [f'{k}="{_ekranirovat(v)}"' for k, v in zip(imena, znacheniya)]
+    if le is not None:
+        pary.append(f'le="{le}"')
+    return "{" + ",".join(pary) + "}" if pary else ""
+
+
+class _Metrika:
+    tip = ""
+
+    def __init__(self, imya: str, opisanie: str, metki: tuple = ()):
+        self.imya = imya
+        self.opisanie = opisanie
+        self.metki = metki
+        self._znacheniya: dict = {}
+        _REESTR.append(self)
+
+    def _klyuch(self, metki: dict) -> tuple:
+        return tuple(metki[m] for m in self.metki)
+
+    def v_tekst(self) -> list[str]:
+        return [f"# HELP {self.imya} {self.opisanie}", f"# TYPE {self.imya} {self.tip}"]
+
+
+class Schetchik(_Metrika):
+    tip = "counter"
+
+    def uvelichit(self, na: float = 1, **metki):
+        klyuch = self._klyuch(metki)
+        self._znacheniya[klyuch] = self._znacheniya.get(klyuch, 0) + na
+
+    def v_tekst(self):
+        return super().v_tekst() + [
+            f"{self.imya}{_metki_v_tekst(self.metki, k)} {v}" for k, v in self._znacheniya.items()
+        ]
+
+
+class Shkala(Schetchik):
+    tip = "gauge"
+
+    def umenshit(self, na: float = 1, **metki):
+        self.uvelichit(-na, **metki)
+
+
+class Gistogramma(_Metrika):
+    tip = "histogram"
+
+    def __init__(self, imya: str, opisanie: str, metki: tuple = (), granitsy: tuple = GRANITSY_VREMENI):
+        super().__init__(imya, opisanie, metki)
+        self.granitsy = granitsy
+
+    def nablyudat(self, znachenie: float, **metki):
+        klyuch = self._klyuch(metki)
+        ryad = self._znacheniya.get(klyuch)
+        if ryad is None:
+            # корзины + сумма + количество
+            ryad = self._znacheniya[klyuch] = [0] * len(self.granitsy) + [0.0, 0]
+        i = bisect_left(self.granitsy, znachenie)
+        if i < len(self.granitsy):
+            ryad[i] += 1
+        ryad[-2] += znachenie
+        ryad[-1] += 1
+
+    def v_tekst(self):
+        stroki = super().v_tekst()
+        for klyuch, ryad in self._znacheniya.items():
+            nakopleno = 0
+            for granitsa, kolichestvo in zip(self.granitsy, ryad):
+                nakopleno += kolichestvo
+                stroki.append(f"{self.imya}_bucket{_metki_v_tekst(self.metki, klyuch, granitsa)} {nakopleno}")
+            stroki.append(f"{self.imya}_bucket{_metki_v_tekst(self.metki, klyuch, '+Inf')} {ryad[-1]}")
+            stroki.append(f"{self.imya}_sum{_metki_v_tekst(self.metki, klyuch)} {ryad[-2]}")
+            stroki.append(f"{self.imya}_count{_metki_v_tekst(self.metki, klyuch)} {ryad[-1]}")
+        return stroki
+
+
+_REESTR: list[_Metrika] = []
+
+http_zaprosy = Gistogramma("http_request_duration_seconds", "Vremya obrabotki zaprosa", ("method", "route", "status"))
+http_v_rabote = Shkala("http_requests_in_flight", "Zaprosy v obrabotke", ("method",))
+http_razmer_otveta = Gistogramma("http_response_size_bytes", "Razmer tela otveta", ("method", "route"), GRANITSY_RAZMERA)
+bd_zaprosy_na_http = Gistogramma("db_queries_per_request", "SQL-zaprosov na HTTP-zapros", ("route",), GRANITSY_KOLICHESTVA)
+bd_vremya_na_http = Gistogramma("db_time_per_request_seconds", "Summarnoe vremya SQL na HTTP-zapros", ("route",))
+bd_zapros = Gistogramma("db_query_duration_seconds", "Vremya odnogo SQL-zaprosa")
+bcrypt_vremya = Gistogramma("bcrypt_duration_seconds", "Vremya bcrypt vmeste s ozhidaniem v pule", ("operatsiya",))
+
+
+def v_tekste() -> str:
+    return "\n".join(stroka for metrika in _REESTR for stroka in metrika.v_tekst()) + "\n"
+
+
+@dataclass
+class StatistikaZaprosa:
+    """SQL, выполненные в рамках одного HTTP-запроса"""
+    zaprosov: int = 0
+    vremya_bd: float = 0.0
+    sql: list = field(default_factory=list)  # (секунды, текст)
+
+
+_tekushchij_zapros: ContextVar[StatistikaZaprosa | None] = ContextVar("tekushchij_zapros", default=None)
+
+
+def podklyuchit_k_dvizhku(engine):
+    """Подписка на события движка: время каждого SQL и привязка к текущему HTTP-запросу"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _nachalo(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metriki_nachalo", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _oshibka(exception_context):
+        # Упавший SQL не доходит до after_cursor_execute: снимаем его начало со стека,
+        # иначе ожидаемые ошибки (гонка за корзину) копят записи в conn.info соединения
+        conn = exception_context.connection
+        nachala = conn.info.get("metriki_nachalo") if conn is not None else None
+        if nachala:
+            nachala.pop()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _konec(conn, cursor, statement, parameters, context, executemany):
+        sekund = time.perf_counter() - conn.info["metriki_nachalo"].pop()
+        bd_zapros.nablyudat(sekund)
+        stat = _tekushchij_zapros.get()
+        if stat is not None:
+            stat.zaprosov += 1
+            stat.vremya_bd += sekund
+            stat.sql.append((sekund, statement))
+
+
+def _shablon_puti(scope) -> str:
+    # После маршрутизации Starlette кладёт найденный маршрут в scope —
+    # шаблон вместо конкретного URL, чтобы не плодить метки
+    route = scope.get("route")
+    return getattr(route, "path", None) or "nenajden"
+
+
+def eto_potok(nachalo: dict) -> bool:
+    """Ответ — поток SSE (по Content-Type из http.response.start)"""
+    return any(imya == b"content-type" and znachenie.startswith(b"text/event-stream")
+               for imya, znachenie in nachalo.get("headers", ()))
+
+
+class MetrikiMiddleware:
+    """Чистый ASGI-middleware: не буферизует ответы, поэтому не ломает SSE.
+    У потока SSE время — до начала ответа: весь поток живёт часами, и каждое
+    закрытие попадало бы в медленные запросы"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metod = scope["method"]
+        # Маршрут известен только после маршрутизации — «в работе» считаем по методу
+        http_v_rabote.uvelichit(method=metod)
+        stat = StatistikaZaprosa()
+        token = _tekushchij_zapros.set(stat)
+        status = 500
+        razmer = 0
+        nachalo = time.perf_counter()
+        do_nachala_potoka = None
+
+        async def send_s_uchetom(message):
+            nonlocal status, razmer, do_nachala_potoka
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if eto_potok(message):
+                    do_nachala_potoka = time.perf_counter() - nachalo
+            elif message["type"] == "http.response.body":
+                razmer += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_s_uchetom)
+        finally:
+            sekund = time.perf_counter() - nachalo if do_nachala_potoka is None else do_nachala_potoka
+            _tekushchij_zapros.reset(token)
+            http_v_rabote.umenshit(method=metod)
+            route = _shablon_puti(scope)
+            http_zaprosy.nablyudat(sekund, method=metod, route=route, status=status)
+            http_razmer_otveta.nablyudat(razmer, method=metod, route=route)
+            bd_zaprosy_na_http.nablyudat(stat.zaprosov, route=route)
+            bd_vremya_na_http.nablyudat(stat.vremya_bd, route=route)
+            if sekund * 1000 >= MEDLENNYJ_ZAPROS_MS:
+                _zapisat_medlennyj(metod, scope["path"], status, sekund, stat)
+
+
+def _zapisat_medlennyj(metod: str, put: str, status: int, sekund: float, stat: StatistikaZaprosa):
+    samye_dolgie = sorted(stat.sql, key=lambda s: s[0], reverse=True)[:SQL_V_LOGE]
+    logger.warning(
+        "Medlennyj zapros %s %s -> %s: %.0f ms, SQL: %d za %.0f ms%s",
+        metod, put, status, sekund * 1000, stat.zaprosov, stat.vremya_bd * 1000,
+        "".join(f"\n  {s * 1000:.1f} ms: {' '.join(sql.split())[:300]}" for s, sql in samye_dolgie),
+    )
@@ -0,0 +1,156 @@
+from hashlib import sha256
+
+from sqlalchemy import Column, String, Table, delete, insert, inspect, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.ext.asyncio import AsyncEngine
+from database import Base
+import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+# Объекты схемы, которых нет в базах, созданных старыми версиями (create_all не меняет
+# существующие таблицы). Формат: (таблица, имя индекса или колонки, SQL-команды для создания);
+# таблица None означает, что объект сам является таблицей (например, FTS5).
+MIGRATSII = [
+    ("pozitsii_zakaza", "uq_pozitsii_zakaza_zakaz_blyudo", [
+        # Сливаем возможные дубли (блюдо, добавленное параллельными запросами)
+        """UPDATE pozitsii_zakaza SET kolichestvo = (
+               SELECT SUM(p2.kolichestvo) FROM pozitsii_zakaza p2
+               WHERE p2.zakaz_id = pozitsii_zakaza.zakaz_id AND p2.blyudo_id = pozitsii_zakaza.blyudo_id)
+           WHERE id IN (SELECT MIN(id) FROM pozitsii_zakaza GROUP BY zakaz_id, blyudo_id HAVING COUNT(*) > 1)""",
+        """DELETE FROM pozitsii_zakaza
+           WHERE id NOT IN (SELECT MIN(id) FROM pozitsii_zakaza GROUP BY zakaz_id, blyudo_id)""",
+        "CREATE UNIQUE INDEX uq_pozitsii_zakaza_zakaz_blyudo ON pozitsii_zakaza (zakaz_id, blyudo_id)",
+    ]),
+    ("blyuda", "ix_blyuda_restoran_id", ["CREATE INDEX ix_blyuda_restoran_id ON blyuda (restoran_id)"]),
+    ("zakazy", "ix_zakazy_polzovatel_status", ["CREATE INDEX ix_zakazy_polzovatel_status ON zakazy (polzovatel_id, status)"]),
+    ("zakazy", "ix_zakazy_polzovatel_id", ["CREATE INDEX ix_zakazy_polzovatel_id ON zakazy (polzovatel_id, id)"]),
+    ("zakazy", "ix_zakazy_status_kurer", ["CREATE INDEX ix_zakazy_status_kurer ON zakazy (status, kurer_id)"]),
+    ("zakazy", "ix_zakazy_kurer_status", ["CREATE INDEX ix_zakazy_kurer_status ON zakazy (kurer_id, status)"]),
+    ("zakazy", "uq_zakazy_korzina", [
+        # Лишние корзины (созданные параллельными запросами) — отменяем, оставляем самую новую
+        """UPDATE zakazy SET status = 'otmenen'
+           WHERE status = 'v_korzine' AND id NOT IN (
+               SELECT MAX(id) FROM zakazy WHERE status = 'v_korzine' GROUP BY polzovatel_id)""",
+        "CREATE UNIQUE INDEX uq_zakazy_korzina ON zakazy (polzovatel_id) WHERE status = 'v_korzine'",
+    ]),
+    *((tablica, "data_zaversheniya", [
+        f"ALTER TABLE {tablica} ADD COLUMN data_zaversheniya TIMESTAMP",
+        # Точное время перехода неизвестно — старые заказы считаются завершёнными при создании
+        f"""UPDATE {tablica} SET data_zaversheniya = data_sozdaniya
+            WHERE status IN ('zavershen', 'otmenen')""",
+    ]) for tablica in ("zakazy", "zakazy_arkhiv")),
+    ("zakazy", "ix_zakazy_status_zavershenie",
+     ["CREATE INDEX ix_zakazy_status_zavershenie ON zakazy (status, data_zaversheniya)"]),
+    ("zakazy_arkhiv", "ix_zakazy_arkhiv_status_zavershenie",
+     ["CREATE INDEX ix_zakazy_arkhiv_status_zavershenie ON zakazy_arkhiv (status, data_zaversheniya)"]),
+    # Копии уже загруженных фото отмечает python foto.py
+    ("blyuda", "foto_varianty", ["ALTER TABLE blyuda ADD COLUMN foto_varianty BOOLEAN NOT NULL DEFAULT false"]),
+]
+
+def _fts5(tablica: str) -> list[str]:
+    """Полнотекстовый индекс FTS5 над nazvanie/opisanie таблицы и триггеры,
+    которые держат его в актуальном состоянии при любых INSERT/UPDATE/DELETE"""
+    fts = f"{tablica}_fts"
+    return [
+        f"""CREATE VIRTUAL TABLE {fts} USING fts5(
+               nazvanie, opisanie, content='{tablica}', content_rowid='id',
+               tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {tablica} BEGIN
+               INSERT INTO {fts}(rowid, nazvanie, opisanie) VALUES (new.id, new.nazvanie, new.opisanie);
+           END""",
+        f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {tablica} BEGIN
+               INSERT INTO {fts}({fts}, rowid, nazvanie, opisanie) VALUES ('delete', old.id, old.nazvanie, old.opisanie);
+           END""",
+        f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF nazvanie, opisanie ON {tablica} BEGIN
+               INSERT INTO {fts}({fts}, rowid, nazvanie, opisanie) VALUES ('delete', old.id, old.nazvanie, old.opisanie);
+               INSERT INTO {fts}(rowid, nazvanie, opisanie) VALUES (new.id, new.nazvanie, new.opisanie);
+           END""",
+        # Индексируем уже существующие строки
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+# Вместо имени объекта: миграция включает AUTOINCREMENT у таблицы
+AVTOINKREMENT = "AUTOINCREMENT"
+
+def _avtoinkrement(tablica: Table, arkhiv: Table) -> list[str]:
+    """SQLite: пересоздание таблицы с AUTOINCREMENT (ALTER TABLE этого не умеет).
+    Без него новой строке достаётся max(id) + 1 — id удалённых и перенесённых в архив
+    строк. Счётчик продолжается после наибольшего id и живой, и архивной таблицы"""
+    dialekt = sqlite.dialect()
+    imya, novaya = tablica.name, f"{tablica.name}_novaya"
+    kolonki = ", ".join(kolonka.name for kolonka in tablica.columns)
+    return [
+        f"DROP TABLE IF EXISTS {novaya}",
+        str(CreateTable(tablica).compile(dialect=dialekt)).replace(f"CREATE TABLE {imya} (", f"CREATE TABLE {novaya} (", 1),
+        f"INSERT INTO {novaya} ({kolonki}) SELECT {kolonki} FROM {imya}",
+        f"DROP TABLE {imya}",
+        f"ALTER TABLE {novaya} RENAME TO {imya}",
+        *sorted(str(CreateIndex(index).compile(dialect=dialekt)) for index in tablica.indexes),
+        f"DELETE FROM sqlite_sequence WHERE name = '{imya}'",
+        f"""INSERT INTO sqlite_sequence (name, seq) SELECT '{imya}', max(
+               coalesce((SELECT max(id) FROM {imya}), 0), coalesce((SELECT max(id) FROM {arkhiv.name}), 0))""",
+    ]
+
+# Только для SQLite
+MIGRATSII_SQLITE = [
+    (None, "blyuda_fts", _fts5("blyuda")),
+    (None, "restorany_fts", _fts5("restorany")),
+    ("zakazy", AVTOINKREMENT, _avtoinkrement(models.Zakaz.__table__, models.ArkhivZakaza.__table__)),
+    ("pozitsii_zakaza", AVTOINKREMENT,
+     _avtoinkrement(models.PozitsiyaZakaza.__table__, models.ArkhivPozitsii.__table__)),
+]
+
+# Отпечаток схемы, до которой база уже доведена (одна строка)
+versiya_skhemy = Table("versiya_skhemy", Base.metadata, Column("otpechatok", String(64), nullable=False))
+
+def otpechatok_skhemy(dialect: Dialect) -> str:
+    """Хэш DDL всех таблиц и индексов models.py и команд миграций: меняется
+    при любом изменении схемы, поэтому номер версии не нужно вести вручную"""
+    migratsii = MIGRATSII + (MIGRATSII_SQLITE if dialect.name == "sqlite" else [])
+    chasti = []
+    for tablica in Base.metadata.sorted_tables:
+        chasti.append(str(CreateTable(tablica).compile(dialect=dialect)))
+        chasti += sorted(str(CreateIndex(index).compile(dialect=dialect)) for index in tablica.indexes)
+    for _, obekt, komandy in migratsii:
+        chasti += [obekt, *komandy]
+    return sha256("\n".join(chasti).encode()).hexdigest()
+
+def _prochitat_otpechatok(conn: Connection) -> str | None:
+    if not inspect(conn).has_table(versiya_skhemy.name):
+        return None
+    return conn.scalar(select(versiya_skhemy.c.otpechatok))
+
+def _uzhe_primenena(inspector, tablica: str | None, obekt: str) -> bool:
+    if tablica is None:
+        return inspector.has_table(obekt)
+    if obekt == AVTOINKREMENT:
+        # Ключевое слово есть только в исходном DDL таблицы
+        sql = inspector.bind.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tablica,)).scalar()
+        return AVTOINKREMENT in (sql or "")
+    return (obekt in {i["name"] for i in inspector.get_indexes(tablica)}
+            or obekt in {k["name"] for k in inspector.get_columns(tablica)})
+
+def primenit_migratsii(conn: Connection):
+    """Создаёт недостающие объекты схемы; вызывается при старте после create_all"""
+    inspector = inspect(conn)
+    migratsii = MIGRATSII + (MIGRATSII_SQLITE if conn.dialect.name == "sqlite" else [])
+    for tablica, obekt, komandy in migratsii:
+        if _uzhe_primenena(inspector, tablica, obekt):
+            continue
+        for sql in komandy:
+            conn.exec_driver_sql(sql)
+
+async def podgotovit_skhemu(engine: AsyncEngine):
+    """Создаёт таблицы и применяет миграции (при старте приложения и при заполнении тестовых баз).
+    Если база уже доведена до текущей схемы — только один запрос её отпечатка."""
+    otpechatok = otpechatok_skhemy(engine.dialect)
+    async with engine.connect() as conn:
+        if await conn.run_sync(_prochitat_otpechatok) == otpechatok:
+            return
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(primenit_migratsii)
+        await conn.execute(delete(versiya_skhemy))
+        await conn.execute(insert(versiya_skhemy).values(otpechatok=otpechatok))
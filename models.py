@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, Text, Float, ForeignKey, Enum, DateTime
+from sqlalchemy import Boolean, Column, Integer, String, Text, Float, ForeignKey, Enum, Date, DateTime, Index, false, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -44,12 +44,18 @@ class Restoran(Base):
 
 class Blyudo(Base):
     __tablename__ = "blyuda"
+    __table_args__ = (
+        # Меню ресторана: WHERE restoran_id = ? ORDER BY id
+        Index("ix_blyuda_restoran_id", "restoran_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nazvanie = Column(String, index=True)
     opisanie = Column(Text)
     cena = Column(Float, nullable=False)
     foto_url = Column(String, nullable=True)
+    # Уменьшенные копии foto_url созданы; выставляет фоновая задача после загрузки
+    foto_varianty = Column(Boolean, nullable=False, default=False, server_default=false())
     restoran_id = Column(Integer, ForeignKey("restorany.id"))
 
     restoran = relationship("Restoran", back_populates="blyuda")
@@ -59,11 +65,29 @@ class StatusZakaza(str, enum.Enum):
     v_korzine = "v_korzine"
     oformlen = "oformlen"
     v_dostavke = "v_dostavke"
-    dostavlen = "dostavlen"
+    dostavlen = "dostavlen"        # Доставлен курьером, ждёт подтверждения
+    zavershen = "zavershen"        # Полностью завершён (подтверждён пользователем)
     otmenen = "otmenen"
 
 class Zakaz(Base):
     __tablename__ = "zakazy"
+    __table_args__ = (
+        # Корзина и заказы клиента в одном статусе
+        Index("ix_zakazy_polzovatel_status", "polzovatel_id", "status"),
+        # История заказов клиента: новые первыми без сортировки
+        Index("ix_zakazy_polzovatel_id", "polzovatel_id", "id"),
+        # Свободные заказы для курьеров и условный захват
+        Index("ix_zakazy_status_kurer", "status", "kurer_id"),
+        # Пересчёт аналитики: завершённые заказы по дням завершения
+        Index("ix_zakazy_status_zavershenie", "status", "data_zaversheniya"),
+        # Заказы, которые везёт курьер
+        Index("ix_zakazy_kurer_status", "kurer_id", "status"),
+        # Не больше одной корзины на пользователя
+        Index("uq_zakazy_korzina", "polzovatel_id", unique=True,
+              sqlite_where=text("status = 'v_korzine'"), postgresql_where=text("status = 'v_korzine'")),
+        # id не выдаются повторно: удалённые и перенесённые в архив заказы сохраняют свои
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     polzovatel_id = Column(Integer, ForeignKey("polzovateli.id"), nullable=False)
@@ -73,6 +97,8 @@ class Zakaz(Base):
     adres_dostavki = Column(String, nullable=True)
     summa = Column(Float, default=0.0)
     podtverzhden_polzovatelem = Column(Boolean, default=False)
+    # Когда заказ стал zavershen или otmenen — от этого времени считается срок архивации
+    data_zaversheniya = Column(DateTime, nullable=True)
 
     # Клиент, который сделал заказ
     polzovatel = relationship("Polzovatel", back_populates="zakazy_kak_klient", foreign_keys=[polzovatel_id])
@@ -84,6 +110,12 @@ class Zakaz(Base):
 
 class PozitsiyaZakaza(Base):
     __tablename__ = "pozitsii_zakaza"
+    __table_args__ = (
+        # Одна строка на блюдо в заказе — на этом держится upsert позиций
+        Index("uq_pozitsii_zakaza_zakaz_blyudo", "zakaz_id", "blyudo_id", unique=True),
+        # Как у заказов: id удалённой из корзины или архивной позиции не достанется новой
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     zakaz_id = Column(Integer, ForeignKey("zakazy.id"))
@@ -92,4 +124,64 @@ class PozitsiyaZakaza(Base):
     cena_na_moment = Column(Float)  # цена блюда на момент добавления
 
     zakaz = relationship("Zakaz", back_populates="pozitsii")
-    blyudo = relationship("Blyudo", back_populates="pozitsii_zakaza")
\ No newline at end of file
+    blyudo = relationship("Blyudo", back_populates="pozitsii_zakaza")
+
+# Архив: завершённые и отменённые заказы старше порога переносятся сюда вместе
+# с позициями (arkhiv.py), id сохраняются. Горячие индексы живых таблиц здесь
+# не нужны — архив читает только история заказов клиента.
+class ArkhivZakaza(Base):
+    __tablename__ = "zakazy_arkhiv"
+    __table_args__ = (
+        Index("ix_zakazy_arkhiv_polzovatel", "polzovatel_id", "id"),
+        Index("ix_zakazy_arkhiv_status_zavershenie", "status", "data_zaversheniya"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    polzovatel_id = Column(Integer, ForeignKey("polzovateli.id"), nullable=False)
+    kurer_id = Column(Integer, ForeignKey("polzovateli.id"), nullable=True)
+    status = Column(Enum(StatusZakaza), nullable=False)
+    data_sozdaniya = Column(DateTime)
+    adres_dostavki = Column(String, nullable=True)
+    summa = Column(Float)
+    podtverzhden_polzovatelem = Column(Boolean)
+    data_zaversheniya = Column(DateTime, nullable=True)
+
+class ArkhivPozitsii(Base):
+    __tablename__ = "pozitsii_zakaza_arkhiv"
+    __table_args__ = (
+        Index("ix_pozitsii_zakaza_arkhiv_zakaz", "zakaz_id", "blyudo_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    zakaz_id = Column(Integer, ForeignKey("zakazy_arkhiv.id"), nullable=False)
+    blyudo_id = Column(Integer, ForeignKey("blyuda.id"))
+    kolichestvo = Column(Integer)
+    cena_na_moment = Column(Float)
+
+# Агрегаты продаж для аналитики: обновляются при завершении заказа (analitika.py),
+# день — дата завершения заказа (data_zaversheniya)
+class ProdazhiZaDen(Base):
+    __tablename__ = "prodazhi_po_dnyam"
+
+    den = Column(Date, primary_key=True)
+    vyruchka = Column(Float, nullable=False, default=0.0)
+    zakazov = Column(Integer, nullable=False, default=0)
+    pozitsij = Column(Integer, nullable=False, default=0)
+
+class ProdazhiRestorana(Base):
+    __tablename__ = "prodazhi_restoranov"
+
+    restoran_id = Column(Integer, ForeignKey("restorany.id"), primary_key=True)
+    den = Column(Date, primary_key=True)
+    vyruchka = Column(Float, nullable=False, default=0.0)
+    zakazov = Column(Integer, nullable=False, default=0)
+    pozitsij = Column(Integer, nullable=False, default=0)  # штук блюд
+
+class ProdazhiBlyuda(Base):
+    __tablename__ = "prodazhi_blyud"
+
+    blyudo_id = Column(Integer, ForeignKey("blyuda.id"), primary_key=True)
+    den = Column(Date, primary_key=True)
+    restoran_id = Column(Integer, ForeignKey("restorany.id"), nullable=False)
+    vyruchka = Column(Float, nullable=False, default=0.0)
+    kolichestvo = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,161 @@
+"""Допуск запросов: лимиты на клиента для дорогих маршрутов и общий предел параллельности.
+
+Ogranichenie — token bucket на (маршрут, клиент); бюджет объявляется рядом с
+маршрутом: dependencies=[Depends(Ogranichenie(10, 60))]. Сверх бюджета — 429.
+Клиент — пользователь из токена с проверенной подписью, иначе адрес. За прокси адрес
+берётся из X-Forwarded-For (DOVERENNYKH_PROKSI, см. Procfile): иначе все анонимные
+клиенты делят одно ведро — адрес самого прокси.
+OcheredZaprosov — ASGI-middleware: не больше LIMIT_PARALLELNO запросов в работе,
+остальные ждут в очереди; при переполненной очереди или долгом ожидании — сразу 503.
+Поток SSE занимает место только до начала ответа (любой маршрут с text/event-stream).
+Оба ответа с Retry-After. Состояние — в памяти процесса, у каждого воркера своё.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+
+from fastapi import HTTPException, Request
+
+from auth import sub_iz_tokena
+from kesh import TTLKesh
+from metriki import Schetchik, eto_potok
+
+# 0 — лимиты на клиента выключены (нагрузочный тест: все виртуальные клиенты с одного адреса)
+OGRANICHENIYA = os.getenv("OGRANICHENIYA", "1") == "1"
+LIMIT_PARALLELNO = int(os.getenv("LIMIT_PARALLELNO", "64"))
+LIMIT_OCHERED = int(os.getenv("LIMIT_OCHERED", "256"))
+LIMIT_OZHIDANIE_MS = float(os.getenv("LIMIT_OZHIDANIE_MS", "2000"))
+# Сколько прокси перед приложением дописывают адрес в X-Forwarded-For (на Heroku — один роутер).
+# Клиент — N-я запись справа: всё левее мог прислать сам клиент, поэтому uvicorn с
+# --forwarded-allow-ips='*' (он берёт самую левую запись) для лимитов не годится
+DOVERENNYKH_PROKSI = int(os.getenv("DOVERENNYKH_PROKSI", "0"))
+# Вёдер на маршрут; вытесненное ведро просто начинается заново полным
+MAKS_KLIENTOV = 100_000
+
+otkazy = Schetchik("http_requests_rejected_total", "Zaprosy, otklonennye do obrabotki", ("prichina",))
+
+
+def adres_klienta(request: Request) -> str:
+    """Адрес, который дописал ближайший к клиенту доверенный прокси; без прокси — адрес соединения"""
+    if DOVERENNYKH_PROKSI:
+        zapisi = [adres.strip() for zagolovok in request.headers.getlist("x-forwarded-for")
+                  for adres in zagolovok.split(",") if adres.strip()]
+        # Записей меньше — запрос пришёл в обход прокси
+        if len(zapisi) >= DOVERENNYKH_PROKSI:
+            return zapisi[-DOVERENNYKH_PROKSI]
+    return request.client.host if request.client else "-"
+
+
+def klyuch_klienta(request: Request, po_adresu: bool = False) -> str:
+    """sub из JWT с проверенной подписью, без действительного токена — IP.
+    Поддельный токен не даёт нового ведра: он считается запросом с того же адреса.
+    po_adresu — всегда по IP (вход и регистрация: перебор паролей идёт без токена
+    или с любым токеном, лимит должен держать именно адрес)"""
+    avtorizatsiya = request.headers.get("authorization", "")
+    if not po_adresu and avtorizatsiya[:7].lower() == "bearer ":
+        sub = sub_iz_tokena(avtorizatsiya[7:])
+        if sub:
+            return f"sub:{sub}"
+    return f"ip:{adres_klienta(request)}"
+
+
+class Ogranichenie:
+    """Зависимость FastAPI: не больше zaprosov за za_sekund на клиента, всплеском до vsplesk"""
+
+    def __init__(self, zaprosov: int, za_sekund: float = 60, vsplesk: int | None = None, po_adresu: bool = False):
+        self.skorost = zaprosov / za_sekund
+        self.po_adresu = po_adresu
+        self.emkost = vsplesk or zaprosov
+        # Через emkost / skorost секунд простоя ведро снова полное — хранить его дольше незачем
+        self._vedra = TTLKesh(MAKS_KLIENTOV, self.emkost / self.skorost)
+
+    def vzyat(self, klyuch: str) -> float:
+        """0, если запрос можно выполнить, иначе сколько секунд ждать следующего токена"""
+        seichas = time.monotonic()
+        tokeny, bylo = self._vedra.poluchit(klyuch, (self.emkost, seichas))
+        tokeny = min(self.emkost, tokeny + (seichas - bylo) * self.skorost)
+        if tokeny >= 1:
+            self._vedra.polozhit(klyuch, (tokeny - 1, seichas))
+            return 0
+        self._vedra.polozhit(klyuch, (tokeny, seichas))
+        return (1 - tokeny) / self.skorost
+
+    async def __call__(self, request: Request):
+        if not OGRANICHENIYA:
+            return
+        zhdat = self.vzyat(klyuch_klienta(request, self.po_adresu))
+        if zhdat:
+            otkazy.uvelichit(prichina="limit")
+            raise HTTPException(
+                status_code=429, detail="Slishkom mnogo zaprosov, povtorite pozzhe",
+                headers={"Retry-After": str(math.ceil(zhdat))},
+            )
+
+
+def _bez_ocheredi(put: str) -> bool:
+    # Метрики нужны именно под нагрузкой
+    return put == "/metrics"
+
+
+class OcheredZaprosov:
+    """Чистый ASGI-middleware, как MetrikiMiddleware: ответы не буферизуются"""
+
+    def __init__(self, app, parallelno: int = LIMIT_PARALLELNO, ochered: int = LIMIT_OCHERED,
+                 ozhidanie_ms: float = LIMIT_OZHIDANIE_MS):
+        self.app = app
+        self.maks_ochered = ochered
+        self.ozhidanie = ozhidanie_ms / 1000
+        self._mesta = asyncio.Semaphore(parallelno)
+        self._v_ocheredi = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _bez_ocheredi(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        if self._mesta.locked():
+            if self._v_ocheredi >= self.maks_ochered:
+                await self._otkaz(send, "ochered")
+                return
+            self._v_ocheredi += 1
+            try:
+                await asyncio.wait_for(self._mesta.acquire(), self.ozhidanie)
+            except asyncio.TimeoutError:
+                await self._otkaz(send, "ozhidanie")
+                return
+            finally:
+                self._v_ocheredi -= 1
+        else:
+            await self._mesta.acquire()
+
+        osvobozhdeno = False
+
+        def osvobodit():
+            nonlocal osvobozhdeno
+            if not osvobozhdeno:
+                osvobozhdeno = True
+                self._mesta.release()
+
+        async def otpravit(message):
+            # Потоки SSE живут часами и заняли бы все места: место освобождается,
+            # как только ответ оказался потоком — снимок уже построен под ограничением
+            if message["type"] == "http.response.start" and eto_potok(message):
+                osvobodit()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, otpravit)
+        finally:
+            osvobodit()
+
+    async def _otkaz(self, send, prichina: str):
+        otkazy.uvelichit(prichina=prichina)
+        telo = json.dumps({"detail": "Server peregruzhen, povtorite pozzhe"}).encode()
+        await send({
+            "type": "http.response.start", "status": 503,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(telo)).encode()),
+                        (b"retry-after", b"1")],
+        })
+        await send({"type": "http.response.body", "body": telo})
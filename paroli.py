@@ -0,0 +1,65 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+
+# Стоимость bcrypt (2^rounds итераций); при смене хэши пересчитываются при входе
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Число процессов для bcrypt — по умолчанию по числу ядер
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))
+
+@cache
+def _kontekst():
+    """passlib и bcrypt импортируются только там, где хэшируют, — в процессах пула.
+    Основному процессу они не нужны."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_pul: ProcessPoolExecutor | None = None
+
+def hash_password(password: str):
+    return _kontekst().hash(password)
+
+def verify_password(plain_password, hashed_password):
+    return _kontekst().verify(plain_password, hashed_password)
+
+def verify_and_update(plain_password, hashed_password):
+    """Проверка пароля; второй элемент — новый хэш, если стоимость устарела (иначе None)"""
+    return _kontekst().verify_and_update(plain_password, hashed_password)
+
+def _poluchit_pul() -> ProcessPoolExecutor:
+    global _pul
+    if _pul is None:
+        # spawn: дочерние процессы импортируют только этот лёгкий модуль,
+        # а не форкают работающий цикл событий с открытыми соединениями
+        _pul = ProcessPoolExecutor(
+            max_workers=BCRYPT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pul
+
+async def _v_pule(operatsiya: str, func, *args):
+    # Импорт здесь, а не в начале модуля: процессы пула импортируют paroli,
+    # и metriki (с SQLAlchemy) им не нужны
+    from metriki import bcrypt_vremya
+
+    nachalo = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_poluchit_pul(), func, *args)
+    finally:
+        bcrypt_vremya.nablyudat(time.perf_counter() - nachalo, operatsiya=operatsiya)
+
+async def hash_password_async(password: str) -> str:
+    """Хэширование в пуле процессов — цикл событий и GIL остаются свободными"""
+    return await _v_pule("hash", hash_password, password)
+
+async def verify_and_update_async(plain_password, hashed_password):
+    return await _v_pule("verify", verify_and_update, plain_password, hashed_password)
+
+def ostanovit_pul():
+    global _pul
+    if _pul is not None:
+        _pul.shutdown(wait=False, cancel_futures=True)
+        _pul = None
@@ -0,0 +1,86 @@
+from datetime import date
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from database import get_db
+from models import Blyudo, ProdazhiBlyuda, ProdazhiRestorana, ProdazhiZaDen, Restoran
+from schemas import ProdazhiBlyudaOut, ProdazhiRestoranaOut, ProdazhiZaDenOut
+from auth import TekushchijPolzovatel
+from routers.blyuda_router import tolko_admin
+
+router = APIRouter(prefix="/analitika", tags=["analitika"])
+
+# Все эндпоинты читают только агрегаты prodazhi_* (см. analitika.py), а не историю заказов
+
+def za_period(model, s: Optional[date], po: Optional[date]):
+    usloviya = []
+    if s is not None:
+        usloviya.append(model.den >= s)
+    if po is not None:
+        usloviya.append(model.den <= po)
+    return usloviya
+
+@router.get("/restorany", response_model=List[ProdazhiRestoranaOut])
+async def prodazhi_restoranov(
+    s: Optional[date] = None,
+    po: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
+):
+    """Рестораны по выручке за период (включительно), лучшие первыми"""
+    vyruchka = func.sum(ProdazhiRestorana.vyruchka).label("vyruchka")
+    query = (
+        select(ProdazhiRestorana.restoran_id, Restoran.nazvanie, vyruchka,
+               func.sum(ProdazhiRestorana.zakazov).label("zakazov"), func.sum(ProdazhiRestorana.pozitsij).label("pozitsij"))
+        .join(Restoran, Restoran.id == ProdazhiRestorana.restoran_id)
+        .where(*za_period(ProdazhiRestorana, s, po))
+        .group_by(ProdazhiRestorana.restoran_id, Restoran.nazvanie)
+        .order_by(vyruchka.desc())
+        .limit(limit)
+    )
+    return (await db.execute(query)).mappings().all()
+
+@router.get("/blyuda", response_model=List[ProdazhiBlyudaOut])
+async def populyarnye_blyuda(
+    restoran_id: Optional[int] = None,
+    s: Optional[date] = None,
+    po: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
+):
+    """Самые продаваемые блюда за период (по количеству), можно по одному ресторану"""
+    kolichestvo = func.sum(ProdazhiBlyuda.kolichestvo).label("kolichestvo")
+    query = (
+        select(ProdazhiBlyuda.blyudo_id, Blyudo.nazvanie, ProdazhiBlyuda.restoran_id,
+               func.sum(ProdazhiBlyuda.vyruchka).label("vyruchka"), kolichestvo)
+        .join(Blyudo, Blyudo.id == ProdazhiBlyuda.blyudo_id)
+        .where(*za_period(ProdazhiBlyuda, s, po))
+        .group_by(ProdazhiBlyuda.blyudo_id, Blyudo.nazvanie, ProdazhiBlyuda.restoran_id)
+        .order_by(kolichestvo.desc())
+        .limit(limit)
+    )
+    if restoran_id is not None:
+        query = query.where(ProdazhiBlyuda.restoran_id == restoran_id)
+    return (await db.execute(query)).mappings().all()
+
+@router.get("/po-dnyam", response_model=List[ProdazhiZaDenOut])
+async def prodazhi_po_dnyam(
+    restoran_id: Optional[int] = None,
+    s: Optional[date] = None,
+    po: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
+):
+    """Выручка, заказы и проданные блюда по дням — по всей платформе или по ресторану"""
+    if restoran_id is None:
+        query = select(ProdazhiZaDen).where(*za_period(ProdazhiZaDen, s, po)).order_by(ProdazhiZaDen.den)
+        return (await db.scalars(query)).all()
+    query = (
+        select(ProdazhiRestorana.den, ProdazhiRestorana.vyruchka, ProdazhiRestorana.zakazov, ProdazhiRestorana.pozitsij)
+        .where(ProdazhiRestorana.restoran_id == restoran_id, *za_period(ProdazhiRestorana, s, po))
+        .order_by(ProdazhiRestorana.den)
+    )
+    return (await db.execute(query)).mappings().all()
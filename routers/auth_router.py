@@ -1,42 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from models import Polzovatel, RolPolzovatelya
 from routers.blyuda_router import tolko_admin
 from schemas import PolzovatelCreate, Token
-from auth import hash_password, verify_password, create_access_token
+from ogranicheniya import Ogranichenie
+from auth import hash_password_async, verify_and_update_async, create_access_token, sbrosit_kesh_polzovatelya, TekushchijPolzovatel
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/register", response_model=Token)
-def register(polzovatel: PolzovatelCreate, db: Session = Depends(get_db)):
-    if db.query(Polzovatel).filter(Polzovatel.username == polzovatel.username).first():
+# Регистрация и вход — bcrypt в пуле процессов: перебор с одного адреса упирается в лимит
+@router.post("/register", response_model=Token, dependencies=[Depends(Ogranichenie(5, 60, po_adresu=True))])
+async def register(polzovatel: PolzovatelCreate, db: AsyncSession = Depends(get_db)):
+    if await db.scalar(select(Polzovatel).where(Polzovatel.username == polzovatel.username)):
         raise HTTPException(status_code=400, detail="Polzovatel uzhe sushchestvuet")
-    new_polz = Polzovatel(username=polzovatel.username, hashed_password=hash_password(polzovatel.password))
+    # bcrypt считается в пуле процессов, чтобы не блокировать цикл событий
+    hashed = await hash_password_async(polzovatel.password)
+    new_polz = Polzovatel(username=polzovatel.username, hashed_password=hashed)
     db.add(new_polz)
-    db.commit()
+    await db.commit()
     token = create_access_token({"sub": polzovatel.username})
     return {"access_token": token, "token_type": "bearer"}
 
-@router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    polz = db.query(Polzovatel).filter(Polzovatel.username == form_data.username).first()
-    if not polz or not verify_password(form_data.password, polz.hashed_password):
+@router.post("/login", response_model=Token, dependencies=[Depends(Ogranichenie(10, 60, po_adresu=True))])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    polz = await db.scalar(select(Polzovatel).where(Polzovatel.username == form_data.username))
+    if not polz:
+        raise HTTPException(status_code=401, detail="Nepravilnyj login ili parol")
+    verno, novyj_hash = await verify_and_update_async(form_data.password, polz.hashed_password)
+    if not verno:
         raise HTTPException(status_code=401, detail="Nepravilnyj login ili parol")
+    # Стоимость bcrypt изменилась в настройках — прозрачно перехэшируем пароль
+    if novyj_hash:
+        polz.hashed_password = novyj_hash
+        await db.commit()
     token = create_access_token({"sub": polz.username})
     return {"access_token": token, "token_type": "bearer"}
 
 @router.post("/set-role/{user_id}/{new_role}")
-def naznachit_rol(
+async def naznachit_rol(
     user_id: int,
     new_role: RolPolzovatelya,
-    db: Session = Depends(get_db),
-    admin: Polzovatel = Depends(tolko_admin)
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
 ):
-    polz = db.query(Polzovatel).filter(Polzovatel.id == user_id).first()
+    polz = await db.get(Polzovatel, user_id)
     if not polz:
         raise HTTPException(404, "Polzovatel ne najden")
     polz.rol = new_role
-    db.commit()
+    await db.commit()
+    # Новая роль должна действовать сразу, а не после истечения кэша
+    sbrosit_kesh_polzovatelya(polz.username)
     return {"status": "rol izmenena", "polzovatel": polz.username, "novaya_rol": new_role.value}
\ No newline at end of file
@@ -1,40 +1,67 @@
-import os
-from uuid import uuid4
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+import logging
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
-from database import get_db
-from models import Blyudo, Restoran, Polzovatel, RolPolzovatelya
+from database import SessionLocal, get_db
+from models import Blyudo, Restoran, RolPolzovatelya
 from schemas import BlyudoCreate, BlyudoOut, BlyudoUpdate
-from auth import get_current_polzovatel
+from auth import get_current_polzovatel, TekushchijPolzovatel
+from foto import sokhranit_foto, sozdat_varianty
+from bystryj_json import KOLONKI_BLYUDA, blyudo_v_dict, v_bajty
+from menyu_import import Format, importirovat, eksportirovat
+from ogranicheniya import Ogranichenie
+from menyu_kesh import otvet_iz_kesha, zakeshirovat, uvelichit_versiyu, v_json
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/blyuda", tags=["blyuda"])
 
-# Папка для хранения фото блюд
-UPLOAD_DIR = "static/blyuda"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+_blyudo_json = TypeAdapter(BlyudoOut)
 
-def tolko_admin(curr: Polzovatel = Depends(get_current_polzovatel)):
+async def tolko_admin(curr: TekushchijPolzovatel = Depends(get_current_polzovatel)):
     if curr.rol != RolPolzovatelya.admin:
         raise HTTPException(status_code=403, detail="Tolko admin mozhet eto delat")
     return curr
 
 
+async def _sozdat_varianty(blyudo_id: int, foto_url: str):
+    """Копии создаются в пуле потоков; затем блюду ставится foto_varianty и кэш каталога
+    сбрасывается, чтобы списки отдали URL копий вместо оригинала.
+    Если копии создать не удалось, флаг не ставится — остаётся URL оригинала"""
+    try:
+        await run_in_threadpool(sozdat_varianty, foto_url)
+    except Exception:
+        logger.exception("Ne udalos sozdat kopii foto %s", foto_url)
+        return
+    async with SessionLocal() as db:
+        # Фото могли заменить, пока создавались копии — флаг только для того же файла
+        await db.execute(
+            update(Blyudo).where(Blyudo.id == blyudo_id, Blyudo.foto_url == foto_url).values(foto_varianty=True)
+        )
+        await db.commit()
+    uvelichit_versiyu()
+
+
 @router.post("/", response_model=BlyudoOut)
 async def sozdat_blyudo(
+    background_tasks: BackgroundTasks,
     nazvanie: str = Form(...),
     opisanie: Optional[str] = Form(None),
     cena: float = Form(...),
     restoran_id: int = Form(...),
     foto: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    admin: Polzovatel = Depends(tolko_admin)
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
 ):
     """Создание нового блюда (только админ)"""
     # Проверка существования ресторана
-    restoran = db.query(Restoran).filter(Restoran.id == restoran_id).first()
+    restoran = await db.get(Restoran, restoran_id)
     if not restoran:
         raise HTTPException(status_code=404, detail="Restoran ne najden")
 
@@ -45,63 +72,113 @@ async def sozdat_blyudo(
         restoran_id=restoran_id
     )
     db.add(new_blyudo)
-    db.commit()
-    db.refresh(new_blyudo)
+    await db.flush()  # нужен id для имени файла; commit — один, после фото
 
     # Обработка фото, если загружено
     if foto:
-        file_extension = foto.filename.split(".")[-1] if "." in foto.filename else "jpg"
-        filename = f"{new_blyudo.id}_{uuid4().hex}.{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-
-        with open(file_path, "wb") as buffer:
-            content = await foto.read()
-            buffer.write(content)
-
-        new_blyudo.foto_url = f"/static/blyuda/{filename}"
-        db.commit()
-        db.refresh(new_blyudo)
+        new_blyudo.foto_url = await sokhranit_foto(foto, new_blyudo.id)
+        background_tasks.add_task(_sozdat_varianty, new_blyudo.id, new_blyudo.foto_url)
 
+    await db.commit()
+    uvelichit_versiyu()
     return new_blyudo
 
 
 @router.get("/", response_model=List[BlyudoOut])
-def poluchit_blyuda(
+async def poluchit_blyuda(
+    request: Request,
     restoran_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    min_cena: Optional[float] = None,
+    max_cena: Optional[float] = None,
+    posle_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Получить все блюда или блюда конкретного ресторана"""
-    query = db.query(Blyudo)
+    """Получить блюда (постранично, с фильтрами по ресторану и цене).
+    Следующая страница — posle_id = id последнего блюда в ответе."""
+    otvet = otvet_iz_kesha(request)
+    if otvet is not None:
+        return otvet
+
+    query = select(*KOLONKI_BLYUDA)
     if restoran_id is not None:
-        query = query.filter(Blyudo.restoran_id == restoran_id)
-    return query.all()
+        query = query.where(Blyudo.restoran_id == restoran_id)
+    if min_cena is not None:
+        query = query.where(Blyudo.cena >= min_cena)
+    if max_cena is not None:
+        query = query.where(Blyudo.cena <= max_cena)
+    # Keyset-пагинация: стоимость страницы не зависит от её номера
+    if posle_id is not None:
+        query = query.where(Blyudo.id > posle_id)
+    stroki = await db.execute(query.order_by(Blyudo.id).limit(limit))
+    return zakeshirovat(request, v_bajty([blyudo_v_dict(*stroka) for stroka in stroki]))
+
+
+@router.post("/import")
+async def importirovat_menyu(
+    request: Request,
+    format: Format = "csv",
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
+):
+    """Массовый импорт блюд (только админ). Тело — CSV с заголовком
+    nazvanie,opisanie,cena,restoran_id или JSONL с теми же полями.
+    Тело читается потоком, строки вставляются партиями; ошибочные строки пропускаются."""
+    try:
+        return await importirovat(db, request.stream(), format)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Fajl dolzhen byt v kodirovke UTF-8")
+    finally:
+        # Часть партий могла быть зафиксирована и до ошибки
+        uvelichit_versiyu()
+
+
+# Экспорт читает весь каталог
+@router.get("/eksport", dependencies=[Depends(Ogranichenie(5, 60))])
+async def eksportirovat_menyu(
+    format: Format = "csv",
+    restoran_id: Optional[int] = None,
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
+):
+    """Экспорт блюд в CSV / JSONL потоком (только админ); формат совместим с импортом"""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        eksportirovat(format, restoran_id), media_type=f"{media_type}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="blyuda.{format}"'},
+    )
 
 
 @router.get("/{blyudo_id}", response_model=BlyudoOut)
-def poluchit_blyudo_po_id(
+async def poluchit_blyudo_po_id(
+    request: Request,
     blyudo_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить одно блюдо по ID"""
-    blyudo = db.query(Blyudo).filter(Blyudo.id == blyudo_id).first()
+    otvet = otvet_iz_kesha(request)
+    if otvet is not None:
+        return otvet
+
+    blyudo = await db.get(Blyudo, blyudo_id)
     if not blyudo:
         raise HTTPException(status_code=404, detail="Blyudo ne najdeno")
-    return blyudo
+    return zakeshirovat(request, v_json(_blyudo_json, blyudo))
 
 
 @router.put("/{blyudo_id}", response_model=BlyudoOut)
 async def obnovit_blyudo(
     blyudo_id: int,
+    background_tasks: BackgroundTasks,
     nazvanie: Optional[str] = Form(None),
     opisanie: Optional[str] = Form(None),
     cena: Optional[float] = Form(None),
     restoran_id: Optional[int] = Form(None),
     foto: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    admin: Polzovatel = Depends(tolko_admin)
+    db: AsyncSession = Depends(get_db),
+    admin: TekushchijPolzovatel = Depends(tolko_admin)
 ):
     """Полное обновление блюда (все поля + фото) — только админ"""
-    blyudo = db.query(Blyudo).filter(Blyudo.id == blyudo_id).first()
+    blyudo = await db.get(Blyudo, blyudo_id)
     if not blyudo:
         raise HTTPException(status_code=404, detail="Blyudo ne najdeno")
 
@@ -114,23 +191,17 @@ async def obnovit_blyudo(
             raise HTTPException(status_code=400, detail="Cena ne mozhet byt otricatelnoj")
         blyudo.cena = cena
     if restoran_id is not None:
-        restoran = db.query(Restoran).filter(Restoran.id == restoran_id).first()
+        restoran = await db.get(Restoran, restoran_id)
         if not restoran:
             raise HTTPException(status_code=404, detail="Restoran s takim ID ne najden")
         blyudo.restoran_id = restoran_id
 
     # Замена фото, если загружено новое
     if foto:
-        file_extension = foto.filename.split(".")[-1] if "." in foto.filename else "jpg"
-        filename = f"{blyudo_id}_{uuid4().hex}.{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-
-        with open(file_path, "wb") as buffer:
-            content = await foto.read()
-            buffer.write(content)
-
-        blyudo.foto_url = f"/static/blyuda/{filename}"
+        blyudo.foto_url = await sokhranit_foto(foto, blyudo_id)
+        blyudo.foto_varianty = False
+        background_tasks.add_task(_sozdat_varianty, blyudo_id, blyudo.foto_url)
 
-    db.commit()
-    db.refresh(blyudo)
+    await db.commit()
+    uvelichit_versiyu()
     return blyudo
\ No newline at end of file
@@ -0,0 +1,66 @@
+import re
+from fastapi import APIRouter, Depends, Query, Request
+from pydantic import TypeAdapter
+from sqlalchemy import and_, case, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, ETO_SQLITE
+from models import Blyudo, Restoran
+from schemas import PoiskOut
+from menyu_kesh import otvet_iz_kesha, zakeshirovat, v_json
+
+router = APIRouter(prefix="/poisk", tags=["poisk"])
+
+_poisk_json = TypeAdapter(PoiskOut)
+
+def zapros_fts(slova: list[str]) -> str:
+    """Слова -> запрос FTS5: все слова обязательны, каждое — как префикс
+    (для автодополнения). Кавычки вокруг слов экранируют синтаксис FTS5."""
+    return " ".join(f'"{slovo}"*' for slovo in slova)
+
+async def _nayti(db: AsyncSession, model, slova: list[str], limit: int):
+    if not ETO_SQLITE:
+        return await _nayti_ilike(db, model, slova, limit)
+    # bm25: совпадение в названии весит в 10 раз больше, чем в описании
+    tablica = model.__tablename__
+    fts = f"{tablica}_fts"
+    zapros = zapros_fts(slova)
+    stmt = text(
+        f"SELECT {tablica}.* FROM {fts} JOIN {tablica} ON {tablica}.id = {fts}.rowid "
+        f"WHERE {fts} MATCH :zapros ORDER BY bm25({fts}, 10.0, 1.0) LIMIT :limit"
+    ).bindparams(zapros=zapros, limit=limit)
+    return (await db.scalars(select(model).from_statement(stmt))).all()
+
+def _podstroka(slovo: str) -> str:
+    """Шаблон LIKE для подстроки: % и _ в слове — обычные символы, а не маски"""
+    return "%" + slovo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+async def _nayti_ilike(db: AsyncSession, model, slova: list[str], limit: int):
+    """Без FTS5 (PostgreSQL): каждое слово — подстрока названия или описания,
+    совпадения в названии первыми"""
+    shablony = [_podstroka(slovo) for slovo in slova]
+    usloviya = [or_(model.nazvanie.ilike(shablon, escape="\\"), model.opisanie.ilike(shablon, escape="\\"))
+                for shablon in shablony]
+    v_nazvanii = and_(*(model.nazvanie.ilike(shablon, escape="\\") for shablon in shablony))
+    stmt = select(model).where(*usloviya).order_by(case((v_nazvanii, 0), else_=1), model.id).limit(limit)
+    return (await db.scalars(stmt)).all()
+
+@router.get("/", response_model=PoiskOut)
+async def poisk(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    """Полнотекстовый поиск блюд и ресторанов по названию и описанию, лучшие совпадения первыми"""
+    otvet = otvet_iz_kesha(request)
+    if otvet is not None:
+        return otvet
+
+    slova = re.findall(r"\w+", q)
+    if not slova:
+        return PoiskOut()
+    rezultat = {
+        "blyuda": await _nayti(db, Blyudo, slova, limit),
+        "restorany": await _nayti(db, Restoran, slova, limit),
+    }
+    return zakeshirovat(request, v_json(_poisk_json, rezultat))
@@ -1,27 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from database import get_db
-from models import Restoran, Polzovatel
+from models import Restoran
 from schemas import RestoranCreate, RestoranOut
-from auth import get_current_polzovatel
+from auth import get_current_polzovatel, TekushchijPolzovatel
+from bystryj_json import KOLONKI_RESTORANA, restoran_v_dict, v_bajty
+from menyu_kesh import otvet_iz_kesha, zakeshirovat, uvelichit_versiyu, v_json
 
 router = APIRouter(prefix="/restorany", tags=["restorany"])
 
+_restoran_json = TypeAdapter(RestoranOut)
+
 @router.post("/", response_model=RestoranOut)
-def sozdat_restoran(rest: RestoranCreate, db: Session = Depends(get_db), curr: Polzovatel = Depends(get_current_polzovatel)):
+async def sozdat_restoran(rest: RestoranCreate, db: AsyncSession = Depends(get_db), curr: TekushchijPolzovatel = Depends(get_current_polzovatel)):
     new_rest = Restoran(**rest.model_dump())
     db.add(new_rest)
-    db.commit()
-    db.refresh(new_rest)
+    await db.commit()
+    uvelichit_versiyu()
     return new_rest
 
 @router.get("/", response_model=list[RestoranOut])
-def poluchit_restorany(db: Session = Depends(get_db)):
-    return db.query(Restoran).all()
+async def poluchit_restorany(
+    request: Request,
+    posle_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """Список ресторанов постранично: следующая страница — posle_id = id последнего в ответе"""
+    otvet = otvet_iz_kesha(request)
+    if otvet is not None:
+        return otvet
+
+    query = select(*KOLONKI_RESTORANA)
+    if posle_id is not None:
+        query = query.where(Restoran.id > posle_id)
+    stroki = await db.execute(query.order_by(Restoran.id).limit(limit))
+    return zakeshirovat(request, v_bajty([restoran_v_dict(*stroka) for stroka in stroki]))
 
 @router.get("/{rest_id}", response_model=RestoranOut)
-def poluchit_restoran(rest_id: int, db: Session = Depends(get_db)):
-    rest = db.query(Restoran).filter(Restoran.id == rest_id).first()
+async def poluchit_restoran(request: Request, rest_id: int, db: AsyncSession = Depends(get_db)):
+    otvet = otvet_iz_kesha(request)
+    if otvet is not None:
+        return otvet
+
+    rest = await db.get(Restoran, rest_id)
     if not rest:
         raise HTTPException(404, "Restoran ne najden")
-    return rest
\ No newline at end of file
+    return zakeshirovat(request, v_json(_restoran_json, rest))
\ No newline at end of file
@@ -1,245 +1,454 @@
-import enum
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
-from models import RolPolzovatelya, Zakaz, PozitsiyaZakaza, Blyudo, StatusZakaza, Polzovatel
-from schemas import ZakazCreate, ZakazOut, PozitsiyaZakazaBase, PozitsiyaZakazaOut
-from auth import get_current_polzovatel
-from typing import List
+import json
+from datetime import datetime
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from pydantic import TypeAdapter
+from sqlalchemy import func, select, delete, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload
+from database import get_db, insert_s_konfliktom, narushena_unikalnost
+from models import ArkhivZakaza, RolPolzovatelya, Zakaz, PozitsiyaZakaza, Blyudo, StatusZakaza
+from schemas import ZakazCreate, ZakazOut, PozitsiyaZakazaBase
+from auth import get_current_polzovatel, TekushchijPolzovatel
+from analitika import uchest_zakaz
+from arkhiv import KONECHNYE_STATUSY
+from bystryj_json import KOLONKI_ARKHIVA, KOLONKI_ZAKAZA, json_otvet, v_bajty, zakazy_v_dict
+from gruppovaya_zapis import zapisat
+from idempotentnost import klyuch_idempotentnosti, odin_raz
+from menyu_kesh import v_json
+from ogranicheniya import Ogranichenie
+from sobytiya import broker, sse_otvet, KANAL_KURERY, kanal_polzovatelya
+from typing import List, Optional
 
 router = APIRouter(prefix="/zakazy", tags=["zakazy"])
 
-def poluchit_ili_sozdat_korzinu(db: Session, polzovatel: Polzovatel) -> Zakaz:
-    """Получает корзину пользователя или создаёт новую, если её нет"""
-    zakaz = db.query(Zakaz).filter(
+_zakaz_json = TypeAdapter(ZakazOut)
+
+# Гонка за создание корзины разрешается одним повтором; три попытки — с запасом
+POPYTOK_SOZDAT_KORZINU = 3
+
+def zapros_zakazov():
+    """Запрос заказов сразу с позициями и блюдами — без ленивых загрузок при сериализации ZakazOut"""
+    # Два SELECT на любой объём: заказы + позиции вместе с блюдами
+    return select(Zakaz).options(
+        selectinload(Zakaz.pozitsii).joinedload(PozitsiyaZakaza.blyudo)
+    )
+
+async def zagruzit_zakaz(db: AsyncSession, zakaz_id: int) -> Zakaz:
+    """Перечитывает заказ вместе с позициями и блюдами (после изменений в обход ORM)"""
+    query = zapros_zakazov().where(Zakaz.id == zakaz_id).execution_options(populate_existing=True)
+    return (await db.scalars(query)).one()
+
+async def naiti_korzinu(db: AsyncSession, polzovatel: TekushchijPolzovatel,
+                        dlya_izmeneniya: bool = False) -> Zakaz | None:
+    """Корзина пользователя с позициями и блюдами.
+    dlya_izmeneniya: на PostgreSQL строка корзины блокируется (FOR UPDATE) до конца
+    транзакции — изменения одной корзины выполняются по очереди. SQLite FOR UPDATE
+    не поддерживает: там очередь даёт блокировка записи на первой изменяющей команде."""
+    query = zapros_zakazov().where(
         Zakaz.polzovatel_id == polzovatel.id,
         Zakaz.status == StatusZakaza.v_korzine
-    ).first()
-
-    if not zakaz:
-        zakaz = Zakaz(polzovatel_id=polzovatel.id, status=StatusZakaza.v_korzine, summa=0.0)
-        db.add(zakaz)
-        db.commit()
-        db.refresh(zakaz)
-
-    # Обновляем сумму на основе актуальных позиций
-    db.refresh(zakaz)
-    zakaz.summa = sum(
-        poz.cena_na_moment * poz.kolichestvo for poz in zakaz.pozitsii
     )
-    db.commit()
-    return zakaz
+    if dlya_izmeneniya:
+        query = query.with_for_update(of=Zakaz)
+    return (await db.scalars(query)).first()
+
+async def poluchit_ili_sozdat_korzinu(db: AsyncSession, polzovatel: TekushchijPolzovatel) -> Zakaz:
+    """Получает корзину пользователя (заблокированной для изменения) или создаёт новую.
+    Ничего не коммитит — фиксирует вызывающий, одним commit на операцию."""
+    for _ in range(POPYTOK_SOZDAT_KORZINU):
+        zakaz = await naiti_korzinu(db, polzovatel, dlya_izmeneniya=True)
+        if zakaz:
+            return zakaz
+        zakaz = Zakaz(polzovatel_id=polzovatel.id, status=StatusZakaza.v_korzine, summa=0.0, pozitsii=[])
+        try:
+            # Точка сохранения: неудачная вставка откатывается одна, остальная
+            # транзакция (и загруженные объекты) остаются — в том числе у писателя
+            async with db.begin_nested():
+                db.add(zakaz)
+                await db.flush()
+            return zakaz
+        except IntegrityError as e:
+            # Параллельный запрос того же пользователя успел создать корзину (uq_zakazy_korzina).
+            # Ту корзину могли уже и оформить — поэтому ищем заново, а не считаем, что она есть
+            if not narushena_unikalnost(e):
+                raise
+    raise HTTPException(status_code=409, detail="Korzina izmenyaetsya parallelno, povtorite zapros")
+
+def status_json(zakaz_id: int, status: StatusZakaza, kurer_id: int | None = None) -> str:
+    """Короткое событие для потока статусов клиента (без позиций заказа)"""
+    return json.dumps({"id": zakaz_id, "status": status.value, "kurer_id": kurer_id})
+
+def opovestit_o_statuse(polzovatel_id: int, zakaz_id: int, status: StatusZakaza, kurer_id: int | None = None):
+    broker.opublikovat(kanal_polzovatelya(polzovatel_id), "status", status_json(zakaz_id, status, kurer_id))
+
+async def pereschitat_summu(db: AsyncSession, zakaz_id: int) -> float:
+    """Сумма по позициям в БД одним UPDATE. Позиции, загруженные до первой записи,
+    в SQLite могут быть уже устаревшими (транзакция начинается с первой записи),
+    поэтому считаем в той же пишущей транзакции, а не в Python"""
+    summa = select(func.coalesce(func.sum(PozitsiyaZakaza.cena_na_moment * PozitsiyaZakaza.kolichestvo), 0.0)) \
+        .where(PozitsiyaZakaza.zakaz_id == zakaz_id).scalar_subquery()
+    return (await db.execute(
+        update(Zakaz).where(Zakaz.id == zakaz_id).values(summa=summa).returning(Zakaz.summa)
+    )).scalar_one()
+
+def dobavit_pozitsii(zakaz_id: int, kolichestva: dict[int, int], ceny: dict[int, float]):
+    """Один INSERT ... ON CONFLICT: новые позиции вставляются, у существующих количество
+    увеличивается в самой БД — параллельные добавления не теряются"""
+    stmt = insert_s_konfliktom(PozitsiyaZakaza).values([
+        {"zakaz_id": zakaz_id, "blyudo_id": blyudo_id, "kolichestvo": kolichestvo, "cena_na_moment": ceny[blyudo_id]}
+        for blyudo_id, kolichestvo in kolichestva.items()
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=[PozitsiyaZakaza.zakaz_id, PozitsiyaZakaza.blyudo_id],
+        set_={"kolichestvo": PozitsiyaZakaza.kolichestvo + stmt.excluded.kolichestvo},
+    )
 
 
 @router.get("/korzina", response_model=ZakazOut)
-def poluchit_korzinu(db: Session = Depends(get_db), curr: Polzovatel = Depends(get_current_polzovatel)):
+async def poluchit_korzinu(db: AsyncSession = Depends(get_db), curr: TekushchijPolzovatel = Depends(get_current_polzovatel)):
     """Просмотр текущей корзины"""
-    return poluchit_ili_sozdat_korzinu(db, curr)
+    # Сумма поддерживается изменяющими операциями, поэтому чтение ничего не пишет.
+    # Пустая корзина создаётся один раз — при первом просмотре после оформления.
+    zakaz = await naiti_korzinu(db, curr)
+    if zakaz is None:
+        zakaz = await zapisat(db, lambda db: poluchit_ili_sozdat_korzinu(db, curr))
+    return zakaz
 
 
 @router.post("/korzina/dobavit", response_model=ZakazOut)
-def dobavit_v_korzinu(
+async def dobavit_v_korzinu(
     poz: PozitsiyaZakazaBase,
-    db: Session = Depends(get_db),
-    curr: Polzovatel = Depends(get_current_polzovatel)
+    request: Request,
+    klyuch: Optional[str] = Depends(klyuch_idempotentnosti),
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
 ):
     """Добавить блюдо в корзину (или увеличить количество, если уже есть)"""
-    zakaz = poluchit_ili_sozdat_korzinu(db, curr)
-
-    blyudo = db.query(Blyudo).filter(Blyudo.id == poz.blyudo_id).first()
-    if not blyudo:
-        raise HTTPException(status_code=404, detail="Blyudo ne najdeno")
-
-    # Ищем существующую позицию с этим блюдом
-    existing_poz = db.query(PozitsiyaZakaza).filter(
-        PozitsiyaZakaza.zakaz_id == zakaz.id,
-        PozitsiyaZakaza.blyudo_id == poz.blyudo_id
-    ).first()
-
-    if existing_poz:
-        existing_poz.kolichestvo += poz.kolichestvo
-    else:
-        new_poz = PozitsiyaZakaza(
-            zakaz_id=zakaz.id,
-            blyudo_id=poz.blyudo_id,
-            kolichestvo=poz.kolichestvo,
-            cena_na_moment=blyudo.cena
-        )
-        db.add(new_poz)
+    async def izmenenie(db: AsyncSession):
+        zakaz = await poluchit_ili_sozdat_korzinu(db, curr)
 
-    # Сохраняем изменения и обновляем сумму
-    db.commit()
-    db.refresh(zakaz)
-    zakaz.summa = sum(poz.cena_na_moment * poz.kolichestvo for poz in zakaz.pozitsii)
-    db.commit()
+        blyudo = await db.get(Blyudo, poz.blyudo_id)
+        if not blyudo:
+            raise HTTPException(status_code=404, detail="Blyudo ne najdeno")
 
-    return zakaz
+        await db.execute(dobavit_pozitsii(zakaz.id, {poz.blyudo_id: poz.kolichestvo}, {poz.blyudo_id: blyudo.cena}))
+        # Одна транзакция: позиции и сумма фиксируются вместе
+        await pereschitat_summu(db, zakaz.id)
+        return await zagruzit_zakaz(db, zakaz.id)
+
+    async def vypolnit():
+        return v_json(_zakaz_json, await zapisat(db, izmenenie))
+
+    # Повтор с тем же Idempotency-Key не добавит блюдо второй раз
+    return await odin_raz(request, curr.id, klyuch, vypolnit)
+
+
+@router.post("/korzina/dobavit-spisok", response_model=ZakazOut)
+async def dobavit_spisok_v_korzinu(
+    request: Request,
+    pozitsii: List[PozitsiyaZakazaBase] = Body(..., min_length=1, max_length=500),
+    klyuch: Optional[str] = Depends(klyuch_idempotentnosti),
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
+):
+    """Добавить несколько блюд за один запрос (повтор заказа, синхронизация корзины)"""
+    # Одинаковые блюда в запросе складываем
+    kolichestva: dict[int, int] = {}
+    for poz in pozitsii:
+        kolichestva[poz.blyudo_id] = kolichestva.get(poz.blyudo_id, 0) + poz.kolichestvo
+
+    async def izmenenie(db: AsyncSession, ceny: dict[int, float]):
+        zakaz = await poluchit_ili_sozdat_korzinu(db, curr)
+        await db.execute(dobavit_pozitsii(zakaz.id, kolichestva, ceny))
+        await pereschitat_summu(db, zakaz.id)
+        return await zagruzit_zakaz(db, zakaz.id)
+
+    async def vypolnit():
+        # Цены всех блюд — одним запросом IN
+        ceny = dict((await db.execute(
+            select(Blyudo.id, Blyudo.cena).where(Blyudo.id.in_(kolichestva))
+        )).all())
+        ne_najdeny = sorted(set(kolichestva) - set(ceny))
+        if ne_najdeny:
+            raise HTTPException(status_code=404, detail=f"Blyuda ne najdeny: {ne_najdeny}")
+        return v_json(_zakaz_json, await zapisat(db, lambda db: izmenenie(db, ceny)))
+
+    return await odin_raz(request, curr.id, klyuch, vypolnit)
 
 
 @router.delete("/korzina/pozitsiya/{blyudo_id}")
-def udalit_pozitsiyu_iz_korziny(
+async def udalit_pozitsiyu_iz_korziny(
     blyudo_id: int,
-    db: Session = Depends(get_db),
-    curr: Polzovatel = Depends(get_current_polzovatel)
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
 ):
     """Удалить конкретное блюдо из корзины (все количество)"""
-    zakaz = poluchit_ili_sozdat_korzinu(db, curr)
-
-    poz = db.query(PozitsiyaZakaza).filter(
-        PozitsiyaZakaza.zakaz_id == zakaz.id,
-        PozitsiyaZakaza.blyudo_id == blyudo_id
-    ).first()
+    async def izmenenie(db: AsyncSession):
+        zakaz = await naiti_korzinu(db, curr, dlya_izmeneniya=True)
+        udaleno = zakaz and (await db.execute(delete(PozitsiyaZakaza).where(
+            PozitsiyaZakaza.zakaz_id == zakaz.id, PozitsiyaZakaza.blyudo_id == blyudo_id
+        ))).rowcount
 
-    if not poz:
-        raise HTTPException(status_code=404, detail="Eto blyudo ne v korzine")
+        if not udaleno:
+            raise HTTPException(status_code=404, detail="Eto blyudo ne v korzine")
 
-    db.delete(poz)
-    db.commit()
+        return await pereschitat_summu(db, zakaz.id)
 
-    # Пересчитываем сумму
-    db.refresh(zakaz)
-    zakaz.summa = sum(poz.cena_na_moment * poz.kolichestvo for poz in zakaz.pozitsii)
-    db.commit()
-
-    return {"status": "pozitsiya udalena", "novaya_summa": zakaz.summa}
+    return {"status": "pozitsiya udalena", "novaya_summa": await zapisat(db, izmenenie)}
 
 
 @router.delete("/korzina/ochistit")
-def ochistit_korzinu(
-    db: Session = Depends(get_db),
-    curr: Polzovatel = Depends(get_current_polzovatel)
+async def ochistit_korzinu(
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
 ):
     """Полностью очистить корзину"""
-    zakaz = poluchit_ili_sozdat_korzinu(db, curr)
+    async def izmenenie(db: AsyncSession):
+        zakaz = await naiti_korzinu(db, curr, dlya_izmeneniya=True)
 
-    # Удаляем все позиции
-    db.query(PozitsiyaZakaza).filter(PozitsiyaZakaza.zakaz_id == zakaz.id).delete()
-    zakaz.summa = 0.0
-    db.commit()
+        # Удаляем все позиции (если корзины нет — и чистить нечего)
+        if zakaz:
+            await db.execute(delete(PozitsiyaZakaza).where(PozitsiyaZakaza.zakaz_id == zakaz.id))
+            zakaz.summa = 0.0
 
+    await zapisat(db, izmenenie)
     return {"status": "korzina ochishchena"}
 
 
 @router.post("/oformit", response_model=ZakazOut)
-def oformit_zakaz(
+async def oformit_zakaz(
     data: ZakazCreate,
-    db: Session = Depends(get_db),
-    curr: Polzovatel = Depends(get_current_polzovatel)
+    request: Request,
+    klyuch: Optional[str] = Depends(klyuch_idempotentnosti),
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
 ):
     """Оформить заказ из корзины"""
-    zakaz = poluchit_ili_sozdat_korzinu(db, curr)
+    async def izmenenie(db: AsyncSession):
+        if not data.adres_dostavki:
+            raise HTTPException(status_code=400, detail="Ukazhite adres dostavki")
 
-    if zakaz.summa <= 0 or not zakaz.pozitsii:
-        raise HTTPException(status_code=400, detail="Korzina pusta — dobavte blyuda")
+        zakaz = await naiti_korzinu(db, curr, dlya_izmeneniya=True)
+        # Сумма пересчитывается по позициям, а не берётся из строки заказа
+        if not zakaz or await pereschitat_summu(db, zakaz.id) <= 0:
+            raise HTTPException(status_code=400, detail="Korzina pusta — dobavte blyuda")
 
-    if not data.adres_dostavki:
-        raise HTTPException(status_code=400, detail="Ukazhite adres dostavki")
+        zakaz.status = StatusZakaza.oformlen
+        zakaz.adres_dostavki = data.adres_dostavki
+        await db.flush()
+        return await zagruzit_zakaz(db, zakaz.id)
 
-    zakaz.status = StatusZakaza.oformlen
-    zakaz.adres_dostavki = data.adres_dostavki
-    db.commit()
-    db.refresh(zakaz)
+    async def vypolnit():
+        zakaz = await zapisat(db, izmenenie)
+        telo = v_json(_zakaz_json, zakaz)
+        # Курьеры на потоке сразу видят новый заказ
+        broker.opublikovat(KANAL_KURERY, "novyj", telo.decode())
+        opovestit_o_statuse(curr.id, zakaz.id, zakaz.status)
+        return telo
 
-    return zakaz
+    return await odin_raz(request, curr.id, klyuch, vypolnit)
 
 
 @router.get("/", response_model=List[ZakazOut])
-def poluchit_moi_zakazy(
-    db: Session = Depends(get_db),
-    curr: Polzovatel = Depends(get_current_polzovatel)
+async def poluchit_moi_zakazy(
+    status: Optional[StatusZakaza] = None,
+    do_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
 ):
-    """Получить список всех заказов пользователя (кроме корзины)"""
-    return db.query(Zakaz).filter(
-        Zakaz.polzovatel_id == curr.id,
-        Zakaz.status != StatusZakaza.v_korzine
-    ).order_by(Zakaz.data_sozdaniya.desc()).all()
-
-def tolko_kurer(curr: Polzovatel = Depends(get_current_polzovatel)):
+    """Получить заказы пользователя (кроме корзины), новые первыми — и живые, и архивные.
+    Следующая страница — do_id = id последнего заказа в ответе."""
+    def stranitsa(model, kolonki):
+        query = select(*kolonki).where(
+            model.polzovatel_id == curr.id,
+            model.status != StatusZakaza.v_korzine
+        )
+        if status is not None:
+            query = query.where(model.status == status)
+        # id растёт вместе с data_sozdaniya, поэтому курсор — по первичному ключу
+        if do_id is not None:
+            query = query.where(model.id < do_id)
+        return query
+
+    zhivye = stranitsa(Zakaz, KOLONKI_ZAKAZA)
+    if status is not None and status not in KONECHNYE_STATUSY:
+        # Незавершённых заказов в архиве нет
+        stroki = await db.execute(zhivye.order_by(Zakaz.id.desc()).limit(limit))
+        return json_otvet(await zakazy_v_dict(db, stroki))
+
+    # ORDER BY у всего UNION ALL: обе таблицы читаются по индексу (polzovatel_id, id)
+    # уже в нужном порядке и сливаются без сортировки, пока не наберётся limit строк
+    obe = union_all(zhivye, stranitsa(ArkhivZakaza, KOLONKI_ARKHIVA))
+    stroki = await db.execute(obe.order_by(obe.selected_columns.id.desc()).limit(limit))
+    return json_otvet(await zakazy_v_dict(db, stroki, arkhiv=True))
+
+# Поток статусов своих заказов вместо повторных GET /zakazy/:
+# снимок активных заказов, затем событие "status" при каждом переходе
+@router.get("/status-potok")
+async def potok_statusov(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
+):
+    kanal = kanal_polzovatelya(curr.id)
+    # У клиента событий мало — короткая очередь держит память на соединение малой
+    ochered = broker.podpisatsya(kanal, razmer_ocheredi=16)
+    try:
+        aktivnye = (await db.execute(
+            select(Zakaz.id, Zakaz.status, Zakaz.kurer_id).where(
+                Zakaz.polzovatel_id == curr.id,
+                Zakaz.status.in_([StatusZakaza.oformlen, StatusZakaza.v_dostavke, StatusZakaza.dostavlen])
+            )
+        )).all()
+        await db.close()
+        snimok = [("status", status_json(*zakaz)) for zakaz in aktivnye]
+    except BaseException:
+        broker.otpisatsya(kanal, ochered)
+        raise
+    return sse_otvet(request, kanal, ochered, snimok)
+
+async def tolko_kurer(curr: TekushchijPolzovatel = Depends(get_current_polzovatel)):
     if curr.rol != RolPolzovatelya.kurer:
         raise HTTPException(status_code=403, detail="Tolko kurer mozhet eto delat")
     return curr
 
-# Список заказов, доступных для взятия в доставку (оформленные, но не взятые)
-@router.get("/dostupnye-dlya-dostavki", response_model=List[ZakazOut])
-def poluchit_dostupnye_zakazy(db: Session = Depends(get_db), kurer: Polzovatel = Depends(tolko_kurer)):
-    return db.query(Zakaz).filter(
+def zapros_dostupnykh_zakazov(query=None):
+    """Оформленные, но ещё не взятые заказы — старые первыми.
+    По умолчанию — ORM-объекты; для быстрого JSON передаётся select(*KOLONKI_ZAKAZA)."""
+    return (zapros_zakazov() if query is None else query).where(
         Zakaz.status == StatusZakaza.oformlen,
         Zakaz.kurer_id.is_(None)
-    ).all()
+    ).order_by(Zakaz.id)
+
+# Список заказов, доступных для взятия в доставку (оформленные, но не взятые)
+# Частый опрос — для живого списка есть поток /dostupnye-dlya-dostavki/potok
+@router.get("/dostupnye-dlya-dostavki", response_model=List[ZakazOut], dependencies=[Depends(Ogranichenie(60, 60, vsplesk=10))])
+async def poluchit_dostupnye_zakazy(
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    kurer: TekushchijPolzovatel = Depends(tolko_kurer)
+):
+    stroki = await db.execute(zapros_dostupnykh_zakazov(select(*KOLONKI_ZAKAZA)).limit(limit))
+    return json_otvet(await zakazy_v_dict(db, stroki))
+
+# Поток вместо опроса: снимок доступных заказов, затем события
+# "novyj" (ZakazOut) при оформлении и "snyat" ({"id"}) когда заказ взят
+@router.get("/dostupnye-dlya-dostavki/potok")
+async def potok_dostupnykh_zakazov(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    kurer: TekushchijPolzovatel = Depends(tolko_kurer)
+):
+    ochered = broker.podpisatsya(KANAL_KURERY)
+    try:
+        stroki = await db.execute(zapros_dostupnykh_zakazov(select(*KOLONKI_ZAKAZA)).limit(200))
+        snimok = [("novyj", v_bajty(z).decode()) for z in await zakazy_v_dict(db, stroki)]
+    except BaseException:
+        # Поток не начнётся, и отписаться в его finally будет некому
+        broker.otpisatsya(KANAL_KURERY, ochered)
+        raise
+    # Соединение с БД больше не нужно — поток может жить часами
+    await db.close()
+    return sse_otvet(request, KANAL_KURERY, ochered, snimok)
 
 # Курьер берёт заказ в доставку
 @router.post("/{zakaz_id}/vzyat-v-dostavku")
-def vzyat_zakaz_v_dostavku(
+async def vzyat_zakaz_v_dostavku(
     zakaz_id: int,
-    db: Session = Depends(get_db),
-    kurer: Polzovatel = Depends(tolko_kurer)
+    db: AsyncSession = Depends(get_db),
+    kurer: TekushchijPolzovatel = Depends(tolko_kurer)
 ):
-    zakaz = db.query(Zakaz).filter(Zakaz.id == zakaz_id).first()
-    if not zakaz:
-        raise HTTPException(404, "Zakaz ne najden")
-    if zakaz.status != StatusZakaza.oformlen:
-        raise HTTPException(400, "Zakaz uzhe v rabote ili otmenen")
-    if zakaz.kurer_id is not None:
-        raise HTTPException(400, "Zakaz uzhe vzyat drugim kurerom")
-
-    zakaz.kurer_id = kurer.id
-    zakaz.status = StatusZakaza.v_dostavke
-    db.commit()
-    db.refresh(zakaz)
+    async def izmenenie(db: AsyncSession):
+        # Условный UPDATE: из нескольких курьеров заказ получит ровно один
+        rezultat = await db.execute(
+            update(Zakaz)
+            .where(
+                Zakaz.id == zakaz_id,
+                Zakaz.status == StatusZakaza.oformlen,
+                Zakaz.kurer_id.is_(None)
+            )
+            .values(kurer_id=kurer.id, status=StatusZakaza.v_dostavke)
+            .returning(Zakaz.polzovatel_id)
+        )
+        polzovatel_id = rezultat.scalar()
+        if polzovatel_id is None:
+            # Ничего не обновили — выясняем причину для понятной ошибки
+            zakaz = await db.get(Zakaz, zakaz_id)
+            if not zakaz:
+                raise HTTPException(404, "Zakaz ne najden")
+            if zakaz.status != StatusZakaza.oformlen:
+                raise HTTPException(400, "Zakaz uzhe v rabote ili otmenen")
+            raise HTTPException(400, "Zakaz uzhe vzyat drugim kurerom")
+        return polzovatel_id
+
+    polzovatel_id = await zapisat(db, izmenenie)
+
+    broker.opublikovat(KANAL_KURERY, "snyat", f'{{"id": {zakaz_id}}}')
+    opovestit_o_statuse(polzovatel_id, zakaz_id, StatusZakaza.v_dostavke, kurer.id)
     return {"status": "Zakaz vzyat v dostavku", "zakaz_id": zakaz_id}
 
 # Курьер отмечает, что доставил заказ
 @router.post("/{zakaz_id}/dostavlen-kurerom")
-def otmetit_dostavleno_kurerom(
+async def otmetit_dostavleno_kurerom(
     zakaz_id: int,
-    db: Session = Depends(get_db),
-    kurer: Polzovatel = Depends(tolko_kurer)
+    db: AsyncSession = Depends(get_db),
+    kurer: TekushchijPolzovatel = Depends(tolko_kurer)
 ):
-    zakaz = db.query(Zakaz).filter(Zakaz.id == zakaz_id).first()
-    if not zakaz:
-        raise HTTPException(404, "Zakaz ne najden")
-    if zakaz.kurer_id != kurer.id:
-        raise HTTPException(403, "Eto ne vash zakaz")
-    if zakaz.status != StatusZakaza.v_dostavke:
-        raise HTTPException(400, "Zakaz ne v dostavke")
-
-    zakaz.status = StatusZakaza.dostavlen  # Ждём подтверждения от пользователя
-    db.commit()
+    async def izmenenie(db: AsyncSession):
+        zakaz = await db.get(Zakaz, zakaz_id)
+        if not zakaz:
+            raise HTTPException(404, "Zakaz ne najden")
+        if zakaz.kurer_id != kurer.id:
+            raise HTTPException(403, "Eto ne vash zakaz")
+        if zakaz.status != StatusZakaza.v_dostavke:
+            raise HTTPException(400, "Zakaz ne v dostavke")
+
+        zakaz.status = StatusZakaza.dostavlen  # Ждём подтверждения от пользователя
+        return zakaz
+
+    zakaz = await zapisat(db, izmenenie)
+    opovestit_o_statuse(zakaz.polzovatel_id, zakaz.id, zakaz.status, zakaz.kurer_id)
     return {"status": "Zakaz otmechen kak dostavlennyj. Zhdem podtverzhdeniya ot klienta"}
 
 # Пользователь подтверждает получение заказа → заказ завершён
 @router.post("/{zakaz_id}/podtverdit-poluchenie")
-def podtverdit_poluchenie(
+async def podtverdit_poluchenie(
     zakaz_id: int,
-    db: Session = Depends(get_db),
-    curr: Polzovatel = Depends(get_current_polzovatel)
+    db: AsyncSession = Depends(get_db),
+    curr: TekushchijPolzovatel = Depends(get_current_polzovatel)
 ):
-    zakaz = db.query(Zakaz).filter(Zakaz.id == zakaz_id).first()
-    if not zakaz:
-        raise HTTPException(404, "Zakaz ne najden")
-    if zakaz.polzovatel_id != curr.id:
-        raise HTTPException(403, "Eto ne vash zakaz")
-    if zakaz.status != StatusZakaza.dostavlen:
-        raise HTTPException(400, "Zakaz eshche ne dostavlen ili uzhe podtverzhden")
-
-    zakaz.podtverzhden_polzovatelem = True
-    zakaz.status = StatusZakaza.zavershen  # Новый статус — полностью завершён
-    db.commit()
-    return {"status": "Spasibo! Zakaz uspeshno zavershen!"}
+    async def izmenenie(db: AsyncSession):
+        zakaz = await db.get(Zakaz, zakaz_id)
+        if not zakaz:
+            raise HTTPException(404, "Zakaz ne najden")
+        if zakaz.polzovatel_id != curr.id:
+            raise HTTPException(403, "Eto ne vash zakaz")
+        if zakaz.status != StatusZakaza.dostavlen:
+            raise HTTPException(400, "Zakaz eshche ne dostavlen ili uzhe podtverzhden")
+
+        # Условный UPDATE: повторное подтверждение не учтёт заказ в аналитике дважды
+        rezultat = await db.execute(
+            update(Zakaz)
+            .where(Zakaz.id == zakaz_id, Zakaz.status == StatusZakaza.dostavlen)
+            .values(podtverzhden_polzovatelem=True, status=StatusZakaza.zavershen,  # полностью завершён
+                    data_zaversheniya=datetime.utcnow())
+        )
+        if rezultat.rowcount == 0:
+            raise HTTPException(400, "Zakaz eshche ne dostavlen ili uzhe podtverzhden")
+        await uchest_zakaz(db, zakaz_id)
+        return zakaz
 
-# Добавить новый статус в enum (в models.py)
-class StatusZakaza(str, enum.Enum):
-    v_korzine = "v_korzine"
-    oformlen = "oformlen"
-    v_dostavke = "v_dostavke"
-    dostavlen = "dostavlen"        # Доставлен курьером, ждёт подтверждения
-    zavershen = "zavershen"        # Полностью завершён (подтверждён пользователем)
-    otmenen = "otmenen"
+    zakaz = await zapisat(db, izmenenie)
+    opovestit_o_statuse(zakaz.polzovatel_id, zakaz.id, StatusZakaza.zavershen, zakaz.kurer_id)
+    return {"status": "Spasibo! Zakaz uspeshno zavershen!"}
 
 # Заказы, которые сейчас везёт этот курьер
 @router.get("/moi-zakazy", response_model=List[ZakazOut])
-def poluchit_moi_zakazy_kureru(db: Session = Depends(get_db), kurer: Polzovatel = Depends(tolko_kurer)):
-    return db.query(Zakaz).filter(
+async def poluchit_moi_zakazy_kureru(db: AsyncSession = Depends(get_db), kurer: TekushchijPolzovatel = Depends(tolko_kurer)):
+    stroki = await db.execute(select(*KOLONKI_ZAKAZA).where(
         Zakaz.kurer_id == kurer.id,
         Zakaz.status.in_([StatusZakaza.v_dostavke, StatusZakaza.dostavlen])
-    ).all()
\ No newline at end of file
+    ))
+    return json_otvet(await zakazy_v_dict(db, stroki))
\ No newline at end of file
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field, computed_field
+from datetime import date, datetime
 from typing import List
+from foto import url_varianta
 
 class PolzovatelCreate(BaseModel):
     username: str
@@ -44,6 +45,18 @@ class BlyudoCreate(BlyudoBase):
 class BlyudoOut(BlyudoBase):
     id: int
     foto_url: str | None = None
+    foto_varianty: bool = Field(False, exclude=True)
+
+    # Уменьшенные WebP-копии для списков (создаются в фоне после загрузки)
+    @computed_field
+    @property
+    def foto_mini_url(self) -> str | None:
+        return url_varianta(self.foto_url, "mini", self.foto_varianty)
+
+    @computed_field
+    @property
+    def foto_sred_url(self) -> str | None:
+        return url_varianta(self.foto_url, "sred", self.foto_varianty)
 
     class Config:
         from_attributes = True
@@ -81,4 +94,31 @@ class ZakazOut(BaseModel):
     pozitsii: List[PozitsiyaZakazaOut] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PoiskOut(BaseModel):
+    blyuda: List[BlyudoOut] = []
+    restorany: List[RestoranOut] = []
+
+class ProdazhiRestoranaOut(BaseModel):
+    restoran_id: int
+    nazvanie: str
+    vyruchka: float
+    zakazov: int
+    pozitsij: int
+
+class ProdazhiBlyudaOut(BaseModel):
+    blyudo_id: int
+    nazvanie: str
+    restoran_id: int
+    vyruchka: float
+    kolichestvo: int
+
+class ProdazhiZaDenOut(BaseModel):
+    den: date
+    vyruchka: float
+    zakazov: int
+    pozitsij: int
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,75 @@
+import asyncio
+from collections import defaultdict
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+# Каналы
+KANAL_KURERY = "kurery"  # новые оформленные заказы и снятие взятых
+
+def kanal_polzovatelya(polzovatel_id: int) -> str:
+    """Изменения статусов заказов конкретного клиента"""
+    return f"polzovatel:{polzovatel_id}"
+
+# Интервал пустых комментариев, чтобы прокси не закрывали простаивающее соединение
+PING_INTERVAL = 15
+
+# Маркер переполнения: подписчик не успевает читать — закрываем поток,
+# клиент переподключается и получает свежий снимок
+_PEREPOLNENIE = ("perepolnenie", "{}")
+
+class Broker:
+    """Pub/sub в памяти процесса: у каждого подписчика своя ограниченная очередь"""
+
+    def __init__(self, razmer_ocheredi: int = 64):
+        self.razmer_ocheredi = razmer_ocheredi
+        self._podpischiki: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    def podpisatsya(self, kanal: str, razmer_ocheredi: int | None = None) -> asyncio.Queue:
+        ochered = asyncio.Queue(maxsize=razmer_ocheredi or self.razmer_ocheredi)
+        self._podpischiki[kanal].add(ochered)
+        return ochered
+
+    def otpisatsya(self, kanal: str, ochered: asyncio.Queue):
+        podpischiki = self._podpischiki.get(kanal)
+        if podpischiki is not None:
+            podpischiki.discard(ochered)
+            if not podpischiki:
+                del self._podpischiki[kanal]
+
+    def opublikovat(self, kanal: str, tip: str, dannye: str):
+        """Рассылает событие; dannye — уже сериализованный JSON (общий для всех)"""
+        for ochered in list(self._podpischiki.get(kanal, ())):
+            try:
+                ochered.put_nowait((tip, dannye))
+            except asyncio.QueueFull:
+                # Не копим события для медленного клиента — он получит снимок заново
+                while not ochered.empty():
+                    ochered.get_nowait()
+                ochered.put_nowait(_PEREPOLNENIE)
+                self.otpisatsya(kanal, ochered)
+
+broker = Broker()
+
+def _sse(tip: str, dannye: str) -> str:
+    return f"event: {tip}\ndata: {dannye}\n\n"
+
+def sse_otvet(request: Request, kanal: str, ochered: asyncio.Queue, snimok: list[tuple[str, str]]) -> StreamingResponse:
+    """Server-Sent Events: сначала снимок, затем события канала.
+    Подписываться нужно до чтения снимка, чтобы не потерять события между ними."""
+    async def potok():
+        try:
+            for tip, dannye in snimok:
+                yield _sse(tip, dannye)
+            while not await request.is_disconnected():
+                try:
+                    tip, dannye = await asyncio.wait_for(ochered.get(), timeout=PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(tip, dannye)
+                if (tip, dannye) == _PEREPOLNENIE:
+                    break
+        finally:
+            broker.otpisatsya(kanal, ochered)
+
+    return StreamingResponse(potok(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
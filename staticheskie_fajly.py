@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# Имена фото уникальны ({id}_{uuid}.{ext}) и никогда не перезаписываются
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class FotoStaticFiles(StaticFiles):
+    """StaticFiles для неизменяемых фото блюд: вечное кэширование у клиента,
+    LRU в памяти для маленьких файлов. Сжатых копий нет: загружаются только
+    JPEG, PNG, WebP и GIF, которые уже сжаты.
+    Range и pathsend (zero-copy, если сервер поддерживает) даёт FileResponse."""
+
+    def __init__(self, *args, maks_razmer_v_pamyati: int = 64 * 1024, obem_kesha: int = 32 * 1024 * 1024, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.maks_razmer_v_pamyati = maks_razmer_v_pamyati
+        self.obem_kesha = obem_kesha
+        self._kesh: OrderedDict[tuple, bytes] = OrderedDict()
+        self._zanyato = 0
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        response.headers["cache-control"] = CACHE_CONTROL
+        if not isinstance(response, FileResponse) or response.status_code != 200 or "range" in Headers(scope=scope):
+            return response
+
+        stat_result = response.stat_result
+        if stat_result is not None and stat_result.st_size <= self.maks_razmer_v_pamyati:
+            klyuch = (response.path, stat_result.st_mtime_ns, stat_result.st_size)
+            telo = self._kesh.get(klyuch)
+            if telo is None:
+                telo = await anyio.Path(response.path).read_bytes()
+                self._polozhit(klyuch, telo)
+            else:
+                self._kesh.move_to_end(klyuch)
+            return Response(telo, headers=dict(response.headers), media_type=response.media_type)
+        return response
+
+    def _polozhit(self, klyuch: tuple, telo: bytes):
+        self._kesh[klyuch] = telo
+        self._zanyato += len(telo)
+        while self._zanyato > self.obem_kesha:
+            _, vytesnennoe = self._kesh.popitem(last=False)
+            self._zanyato -= len(vytesnennoe)
+
@@ -0,0 +1,99 @@
+"""Общие фикстуры тестов.
+
+База по умолчанию — временный файл SQLite; TEST_DATABASE_URL=postgresql+asyncpg://...
+прогоняет те же тесты на PostgreSQL (база очищается перед прогоном).
+Движок создаётся при импорте database, поэтому URL задаётся до импорта приложения.
+"""
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+
+_papka = tempfile.mkdtemp(prefix="food-test-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{_papka}/test.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from auth import create_access_token
+from database import Base, ETO_SQLITE, SessionLocal, engine
+from main import app
+from migratsii import podgotovit_skhemu
+from models import Blyudo, Polzovatel, Restoran, RolPolzovatelya
+
+_nomer = itertools.count(1)
+
+
+async def _pereustanovit_skhemu():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await podgotovit_skhemu(engine)
+
+
+@pytest.fixture(scope="session")
+def klient():
+    with TestClient(app) as klient:
+        if not ETO_SQLITE:
+            # Файл SQLite новый, а база PostgreSQL могла остаться от прошлого прогона
+            klient.portal.call(_pereustanovit_skhemu)
+        yield klient
+
+
+@pytest.fixture(scope="session")
+def v_bd(klient):
+    """v_bd(func): выполняет async func(db) в цикле событий приложения и фиксирует"""
+    async def _vypolnit(func):
+        async with SessionLocal() as db:
+            rezultat = await func(db)
+            await db.commit()
+            return rezultat
+
+    return lambda func: klient.portal.call(_vypolnit, func)
+
+
+@pytest.fixture(scope="session")
+def sozdat_polzovatelya(v_bd):
+    """sozdat_polzovatelya(rol) -> (id, заголовки с токеном)"""
+    def _sozdat(rol: RolPolzovatelya = RolPolzovatelya.polzovatel):
+        username = f"test{next(_nomer)}"
+
+        async def dobavit(db):
+            polzovatel = Polzovatel(username=username, hashed_password="-", rol=rol)
+            db.add(polzovatel)
+            await db.flush()
+            return polzovatel.id
+
+        polzovatel_id = v_bd(dobavit)
+        return polzovatel_id, {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+    return _sozdat
+
+
+@pytest.fixture(scope="session")
+def menyu(v_bd):
+    """Ресторан с десятью блюдами: список (id, цена)"""
+    async def dobavit(db):
+        restoran = Restoran(nazvanie="Testovyj", adres="ulitsa 1")
+        blyuda = [Blyudo(nazvanie=f"Blyudo {i}", cena=float(i), restoran=restoran) for i in range(1, 11)]
+        db.add_all(blyuda)
+        await db.flush()
+        return [(b.id, b.cena) for b in blyuda]
+
+    return v_bd(dobavit)
+
+
+@contextmanager
+def schetchik_sql():
+    """Список (SQL, параметры) команд, выполненных внутри блока"""
+    komandy = []
+
+    def zapisat(conn, cursor, statement, parameters, context, executemany):
+        komandy.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", zapisat)
+    try:
+        yield komandy
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", zapisat)
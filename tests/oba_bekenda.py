@@ -0,0 +1,31 @@
+"""Прогон тестов на обеих базах: сначала SQLite, затем PostgreSQL.
+
+python tests/oba_bekenda.py postgresql+asyncpg://postgres@localhost/food_test [аргументы pytest]
+URL можно задать и переменной TEST_PG_URL. Код выхода ненулевой, если упал хотя бы один прогон.
+"""
+import os
+import subprocess
+import sys
+
+
+def main(argumenty: list[str]) -> int:
+    if argumenty and argumenty[0].startswith("postgresql"):
+        url_pg, argumenty = argumenty[0], argumenty[1:]
+    else:
+        url_pg = os.getenv("TEST_PG_URL")
+    if not url_pg:
+        print("Ukazhite URL PostgreSQL: argumentom ili v TEST_PG_URL", file=sys.stderr)
+        return 2
+
+    kornevaya_papka = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    okruzhenie = {k: v for k, v in os.environ.items() if k != "TEST_DATABASE_URL"}
+    kod = 0
+    for imya, url in (("SQLite", None), ("PostgreSQL", url_pg)):
+        print(f"== {imya}", flush=True)
+        env = okruzhenie if url is None else {**okruzhenie, "TEST_DATABASE_URL": url}
+        kod |= subprocess.run([sys.executable, "-m", "pytest", *argumenty], cwd=kornevaya_papka, env=env).returncode
+    return kod
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
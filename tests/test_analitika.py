@@ -0,0 +1,104 @@
+"""Пересчёт агрегатов из истории совпадает с тем, что копится при завершении заказов;
+день продажи — дата завершения, а не создания заказа."""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from analitika import pereschitat
+from database import engine
+from models import (ArkhivPozitsii, ArkhivZakaza, PozitsiyaZakaza, ProdazhiBlyuda, ProdazhiRestorana,
+                    ProdazhiZaDen, RolPolzovatelya, StatusZakaza, Zakaz)
+
+
+def test_pereschitat_po_dnyam(klient, v_bd, sozdat_polzovatelya, menyu):
+    polzovatel_id, _ = sozdat_polzovatelya()
+    (blyudo_1, cena_1), (blyudo_2, cena_2) = menyu[:2]
+    dni = [datetime(2020, 1, den, 12) for den in (1, 2, 3)]
+
+    async def dobavit(db):
+        for model in (ProdazhiZaDen, ProdazhiBlyuda):
+            await db.execute(delete(model))
+        # Агрегат дня, от которого не осталось заказов
+        db.add(ProdazhiZaDen(den=date(2019, 12, 31), vyruchka=5.0, zakazov=1, pozitsij=1))
+        for data in dni:
+            for status in (StatusZakaza.zavershen, StatusZakaza.zavershen, StatusZakaza.otmenen):
+                # Корзина создана за неделю до завершения — день продажи всё равно data
+                db.add(Zakaz(polzovatel_id=polzovatel_id, status=status, summa=0.0,
+                             data_sozdaniya=data - timedelta(days=7), data_zaversheniya=data, pozitsii=[
+                    PozitsiyaZakaza(blyudo_id=blyudo_1, kolichestvo=2, cena_na_moment=cena_1),
+                    PozitsiyaZakaza(blyudo_id=blyudo_2, kolichestvo=1, cena_na_moment=cena_2),
+                ]))
+        # Архивный заказ второго дня
+        db.add(ArkhivZakaza(id=10_000_000, polzovatel_id=polzovatel_id, status=StatusZakaza.zavershen,
+                            summa=0.0, data_sozdaniya=dni[0], data_zaversheniya=dni[1]))
+        await db.flush()
+        db.add(ArkhivPozitsii(id=10_000_000, zakaz_id=10_000_000, blyudo_id=blyudo_1, kolichestvo=1,
+                              cena_na_moment=cena_1))
+
+    v_bd(dobavit)
+    assert klient.portal.call(pereschitat, engine) >= 7
+
+    async def prochitat(db):
+        return (await db.execute(select(ProdazhiZaDen.den, ProdazhiZaDen.vyruchka, ProdazhiZaDen.zakazov)
+                                 .where(ProdazhiZaDen.den <= date(2020, 1, 3)).order_by(ProdazhiZaDen.den))).all()
+
+    vyruchka = 2 * (2 * cena_1 + cena_2)
+    assert [tuple(stroka) for stroka in v_bd(prochitat)] == [
+        (date(2020, 1, 1), vyruchka, 2),
+        (date(2020, 1, 2), vyruchka + cena_1, 3),
+        (date(2020, 1, 3), vyruchka, 2),
+    ]
+
+
+def _snimok(v_bd) -> dict:
+    """{день: строки всех агрегатов этого дня}"""
+    async def prochitat(db):
+        dni = {}
+        for model in (ProdazhiZaDen, ProdazhiRestorana, ProdazhiBlyuda):
+            for stroka in (await db.scalars(select(model))).all():
+                polya = tuple(sorted((k, v) for k, v in vars(stroka).items() if not k.startswith("_")))
+                dni.setdefault(stroka.den, set()).add((model.__tablename__, polya))
+        return dni
+
+    return v_bd(prochitat)
+
+
+def _zavershit_zakaz(klient, v_bd, zagolovki, kurer, pozitsii, sozdan_dnej_nazad=0):
+    """Полный путь заказа через API: корзина, оформление, доставка, подтверждение"""
+    for blyudo_id, kolichestvo in pozitsii:
+        otvet = klient.post("/zakazy/korzina/dobavit", json={"blyudo_id": blyudo_id, "kolichestvo": kolichestvo},
+                            headers=zagolovki)
+        assert otvet.status_code == 200, otvet.text
+    zakaz_id = otvet.json()["id"]
+
+    async def sostarit(db):
+        await db.execute(update(Zakaz).where(Zakaz.id == zakaz_id).values(
+            data_sozdaniya=datetime.utcnow() - timedelta(days=sozdan_dnej_nazad)))
+
+    v_bd(sostarit)
+    for url, kto, telo in (("/zakazy/oformit", zagolovki, {"adres_dostavki": "ulitsa 5"}),
+                           (f"/zakazy/{zakaz_id}/vzyat-v-dostavku", kurer, None),
+                           (f"/zakazy/{zakaz_id}/dostavlen-kurerom", kurer, None),
+                           (f"/zakazy/{zakaz_id}/podtverdit-poluchenie", zagolovki, None)):
+        otvet = klient.post(url, json=telo, headers=kto)
+        assert otvet.status_code == 200, otvet.text
+
+
+def test_pereschet_sovpadaet_s_nakoplennym(klient, v_bd, sozdat_polzovatelya, menyu):
+    """Заказы, завершённые через API (uchest_zakaz), дают те же агрегаты, что и пересчёт;
+    корзина, созданная месяц назад, продана сегодня"""
+    klient.portal.call(pereschitat, engine)  # агрегаты соответствуют истории до теста
+    do = _snimok(v_bd)
+
+    _, zagolovki = sozdat_polzovatelya()
+    _, kurer = sozdat_polzovatelya(RolPolzovatelya.kurer)
+    (blyudo_1, _), (blyudo_2, _), (blyudo_3, _) = menyu[3:6]
+    _zavershit_zakaz(klient, v_bd, zagolovki, kurer, [(blyudo_1, 2), (blyudo_2, 1)], sozdan_dnej_nazad=30)
+    _zavershit_zakaz(klient, v_bd, zagolovki, kurer, [(blyudo_2, 3)])
+    _zavershit_zakaz(klient, v_bd, zagolovki, kurer, [(blyudo_1, 1), (blyudo_3, 4)])
+    nakopleno = _snimok(v_bd)
+
+    assert {den for den in nakopleno.keys() | do.keys() if nakopleno.get(den) != do.get(den)} \
+        == {datetime.utcnow().date()}
+    klient.portal.call(pereschitat, engine)
+    assert _snimok(v_bd) == nakopleno
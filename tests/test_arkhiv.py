@@ -0,0 +1,110 @@
+"""Архивация: срок — от завершения заказа; id заказов и позиций не выдаются повторно.
+
+Все заказы создаются «200 дней назад»: архивация читает заказы по id до первого
+свежего, поэтому свежий заказ перед старыми остановил бы проход.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from arkhiv import arkhivirovat
+from database import engine
+from models import ArkhivZakaza, PozitsiyaZakaza, StatusZakaza, Zakaz
+
+
+def _zakaz(polzovatel_id, menyu, sozdan_dnej_nazad, zavershen_dnej_nazad=None, status=StatusZakaza.zavershen):
+    seichas = datetime.utcnow()
+    return Zakaz(
+        polzovatel_id=polzovatel_id, status=status, summa=1.0,
+        data_sozdaniya=seichas - timedelta(days=sozdan_dnej_nazad),
+        data_zaversheniya=None if zavershen_dnej_nazad is None else seichas - timedelta(days=zavershen_dnej_nazad),
+        pozitsii=[PozitsiyaZakaza(blyudo_id=menyu[0][0], kolichestvo=1, cena_na_moment=1.0)],
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def sostarit_chuzhie_zakazy(v_bd):
+    """Заказы предыдущих модулей созданы «сейчас» и стоят по id раньше здешних — по той же
+    причине они тоже становятся старыми. Статус и время завершения не меняются"""
+    async def sostarit(db):
+        granitsa = datetime.utcnow() - timedelta(days=200)
+        await db.execute(update(Zakaz).where(Zakaz.data_sozdaniya > granitsa).values(data_sozdaniya=granitsa))
+
+    v_bd(sostarit)
+
+
+def _v_arkhive(v_bd, id_zakazov):
+    async def prochitat(db):
+        return set((await db.scalars(select(ArkhivZakaza.id).where(ArkhivZakaza.id.in_(id_zakazov)))).all())
+
+    return v_bd(prochitat)
+
+
+def test_srok_ot_zaversheniya(klient, v_bd, sozdat_polzovatelya, menyu):
+    polzovatel_id, _ = sozdat_polzovatelya()
+
+    async def dobavit(db):
+        zakazy = [
+            _zakaz(polzovatel_id, menyu, 200, 100),  # завершён давно
+            _zakaz(polzovatel_id, menyu, 200, 10),   # создан давно, завершён недавно
+            _zakaz(polzovatel_id, menyu, 200, 120, StatusZakaza.otmenen),
+            # Не завершён — остаётся в живых таблицах, как бы давно ни был создан
+            _zakaz(polzovatel_id, menyu, 200, status=StatusZakaza.dostavlen),
+        ]
+        db.add_all(zakazy)
+        await db.flush()
+        return [zakaz.id for zakaz in zakazy]
+
+    davno, nedavno, otmenen, dostavlen = v_bd(dobavit)
+    klient.portal.call(arkhivirovat, engine, 90)
+    assert _v_arkhive(v_bd, [davno, nedavno, otmenen, dostavlen]) == {davno, otmenen}
+
+
+def test_id_ne_povtoryayutsya_posle_arkhiva_i_udaleniya(klient, v_bd, sozdat_polzovatelya, menyu):
+    """Архив, удаление последней позиции корзины, вставка: новые id больше всех прежних.
+    Без AUTOINCREMENT SQLite выдал бы max(id) + 1 — id архивной позиции, а следующая
+    архивация упала бы на первичном ключе pozitsii_zakaza_arkhiv"""
+    polzovatel_id, zagolovki = sozdat_polzovatelya()
+    (blyudo_1, _), (blyudo_2, _) = menyu[1:3]
+
+    async def dobavit(db):
+        staryj = _zakaz(polzovatel_id, menyu, 200, 100)
+        korzina = _zakaz(polzovatel_id, menyu, 200, status=StatusZakaza.v_korzine)
+        korzina.pozitsii[0].blyudo_id = blyudo_1
+        db.add(staryj)
+        await db.flush()
+        db.add(korzina)
+        await db.flush()
+        return staryj.id, korzina.id, korzina.pozitsii[0].id
+
+    staryj, korzina, pozitsiya_korziny = v_bd(dobavit)
+    klient.portal.call(arkhivirovat, engine, 90)
+    assert _v_arkhive(v_bd, [staryj]) == {staryj}
+
+    # Удаляем самую новую позицию — наибольший id в живой таблице становится меньше архивного
+    assert klient.delete(f"/zakazy/korzina/pozitsiya/{blyudo_1}", headers=zagolovki).status_code == 200
+    otvet = klient.post("/zakazy/korzina/dobavit", json={"blyudo_id": blyudo_2, "kolichestvo": 1}, headers=zagolovki)
+    assert otvet.status_code == 200, otvet.text
+    [novaya_pozitsiya] = otvet.json()["pozitsii"]
+    assert novaya_pozitsiya["id"] > pozitsiya_korziny
+
+    # Корзина — самый новый заказ; после её переноса новый заказ получает следующий id
+    async def zavershit(db):
+        zakaz = await db.get(Zakaz, korzina)
+        zakaz.status = StatusZakaza.zavershen
+        zakaz.data_zaversheniya = datetime.utcnow() - timedelta(days=100)
+
+    v_bd(zavershit)
+    klient.portal.call(arkhivirovat, engine, 90)
+    assert _v_arkhive(v_bd, [korzina]) == {korzina}
+
+    async def novyj_zakaz(db):
+        zakaz = _zakaz(polzovatel_id, menyu, 200, status=StatusZakaza.dostavlen)
+        db.add(zakaz)
+        await db.flush()
+        return zakaz.id, zakaz.pozitsii[0].id
+
+    zakaz_id, id_pozitsii = v_bd(novyj_zakaz)
+    assert zakaz_id > korzina
+    assert id_pozitsii > novaya_pozitsiya["id"]
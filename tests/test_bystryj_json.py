@@ -0,0 +1,64 @@
+"""Быстрый JSON побайтно совпадает с тем, что дал бы response_model (схемы Pydantic)."""
+from datetime import datetime
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from bystryj_json import (
+    KOLONKI_BLYUDA, KOLONKI_RESTORANA, KOLONKI_ZAKAZA, blyudo_v_dict, restoran_v_dict, v_bajty, zakazy_v_dict,
+)
+from menyu_kesh import v_json
+from models import Blyudo, PozitsiyaZakaza, Restoran, StatusZakaza, Zakaz
+from routers.zakazy_router import zapros_zakazov
+from schemas import BlyudoOut, RestoranOut, ZakazOut
+
+
+def test_sovpadaet_s_pydantic(v_bd, sozdat_polzovatelya):
+    polzovatel_id, _ = sozdat_polzovatelya()
+    kurer_id, _ = sozdat_polzovatelya()
+
+    async def sravnit(db):
+        restoran = Restoran(nazvanie="Чайхана «Ош»", adres="ул. Ленина, 1", opisanie=None)
+        blyuda = [
+            Blyudo(nazvanie="Плов", opisanie="С бараниной\n\"по-узбекски\"", cena=310.5, restoran=restoran,
+                   foto_url="/static/blyuda/1_a.png", foto_varianty=True),
+            Blyudo(nazvanie="Лепёшка", opisanie=None, cena=40.0, restoran=restoran,
+                   foto_url="/static/blyuda/2_b.jpg", foto_varianty=False),
+            Blyudo(nazvanie="Чай", opisanie="", cena=99.99, restoran=restoran),
+        ]
+        db.add_all(blyuda)
+        await db.flush()
+        zakazy = [
+            Zakaz(polzovatel_id=polzovatel_id, status=StatusZakaza.v_dostavke, kurer_id=kurer_id,
+                  adres_dostavki="кв. 5", summa=660.99, podtverzhden_polzovatelem=False,
+                  data_sozdaniya=datetime(2026, 3, 1, 12, 30, 15, 123456), pozitsii=[
+                      PozitsiyaZakaza(blyudo_id=b.id, kolichestvo=i + 1, cena_na_moment=b.cena)
+                      for i, b in enumerate(blyuda)
+                  ]),
+            Zakaz(polzovatel_id=polzovatel_id, status=StatusZakaza.zavershen, adres_dostavki=None,
+                  summa=0.0, podtverzhden_polzovatelem=True, data_sozdaniya=datetime(2026, 3, 2)),
+        ]
+        db.add_all(zakazy)
+        await db.flush()
+        db.expunge_all()
+
+        id_blyud = [b.id for b in blyuda]
+        id_zakazov = [z.id for z in zakazy]
+        pary = []
+
+        stroki = await db.execute(select(*KOLONKI_RESTORANA).where(Restoran.id == restoran.id))
+        orm = await db.scalars(select(Restoran).where(Restoran.id == restoran.id))
+        pary.append((v_bajty([restoran_v_dict(*s) for s in stroki]), v_json(TypeAdapter(List[RestoranOut]), orm.all())))
+
+        stroki = await db.execute(select(*KOLONKI_BLYUDA).where(Blyudo.id.in_(id_blyud)).order_by(Blyudo.id))
+        orm = await db.scalars(select(Blyudo).where(Blyudo.id.in_(id_blyud)).order_by(Blyudo.id))
+        pary.append((v_bajty([blyudo_v_dict(*s) for s in stroki]), v_json(TypeAdapter(List[BlyudoOut]), orm.all())))
+
+        stroki = await db.execute(select(*KOLONKI_ZAKAZA).where(Zakaz.id.in_(id_zakazov)).order_by(Zakaz.id))
+        orm = await db.scalars(zapros_zakazov().where(Zakaz.id.in_(id_zakazov)).order_by(Zakaz.id))
+        pary.append((v_bajty(await zakazy_v_dict(db, stroki)), v_json(TypeAdapter(List[ZakazOut]), orm.all())))
+        return pary
+
+    for bystryj, pydantic in v_bd(sravnit):
+        assert bystryj == pydantic
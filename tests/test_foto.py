@@ -0,0 +1,76 @@
+"""URL уменьшенных копий отдаются, только когда фоновая задача отметила копии у блюда."""
+import io
+
+import pytest
+
+import foto
+from models import RolPolzovatelya
+from routers import blyuda_router
+
+
+@pytest.fixture
+def papka(tmp_path, monkeypatch):
+    monkeypatch.setattr(foto, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_bez_kopii_otdaetsya_original():
+    assert foto.url_varianta("/static/blyuda/1_abc.png", "mini", False) == "/static/blyuda/1_abc.png"
+    assert foto.url_varianta("/static/blyuda/1_abc.png", "mini", True) == "/static/blyuda/1_abc_mini.webp"
+    assert foto.url_varianta(None, "mini", True) is None
+
+
+def test_sozdannaya_kopiya(papka):
+    pytest.importorskip("PIL")
+    from PIL import Image
+
+    Image.new("RGB", (1200, 600)).save(papka / "1_abc.png")
+    foto.sozdat_varianty("/static/blyuda/1_abc.png")
+
+    with Image.open(papka / "1_abc_mini.webp") as mini:
+        assert mini.size == (256, 128)
+    with Image.open(papka / "1_abc_sred.webp") as sred:
+        assert sred.size == (800, 400)
+
+
+def _zagruzit_blyudo(klient, admin, restoran_id: int):
+    from PIL import Image
+
+    kartinka = io.BytesIO()
+    Image.new("RGB", (600, 300)).save(kartinka, "PNG")
+    otvet = klient.post("/blyuda/", headers=admin, files={"foto": ("f.png", kartinka.getvalue(), "image/png")},
+                        data={"nazvanie": "S foto", "cena": "100", "restoran_id": str(restoran_id)})
+    assert otvet.status_code == 200, otvet.text
+    return otvet.json()
+
+
+@pytest.fixture
+def admin(sozdat_polzovatelya):
+    pytest.importorskip("PIL")
+    return sozdat_polzovatelya(RolPolzovatelya.admin)[1]
+
+
+def test_kopii_otmechayutsya_posle_fonovoj_zadachi(klient, admin, papka, menyu):
+    """Ответ на загрузку — до фоновой задачи; после неё блюдо и списки отдают копии"""
+    restoran_id = klient.get(f"/blyuda/{menyu[0][0]}").json()["restoran_id"]
+    blyudo = _zagruzit_blyudo(klient, admin, restoran_id)
+    assert blyudo["foto_mini_url"] == blyudo["foto_url"]
+
+    mini = f"{blyudo['foto_url'].rsplit('.', 1)[0]}_mini.webp"
+    assert klient.get(f"/blyuda/{blyudo['id']}").json()["foto_mini_url"] == mini
+    spisok = klient.get("/blyuda/", params={"restoran_id": restoran_id, "limit": 100}).json()
+    assert [b["foto_mini_url"] for b in spisok if b["id"] == blyudo["id"]] == [mini]
+    assert "foto_varianty" not in blyudo
+
+
+def test_oshibka_kopij_ostavlyaet_original(klient, admin, papka, menyu, monkeypatch, caplog):
+    def upast(foto_url):
+        raise OSError("disk polon")
+
+    monkeypatch.setattr(blyuda_router, "sozdat_varianty", upast)
+    restoran_id = klient.get(f"/blyuda/{menyu[0][0]}").json()["restoran_id"]
+    blyudo = _zagruzit_blyudo(klient, admin, restoran_id)
+
+    posle = klient.get(f"/blyuda/{blyudo['id']}").json()
+    assert posle["foto_mini_url"] == posle["foto_sred_url"] == blyudo["foto_url"]
+    assert "Ne udalos sozdat kopii foto" in caplog.text
@@ -0,0 +1,123 @@
+"""Групповая запись: партия — одна транзакция, ошибка одного изменения не трогает соседей,
+блокировка записи берётся в начале партии, остановка выполняет уже поставленное."""
+import asyncio
+import itertools
+import sqlite3
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+
+from database import DATABASE_URL, ETO_SQLITE
+from gruppovaya_zapis import Pisatel
+from models import Restoran
+
+pytestmark = pytest.mark.skipif(not ETO_SQLITE, reason="групповая запись только для SQLite")
+
+_nomer = itertools.count(1)
+
+
+def _dobavit_restoran(nazvanie: str, oshibka: bool = False):
+    async def izmenenie(db):
+        restoran = Restoran(nazvanie=nazvanie, adres="-")
+        db.add(restoran)
+        await db.flush()
+        if oshibka:
+            raise ValueError(nazvanie)
+        return restoran.id
+
+    return izmenenie
+
+
+def _imena(v_bd, imena) -> set[str]:
+    async def prochitat(db):
+        return set((await db.scalars(select(Restoran.nazvanie).where(Restoran.nazvanie.in_(imena)))).all())
+
+    return v_bd(prochitat)
+
+
+@pytest.fixture
+def zapusk(klient):
+    """zapusk(func, okno_ms): async func(pisatel) с работающим писателем; возвращает
+    результат func и число COMMIT писателя"""
+    def _zapusk(func, okno_ms: float = 50):
+        async def vypolnit():
+            pisatel = Pisatel(okno_ms=okno_ms)
+            kommity = []
+            event.listen(pisatel.dvizhok.sync_engine, "commit", lambda conn: kommity.append(1))
+            pisatel.zapustit()
+            try:
+                return await func(pisatel), len(kommity)
+            finally:
+                await pisatel.ostanovit()
+
+        return klient.portal.call(vypolnit)
+
+    return _zapusk
+
+
+def test_partiya_odnim_kommitom(zapusk, v_bd):
+    imena = [f"Partiya {next(_nomer)}" for _ in range(5)]
+
+    async def func(pisatel):
+        return await asyncio.gather(*(pisatel.vypolnit(_dobavit_restoran(imya)) for imya in imena))
+
+    id_restoranov, kommitov = zapusk(func)
+    assert len(set(id_restoranov)) == 5
+    assert kommitov == 1
+    assert _imena(v_bd, imena) == set(imena)
+
+
+def test_oshibka_ne_otkatyvaet_sosedej(zapusk, v_bd):
+    """Каждое изменение — в своей точке сохранения: откатывается только упавшее"""
+    do, oshibka, posle = (f"Sosed {next(_nomer)}" for _ in range(3))
+
+    async def func(pisatel):
+        return await asyncio.gather(
+            pisatel.vypolnit(_dobavit_restoran(do)),
+            pisatel.vypolnit(_dobavit_restoran(oshibka, oshibka=True)),
+            pisatel.vypolnit(_dobavit_restoran(posle)),
+            return_exceptions=True,
+        )
+
+    (id_do, isklyuchenie, id_posle), kommitov = zapusk(func)
+    assert isinstance(id_do, int) and isinstance(id_posle, int)
+    assert isinstance(isklyuchenie, ValueError) and str(isklyuchenie) == oshibka
+    assert kommitov == 1
+    assert _imena(v_bd, [do, oshibka, posle]) == {do, posle}
+
+
+def test_blokirovka_zapisi_s_nachala_partii(zapusk):
+    """BEGIN IMMEDIATE: даже изменение, которое пока только читает, уже держит блокировку
+    записи — чужой писатель её не получит"""
+    put = make_url(DATABASE_URL).database
+
+    async def tolko_chtenie(db):
+        await db.scalar(select(func.count(Restoran.id)))
+        chuzhoe = sqlite3.connect(put, timeout=0, isolation_level=None)
+        try:
+            chuzhoe.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            return str(e)
+        finally:
+            chuzhoe.close()
+
+    oshibka, _ = zapusk(lambda pisatel: pisatel.vypolnit(tolko_chtenie))
+    assert oshibka == "database is locked"
+
+
+def test_ostanovka_vypolnyaet_ochered(zapusk, v_bd):
+    """Изменения, ждущие окна партии, выполняются при остановке, новые — отклоняются"""
+    imena = [f"Ostanovka {next(_nomer)}" for _ in range(3)]
+
+    async def func(pisatel):
+        zhdut = [asyncio.ensure_future(pisatel.vypolnit(_dobavit_restoran(imya))) for imya in imena]
+        await asyncio.sleep(0)  # все в очереди, окно партии ещё не закрылось
+        await asyncio.wait_for(pisatel.ostanovit(), 5)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(pisatel.vypolnit(_dobavit_restoran("Posle ostanovki")), 1)
+        return [zadacha.result() for zadacha in zhdut]
+
+    id_restoranov, kommitov = zapusk(func, okno_ms=10_000)
+    assert len(id_restoranov) == 3 and kommitov == 1
+    assert _imena(v_bd, imena) == set(imena)
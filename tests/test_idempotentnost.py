@@ -0,0 +1,97 @@
+"""Idempotency-Key: повтор получает сохранённый ответ, параллельный повтор ждёт первого,
+другой запрос с тем же ключом — 422, ошибки не запоминаются."""
+import asyncio
+import itertools
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from main import app
+from routers import zakazy_router
+
+_nomer = itertools.count(1)
+
+
+@pytest.fixture
+def pokupatel(sozdat_polzovatelya, menyu):
+    """Заголовки нового пользователя с уникальным Idempotency-Key и тело добавления блюда"""
+    _, zagolovki = sozdat_polzovatelya()
+    return {**zagolovki, "Idempotency-Key": f"klyuch-{next(_nomer)}"}, {"blyudo_id": menyu[0][0], "kolichestvo": 1}
+
+
+@pytest.fixture
+def vyzovy_zapisi(monkeypatch):
+    """Считает изменения заказов; zaderzhka — пауза перед изменением, oshibki — сколько
+    первых вызовов завершить 503"""
+    zapisat = zakazy_router.zapisat
+    sostoyanie = {"vyzovov": 0, "zaderzhka": 0.0, "oshibki": 0}
+
+    async def zapisat_so_schetchikom(db, izmenenie):
+        sostoyanie["vyzovov"] += 1
+        await asyncio.sleep(sostoyanie["zaderzhka"])
+        if sostoyanie["oshibki"]:
+            sostoyanie["oshibki"] -= 1
+            raise HTTPException(status_code=503, detail="Vremennaya oshibka")
+        return await zapisat(db, izmenenie)
+
+    monkeypatch.setattr(zakazy_router, "zapisat", zapisat_so_schetchikom)
+    return sostoyanie
+
+
+def _kolichestvo_v_korzine(klient, zagolovki) -> int:
+    zagolovki = {k: v for k, v in zagolovki.items() if k != "Idempotency-Key"}
+    return sum(poz["kolichestvo"] for poz in klient.get("/zakazy/korzina", headers=zagolovki).json()["pozitsii"])
+
+
+def test_povtor_vozvrashchaet_sokhranennyj_otvet(klient, pokupatel, vyzovy_zapisi):
+    zagolovki, telo = pokupatel
+    pervyj = klient.post("/zakazy/korzina/dobavit", json=telo, headers=zagolovki)
+    povtor = klient.post("/zakazy/korzina/dobavit", json=telo, headers=zagolovki)
+
+    assert pervyj.status_code == povtor.status_code == 200
+    assert "Idempotent-Replayed" not in pervyj.headers
+    assert povtor.headers["Idempotent-Replayed"] == "true"
+    assert povtor.content == pervyj.content
+    assert vyzovy_zapisi["vyzovov"] == 1
+    assert _kolichestvo_v_korzine(klient, zagolovki) == 1
+
+
+def test_klyuch_s_drugim_zaprosom(klient, pokupatel):
+    zagolovki, telo = pokupatel
+    assert klient.post("/zakazy/korzina/dobavit", json=telo, headers=zagolovki).status_code == 200
+
+    drugoe_telo = klient.post("/zakazy/korzina/dobavit", json={**telo, "kolichestvo": 2}, headers=zagolovki)
+    drugoj_marshrut = klient.post("/zakazy/korzina/dobavit-spisok", json=[telo], headers=zagolovki)
+    assert drugoe_telo.status_code == drugoj_marshrut.status_code == 422
+    assert drugoe_telo.json()["detail"] == "Idempotency-Key uzhe ispolzovan s drugim zaprosom"
+    assert _kolichestvo_v_korzine(klient, zagolovki) == 1
+
+
+def test_parallelnyj_povtor_zhdet_pervogo(klient, pokupatel, vyzovy_zapisi):
+    zagolovki, telo = pokupatel
+    vyzovy_zapisi["zaderzhka"] = 0.2  # первый запрос ещё выполняется, когда приходит повтор
+
+    async def otpravit():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.post("/zakazy/korzina/dobavit", json=telo, headers=zagolovki)
+                                          for _ in range(2)))
+
+    otvety = klient.portal.call(otpravit)
+    assert [otvet.status_code for otvet in otvety] == [200, 200]
+    assert sorted(otvet.headers.get("Idempotent-Replayed", "") for otvet in otvety) == ["", "true"]
+    assert otvety[0].content == otvety[1].content
+    assert vyzovy_zapisi["vyzovov"] == 1
+    assert _kolichestvo_v_korzine(klient, zagolovki) == 1
+
+
+def test_oshibka_ne_zapominaetsya(klient, pokupatel, vyzovy_zapisi):
+    zagolovki, telo = pokupatel
+    vyzovy_zapisi["oshibki"] = 1
+
+    assert klient.post("/zakazy/korzina/dobavit", json=telo, headers=zagolovki).status_code == 503
+    povtor = klient.post("/zakazy/korzina/dobavit", json=telo, headers=zagolovki)
+    assert povtor.status_code == 200
+    assert "Idempotent-Replayed" not in povtor.headers
+    assert vyzovy_zapisi["vyzovov"] == 2
+    assert _kolichestvo_v_korzine(klient, zagolovki) == 1
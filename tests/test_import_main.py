@@ -0,0 +1,15 @@
+"""import main укладывается в бюджет, не создаёт базу и не тянет модули запросов.
+
+Замеры — `python -X importtime -c "import main"` в отдельных процессах (benchmark.import_main).
+Бюджет с запасом под медленные машины CI; переопределяется IMPORT_BYUDZHET_MS.
+"""
+import os
+
+from benchmark.import_main import proverit_import
+
+IMPORT_BYUDZHET_MS = float(os.getenv("IMPORT_BYUDZHET_MS", "1000"))
+
+
+def test_import_main_v_byudzhete():
+    mediana, oshibki = proverit_import(IMPORT_BYUDZHET_MS, povtorov=3)
+    assert not oshibki, f"mediana {mediana:.0f} ms: {oshibki}"
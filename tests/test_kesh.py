@@ -0,0 +1,53 @@
+"""TTLKesh: истечение и вытеснение; кэш авторизации сбрасывается при смене роли."""
+from sqlalchemy import update
+
+import kesh
+from kesh import TTLKesh
+from models import Polzovatel, RolPolzovatelya
+
+
+def test_zapis_istekaet_po_ttl(monkeypatch):
+    seychas = [100.0]
+    monkeypatch.setattr(kesh.time, "monotonic", lambda: seychas[0])
+    k = TTLKesh(maks_razmer=10, ttl=30)
+    k.polozhit("a", 1)
+
+    seychas[0] += 29
+    assert k.poluchit("a") == 1
+    seychas[0] += 2
+    assert k.poluchit("a", "net") == "net"
+    assert len(k) == 0
+
+
+def test_vytesnyaetsya_davno_ispolzovannaya():
+    k = TTLKesh(maks_razmer=2, ttl=60)
+    k.polozhit("a", 1)
+    k.polozhit("b", 2)
+    k.poluchit("a")
+    k.polozhit("c", 3)
+    assert k.poluchit("b") is None
+    assert (k.poluchit("a"), k.poluchit("c")) == (1, 3)
+
+
+def test_novaya_rol_dejstvuet_so_sleduyushchego_zaprosa(klient, sozdat_polzovatelya, v_bd):
+    polzovatel_id, zagolovki = sozdat_polzovatelya()
+    _, admin = sozdat_polzovatelya(RolPolzovatelya.admin)
+
+    def smenit_rol_v_bd(rol):
+        async def izmenit(db):
+            await db.execute(update(Polzovatel).where(Polzovatel.id == polzovatel_id).values(rol=rol))
+
+        v_bd(izmenit)
+
+    assert klient.get("/zakazy/moi-zakazy", headers=zagolovki).status_code == 403
+    # Мимо API роль не видна, пока запись в кэше авторизации жива
+    smenit_rol_v_bd(RolPolzovatelya.kurer)
+    assert klient.get("/zakazy/moi-zakazy", headers=zagolovki).status_code == 403
+    smenit_rol_v_bd(RolPolzovatelya.polzovatel)
+
+    otvet = klient.post(f"/auth/set-role/{polzovatel_id}/kurer", headers=admin)
+    assert otvet.status_code == 200, otvet.text
+    assert klient.get("/zakazy/moi-zakazy", headers=zagolovki).status_code == 200
+
+    assert klient.post(f"/auth/set-role/{polzovatel_id}/polzovatel", headers=admin).status_code == 200
+    assert klient.get("/zakazy/moi-zakazy", headers=zagolovki).status_code == 403
@@ -0,0 +1,53 @@
+"""Число SQL-команд на запрос списка не зависит от числа заказов, позиций и размера страницы."""
+import pytest
+
+from conftest import schetchik_sql
+from menyu_kesh import uvelichit_versiyu
+from models import PozitsiyaZakaza, RolPolzovatelya, StatusZakaza, Zakaz
+
+
+@pytest.fixture(scope="module")
+def zakazy(v_bd, sozdat_polzovatelya, menyu):
+    """Клиент с 30 заказами по 1..10 позиций, курьер с 10 заказами в доставке, корзина на 10 позиций"""
+    klient_id, klient = sozdat_polzovatelya()
+    kurer_id, kurer = sozdat_polzovatelya(RolPolzovatelya.kurer)
+
+    async def dobavit(db):
+        def zakaz(status, pozitsij, **polya):
+            return Zakaz(polzovatel_id=klient_id, status=status, summa=0.0, pozitsii=[
+                PozitsiyaZakaza(blyudo_id=blyudo_id, kolichestvo=1, cena_na_moment=cena)
+                for blyudo_id, cena in menyu[:pozitsij]
+            ], **polya)
+
+        db.add_all(zakaz(StatusZakaza.zavershen, i % 10 + 1) for i in range(20))
+        db.add_all(zakaz(StatusZakaza.oformlen, i % 10 + 1, adres_dostavki="adres") for i in range(10))
+        db.add_all(zakaz(StatusZakaza.v_dostavke, i % 10 + 1, kurer_id=kurer_id) for i in range(10))
+        db.add(zakaz(StatusZakaza.v_korzine, 10))
+
+    v_bd(dobavit)
+    return klient, kurer
+
+
+def _kolichestvo(klient, url: str, zagolovki=None) -> int:
+    uvelichit_versiyu()  # каталог иначе отдаётся из кэша без запросов
+    with schetchik_sql() as komandy:
+        otvet = klient.get(url, headers=zagolovki)
+    assert otvet.status_code == 200, otvet.text
+    return len(komandy)
+
+
+@pytest.mark.parametrize("url, kto, ozhidaetsya", [
+    ("/zakazy/?limit={limit}", "klient", 2),
+    ("/zakazy/korzina", "klient", 2),
+    ("/zakazy/dostupnye-dlya-dostavki?limit={limit}", "kurer", 2),
+    ("/zakazy/moi-zakazy", "kurer", 2),
+    ("/restorany/?limit={limit}", None, 1),
+    ("/blyuda/?limit={limit}", None, 1),
+])
+def test_postoyannoe_chislo_zaprosov(klient, zakazy, url, kto, ozhidaetsya):
+    zagolovki = dict(zip(("klient", "kurer"), zakazy)).get(kto)
+    # Пользователь попадает в кэш авторизации первым запросом
+    klient.get(url.format(limit=1), headers=zagolovki)
+
+    kolichestva = {limit: _kolichestvo(klient, url.format(limit=limit), zagolovki) for limit in (1, 5, 50)}
+    assert set(kolichestva.values()) == {ozhidaetsya}, kolichestva
@@ -0,0 +1,104 @@
+"""Параллельные добавления в корзину не теряют количество и сумму."""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from database import ETO_SQLITE
+from gruppovaya_zapis import GRUPPOVAYA_ZAPIS
+from main import app
+from models import StatusZakaza, Zakaz
+from routers import zakazy_router
+
+
+def _parallelno(klient, zaprosy):
+    """Отправляет (url, json, заголовки) одновременно в цикле событий приложения"""
+    async def otpravit():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(ac.post(url, json=telo, headers=zagolovki)
+                                          for url, telo, zagolovki in zaprosy))
+
+    return klient.portal.call(otpravit)
+
+
+def test_parallelnye_dobavleniya(klient, sozdat_polzovatelya, menyu):
+    _, zagolovki = sozdat_polzovatelya()
+    (blyudo_1, cena_1), (blyudo_2, cena_2) = menyu[:2]
+    zaprosy = [("/zakazy/korzina/dobavit", {"blyudo_id": blyudo_1, "kolichestvo": 1}, zagolovki)] * 10
+    zaprosy += [("/zakazy/korzina/dobavit-spisok", [{"blyudo_id": blyudo_2, "kolichestvo": 2}], zagolovki)] * 10
+
+    otvety = _parallelno(klient, zaprosy)
+    assert [otvet.status_code for otvet in otvety] == [200] * 20
+
+    korzina = klient.get("/zakazy/korzina", headers=zagolovki).json()
+    kolichestva = {poz["blyudo_id"]: poz["kolichestvo"] for poz in korzina["pozitsii"]}
+    assert kolichestva == {blyudo_1: 10, blyudo_2: 20}
+    assert korzina["summa"] == 10 * cena_1 + 20 * cena_2
+
+
+def test_oformlenie_schitaet_summu_zanovo(klient, sozdat_polzovatelya, menyu, v_bd):
+    polzovatel_id, zagolovki = sozdat_polzovatelya()
+    blyudo_id, cena = menyu[0]
+    klient.post("/zakazy/korzina/dobavit", json={"blyudo_id": blyudo_id, "kolichestvo": 3}, headers=zagolovki)
+
+    async def isportit(db):
+        await db.execute(update(Zakaz).where(Zakaz.polzovatel_id == polzovatel_id,
+                                             Zakaz.status == StatusZakaza.v_korzine).values(summa=0.5))
+
+    v_bd(isportit)  # сумма в строке заказа разошлась с позициями
+    otvet = klient.post("/zakazy/oformit", json={"adres_dostavki": "ulitsa 2"}, headers=zagolovki)
+    assert otvet.status_code == 200, otvet.text
+    assert otvet.json()["summa"] == 3 * cena
+
+
+
+@pytest.fixture
+def odnovremenno_bez_korziny(monkeypatch):
+    """Первые два запроса, не нашедшие корзину, ждут друг друга и создают её одновременно"""
+    if GRUPPOVAYA_ZAPIS and ETO_SQLITE:
+        pytest.skip("писатель выполняет изменения по одному")
+    naiti = zakazy_router.naiti_korzinu
+    bariera = asyncio.Barrier(2)
+    ostalos = [2]
+
+    async def naiti_odnovremenno(db, polzovatel, dlya_izmeneniya=False):
+        zakaz = await naiti(db, polzovatel, dlya_izmeneniya)
+        if zakaz is None and dlya_izmeneniya and ostalos[0]:
+            ostalos[0] -= 1
+            await asyncio.wait_for(bariera.wait(), 5)
+        return zakaz
+
+    monkeypatch.setattr(zakazy_router, "naiti_korzinu", naiti_odnovremenno)
+
+
+@pytest.mark.parametrize("zapros", ["korzina", "dobavit"])
+def test_gonka_za_sozdanie_korziny(klient, sozdat_polzovatelya, menyu, odnovremenno_bez_korziny, zapros):
+    """Проигравший гонку за uq_zakazy_korzina находит чужую корзину: не возвращает None
+    и не обращается к блюду, сброшенному откатом"""
+    _, zagolovki = sozdat_polzovatelya()
+    blyudo_id, cena = menyu[0]
+
+    async def otpravit():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            if zapros == "korzina":
+                return await asyncio.gather(*(ac.get("/zakazy/korzina", headers=zagolovki) for _ in range(2)))
+            return await asyncio.gather(*(ac.post("/zakazy/korzina/dobavit", headers=zagolovki,
+                                                  json={"blyudo_id": blyudo_id, "kolichestvo": 1}) for _ in range(2)))
+
+    otvety = klient.portal.call(otpravit)
+    assert [otvet.status_code for otvet in otvety] == [200, 200], [otvet.text for otvet in otvety]
+    assert len({otvet.json()["id"] for otvet in otvety}) == 1
+    if zapros == "dobavit":
+        assert klient.get("/zakazy/korzina", headers=zagolovki).json()["summa"] == 2 * cena
+
+
+@pytest.mark.skipif(ETO_SQLITE, reason="SQLite без PRAGMA foreign_keys не проверяет внешние ключи")
+def test_oshibka_vneshnego_klyucha_ne_povtoryaetsya(v_bd):
+    """Повторяется только гонка за уникальный индекс; прочие ошибки целостности — сразу наружу"""
+    with pytest.raises(IntegrityError):
+        v_bd(lambda db: zakazy_router.poluchit_ili_sozdat_korzinu(db, SimpleNamespace(id=10 ** 9)))
@@ -0,0 +1,129 @@
+"""Потоковый импорт меню: многострочные поля CSV, ошибки по номерам строк, неизвестные
+рестораны, границы партий и обратная совместимость с экспортом."""
+import csv
+import io
+import itertools
+import json
+
+import pytest
+from sqlalchemy import select
+
+import menyu_import
+from conftest import schetchik_sql
+from models import Blyudo, Restoran, RolPolzovatelya
+
+_nomer = itertools.count(1)
+NET_RESTORANA = 10 ** 9
+
+
+@pytest.fixture(scope="module")
+def admin(sozdat_polzovatelya):
+    return sozdat_polzovatelya(RolPolzovatelya.admin)[1]
+
+
+@pytest.fixture
+def restoran(v_bd) -> int:
+    async def dobavit(db):
+        zapis = Restoran(nazvanie=f"Import {next(_nomer)}", adres="-")
+        db.add(zapis)
+        await db.flush()
+        return zapis.id
+
+    return v_bd(dobavit)
+
+
+def _blyuda(v_bd, restoran_id: int) -> list[tuple]:
+    async def prochitat(db):
+        query = select(Blyudo.nazvanie, Blyudo.opisanie, Blyudo.cena).where(Blyudo.restoran_id == restoran_id)
+        return [tuple(stroka) for stroka in await db.execute(query.order_by(Blyudo.id))]
+
+    return v_bd(prochitat)
+
+
+def _importirovat(klient, admin, telo: str, format: str = "csv") -> dict:
+    otvet = klient.post(f"/blyuda/import?format={format}", content=telo.encode(), headers=admin)
+    assert otvet.status_code == 200, otvet.text
+    return otvet.json()
+
+
+def test_mnogostrochnoe_pole_i_nomera_strok(klient, admin, restoran, v_bd):
+    telo = (
+        "nazvanie,opisanie,cena,restoran_id\n"
+        f'Borshch,"So smetanoj,\ni s chesnokom",250,{restoran}\n'   # строки 2-3
+        f"Bez ceny,,dorogo,{restoran}\n"                             # строка 4
+        f"Lishnyaya kolonka,,1,{restoran},x\n"                       # строка 5
+        f"Otricatelnaya,,-1,{restoran}\n"                            # строка 6
+        f"Chuzhoj,,100,{NET_RESTORANA}\n"                            # строка 7
+        f'Kompot,"""Domashnij""",90,{restoran}\n'                    # строка 8
+    )
+    rezultat = _importirovat(klient, admin, telo)
+
+    assert rezultat["dobavleno"] == 2
+    assert [oshibka["stroka"] for oshibka in rezultat["oshibki"]] == [4, 5, 6, 7]
+    assert rezultat["oshibki"][0]["oshibka"].startswith("cena:")
+    assert rezultat["oshibki"][1]["oshibka"] == "ozhidalos 4 kolonok, polucheno 5"
+    assert rezultat["oshibki"][3]["oshibka"] == f"restoran_id: Restoran {NET_RESTORANA} ne najden"
+    assert _blyuda(v_bd, restoran) == [
+        ("Borshch", "So smetanoj,\ni s chesnokom", 250.0),
+        ("Kompot", '"Domashnij"', 90.0),
+    ]
+
+
+def test_nezakrytye_kavychki_i_jsonl(klient, admin, restoran, v_bd):
+    rezultat = _importirovat(klient, admin, f'nazvanie,opisanie,cena,restoran_id\nSup,"bez kontsa,1,{restoran}\n')
+    assert rezultat["dobavleno"] == 0
+    assert rezultat["oshibki"] == [{"stroka": 2, "oshibka": "nezakrytye kavychki"}]
+
+    telo = "\n".join([
+        json.dumps({"nazvanie": "Chaj", "cena": 50, "restoran_id": restoran}),
+        "{nekorrektnyj",
+        "[1, 2]",
+        json.dumps({"nazvanie": "Kofe", "cena": 120, "restoran_id": NET_RESTORANA}),
+    ])
+    rezultat = _importirovat(klient, admin, telo, "jsonl")
+    assert rezultat["dobavleno"] == 1
+    assert [oshibka["stroka"] for oshibka in rezultat["oshibki"]] == [2, 3, 4]
+    assert rezultat["oshibki"][0]["oshibka"].startswith("nekorrektnyj JSON")
+    assert rezultat["oshibki"][1]["oshibka"] == "ozhidalsya JSON-obekt"
+    assert _blyuda(v_bd, restoran) == [("Chaj", None, 50.0)]
+
+
+def test_granitsy_partij(klient, admin, restoran, v_bd, monkeypatch):
+    """Партия — одна вставка; неизвестный ресторан отбрасывает только свою строку"""
+    monkeypatch.setattr(menyu_import, "RAZMER_PARTII", 2)
+    stroki = [f"Blyudo {i},,{i},{restoran}" for i in range(1, 6)]
+    stroki.insert(2, f"Chuzhoe,,1,{NET_RESTORANA}")  # строка 4: вторая партия
+    telo = "nazvanie,opisanie,cena,restoran_id\n" + "\n".join(stroki)
+
+    with schetchik_sql() as komandy:
+        rezultat = _importirovat(klient, admin, telo)
+
+    vstavki = [sql for sql, _ in komandy if sql.lstrip().upper().startswith("INSERT INTO BLYUDA")]
+    assert len(vstavki) == 3  # партии по 2 строки: [1, 2], [3] без чужой, [4, 5]
+    assert rezultat["dobavleno"] == 5
+    assert rezultat["oshibki"] == [{"stroka": 4, "oshibka": f"restoran_id: Restoran {NET_RESTORANA} ne najden"}]
+    assert [nazvanie for nazvanie, _, _ in _blyuda(v_bd, restoran)] == [f"Blyudo {i}" for i in range(1, 6)]
+
+
+@pytest.mark.parametrize("format", ["csv", "jsonl"])
+def test_eksport_importiruetsya_obratno(klient, admin, restoran, v_bd, format):
+    telo = (
+        "nazvanie,opisanie,cena,restoran_id\n"
+        f'Plov,"S baraninoj,\n""po-uzbekski""",310.5,{restoran}\n'
+        f"Lepeshka,,40,{restoran}\n"
+    )
+    assert _importirovat(klient, admin, telo)["dobavleno"] == 2
+    iskhodnye = _blyuda(v_bd, restoran)
+
+    eksport = klient.get(f"/blyuda/eksport?format={format}&restoran_id={restoran}", headers=admin)
+    assert eksport.status_code == 200
+    if format == "csv":
+        stroki = list(csv.DictReader(io.StringIO(eksport.text)))
+    else:
+        stroki = [json.loads(stroka) for stroka in eksport.text.splitlines()]
+    assert [(s["nazvanie"], s["opisanie"] or None, float(s["cena"])) for s in stroki] == iskhodnye
+
+    # Экспорт (с id и foto_url) принимается импортом как есть
+    rezultat = _importirovat(klient, admin, eksport.text, format)
+    assert rezultat == {"dobavleno": 2, "oshibok": 0, "oshibki": []}
+    assert _blyuda(v_bd, restoran) == iskhodnye * 2
@@ -0,0 +1,80 @@
+"""Кэш каталога: 304 по If-None-Match без обращения к БД, изменение каталога сбрасывает
+кэш, ответ, прочитанный до изменения, не попадает под новую версию."""
+import pytest
+from starlette.requests import Request
+
+import menyu_kesh
+from conftest import schetchik_sql
+from menyu_kesh import otvet_iz_kesha, uvelichit_versiyu, zakeshirovat
+from models import Blyudo, Restoran, RolPolzovatelya
+
+
+def _zapros_k(url: str) -> Request:
+    put, _, query = url.partition("?")
+    return Request({"type": "http", "method": "GET", "path": put, "query_string": query.encode(), "headers": []})
+
+
+def _zapros() -> Request:
+    return _zapros_k("/blyuda/")
+
+
+def test_ustarevshij_otvet_ne_keshiruetsya_pod_novoj_versiej():
+    zapros = _zapros()
+    assert otvet_iz_kesha(zapros) is None
+    # Пока запрос читал БД, блюдо изменили
+    uvelichit_versiyu()
+    zakeshirovat(zapros, b'[{"cena": 1.0}]')
+    assert otvet_iz_kesha(_zapros()) is None
+
+    svezhij = _zapros()
+    assert otvet_iz_kesha(svezhij) is None
+    zakeshirovat(svezhij, b'[{"cena": 2.0}]')
+    assert otvet_iz_kesha(_zapros()).body == b'[{"cena": 2.0}]'
+
+
+@pytest.fixture
+def blyudo(v_bd) -> tuple[int, int]:
+    """(restoran_id, blyudo_id) — своё блюдо: тест меняет его цену"""
+    async def dobavit(db):
+        zapis = Blyudo(nazvanie="Keshiruemoe", cena=10.0, restoran=Restoran(nazvanie="Kesh", adres="-"))
+        db.add(zapis)
+        await db.flush()
+        return zapis.restoran_id, zapis.id
+
+    return v_bd(dobavit)
+
+
+def test_if_none_match_bez_obrashcheniya_k_bd(klient, blyudo):
+    _, blyudo_id = blyudo
+    pervyj = klient.get(f"/blyuda/{blyudo_id}")
+    etag = pervyj.headers["etag"]
+    assert pervyj.status_code == 200 and pervyj.headers["cache-control"] == "no-cache"
+
+    for if_none_match in (etag, f'"drugoj", {etag}', "*"):
+        with schetchik_sql() as komandy:
+            otvet = klient.get(f"/blyuda/{blyudo_id}", headers={"If-None-Match": if_none_match})
+        assert otvet.status_code == 304 and otvet.content == b""
+        assert otvet.headers["etag"] == etag
+        assert komandy == []
+
+    otvet = klient.get(f"/blyuda/{blyudo_id}", headers={"If-None-Match": '"drugoj"'})
+    assert otvet.status_code == 200 and otvet.content == pervyj.content
+
+
+def test_izmenenie_sbrasyvaet_kesh(klient, blyudo, sozdat_polzovatelya):
+    restoran_id, blyudo_id = blyudo
+    _, admin = sozdat_polzovatelya(RolPolzovatelya.admin)
+    url = f"/blyuda/?restoran_id={restoran_id}"
+    staryj = klient.get(url)
+    assert staryj.json()[0]["cena"] == 10.0
+    assert menyu_kesh.otvet_iz_kesha(_zapros_k(url)) is not None
+
+    versiya = menyu_kesh._versiya
+    assert klient.put(f"/blyuda/{blyudo_id}", data={"cena": "12.5"}, headers=admin).status_code == 200
+    assert menyu_kesh._versiya > versiya
+    assert len(menyu_kesh._otvety) == 0
+
+    otvet = klient.get(url, headers={"If-None-Match": staryj.headers["etag"]})
+    assert otvet.status_code == 200
+    assert otvet.json()[0]["cena"] == 12.5
+    assert otvet.headers["etag"] != staryj.headers["etag"]
@@ -0,0 +1,70 @@
+"""Метрики: поток SSE меряется до начала ответа, упавший SQL не оставляет записей в conn.info."""
+import asyncio
+import itertools
+import logging
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+import metriki
+from database import engine
+from metriki import MetrikiMiddleware, http_zaprosy
+
+_nomer = itertools.count(1)
+
+
+def _prilozhenie(content_type: bytes, dlitsya: float):
+    """ASGI-приложение: начало ответа сразу, тело — через dlitsya секунд"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        await asyncio.sleep(dlitsya)
+        await send({"type": "http.response.body", "body": b": ping\n\n"})
+
+    return app
+
+
+def _vypolnit(klient, prilozhenie) -> str:
+    """Один GET через MetrikiMiddleware; шаблон маршрута для меток"""
+    route = f"/test-metriki-{next(_nomer)}"
+    scope = {"type": "http", "method": "GET", "path": route, "route": SimpleNamespace(path=route)}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    klient.portal.call(MetrikiMiddleware(prilozhenie), scope, receive, send)
+    return route
+
+
+@pytest.fixture
+def porog_100_ms(monkeypatch):
+    monkeypatch.setattr(metriki, "MEDLENNYJ_ZAPROS_MS", 100)
+
+
+def test_potok_do_nachala_otveta(klient, porog_100_ms, caplog):
+    with caplog.at_level(logging.WARNING, logger="metriki"):
+        route = _vypolnit(klient, _prilozhenie(b"text/event-stream", 0.3))
+    ryad = http_zaprosy._znacheniya[("GET", route, 200)]
+    assert ryad[-1] == 1 and ryad[-2] < 0.1
+    assert "Medlennyj zapros" not in caplog.text
+
+
+def test_medlennyj_obychnyj_otvet_v_loge(klient, porog_100_ms, caplog):
+    with caplog.at_level(logging.WARNING, logger="metriki"):
+        route = _vypolnit(klient, _prilozhenie(b"application/json", 0.3))
+    assert http_zaprosy._znacheniya[("GET", route, 200)][-2] >= 0.3
+    assert f"Medlennyj zapros GET {route}" in caplog.text
+
+
+def test_oshibka_sql_snimaet_nachalo(klient):
+    async def proverit():
+        async with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(DBAPIError):
+                    await conn.exec_driver_sql("SELECT * FROM net_takoj_tablicy")
+            return list(conn.sync_connection.info.get("metriki_nachalo", []))
+
+    assert klient.portal.call(proverit) == []
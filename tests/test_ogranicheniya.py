@@ -0,0 +1,106 @@
+"""Лимиты на клиента: ведро по sub только из настоящего токена, вход и регистрация — по адресу.
+Очередь допуска: потоки SSE не держат мест."""
+import asyncio
+
+import httpx
+from jose import jwt
+from starlette.requests import Request
+
+from auth import ALGORITHM, create_access_token
+from main import app
+import ogranicheniya
+from ogranicheniya import Ogranichenie, OcheredZaprosov, klyuch_klienta
+
+
+def _zapros(token: str | None = None, adres: str = "10.0.0.1") -> Request:
+    zagolovki = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "headers": zagolovki, "client": (adres, 1234)})
+
+
+def test_poddelnyj_token_ne_daet_novogo_vedra():
+    limit = Ogranichenie(2, 60)
+    for i in range(2):
+        assert limit.vzyat(klyuch_klienta(_zapros())) == 0
+    # Каждый раз новый sub, но подпись чужая — ведро то же, что у адреса
+    for i in range(3):
+        poddelka = jwt.encode({"sub": f"kto-to-{i}"}, "ne-tot-klyuch", algorithm=ALGORITHM)
+        assert klyuch_klienta(_zapros(poddelka)) == "ip:10.0.0.1"
+        assert limit.vzyat(klyuch_klienta(_zapros(poddelka))) > 0
+
+
+def test_nastoyashchij_token_po_sub():
+    token = create_access_token({"sub": "anya"})
+    assert klyuch_klienta(_zapros(token)) == "sub:anya"
+    assert klyuch_klienta(_zapros(token, adres="10.0.0.2")) == "sub:anya"
+
+
+def test_vkhod_po_adresu_dazhe_s_tokenom():
+    token = create_access_token({"sub": "anya"})
+    assert klyuch_klienta(_zapros(token), po_adresu=True) == "ip:10.0.0.1"
+    assert klyuch_klienta(_zapros(token, adres="10.0.0.2"), po_adresu=True) == "ip:10.0.0.2"
+
+
+async def _otkryt_potok(prilozhenie, put: str, zagolovki: dict, otklyuchit: asyncio.Event, statusy: list):
+    """Запрос к потоку на уровне ASGI: соединение держится, пока не выставлен otklyuchit"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": put, "raw_path": put.encode(), "query_string": b"", "root_path": "",
+        "headers": [(imya.lower().encode(), znachenie.encode()) for imya, znachenie in zagolovki.items()],
+        "client": ("10.0.0.3", 1234), "server": ("test", 80),
+    }
+    telo_otpravleno = False
+
+    async def receive():
+        nonlocal telo_otpravleno
+        if not telo_otpravleno:
+            telo_otpravleno = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await otklyuchit.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statusy.append(message["status"])
+
+    await prilozhenie(scope, receive, send)
+
+
+def test_potoki_ne_zanimayut_mesta(klient, sozdat_polzovatelya):
+    """Открытые потоки статусов не держат места в работе: обычные запросы проходят"""
+    _, zagolovki = sozdat_polzovatelya()
+    prilozhenie = OcheredZaprosov(app, parallelno=2, ozhidanie_ms=500)
+
+    async def proverit():
+        otklyuchit = asyncio.Event()
+        statusy_potokov = []
+        potoki = [asyncio.create_task(_otkryt_potok(prilozhenie, "/zakazy/status-potok", zagolovki,
+                                                    otklyuchit, statusy_potokov)) for _ in range(4)]
+        try:
+            async with asyncio.timeout(5):
+                while len(statusy_potokov) < len(potoki):
+                    await asyncio.sleep(0.01)
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=prilozhenie),
+                                         base_url="http://test") as ac:
+                otvety = [await ac.get("/") for _ in range(3)]
+        finally:
+            otklyuchit.set()
+            await asyncio.wait_for(asyncio.gather(*potoki), 5)
+        return statusy_potokov, [otvet.status_code for otvet in otvety]
+
+    statusy_potokov, statusy = klient.portal.call(proverit)
+    assert statusy_potokov == [200] * 4
+    assert statusy == [200] * 3
+
+
+def test_adres_iz_zapisi_proksi(monkeypatch):
+    """Клиент подменяет левые записи X-Forwarded-For, но не ту, что дописал прокси"""
+    monkeypatch.setattr(ogranicheniya, "DOVERENNYKH_PROKSI", 1)
+
+    def zapros(x_forwarded_for: str) -> Request:
+        return Request({"type": "http", "client": ("10.0.0.254", 1234),
+                        "headers": [(b"x-forwarded-for", x_forwarded_for.encode())]})
+
+    klyuchi = {klyuch_klienta(zapros(f"1.1.1.{i}, 203.0.113.7"), po_adresu=True) for i in range(5)}
+    assert klyuchi == {"ip:203.0.113.7"}
+    # Без записи прокси — адрес соединения
+    assert klyuch_klienta(Request({"type": "http", "client": ("10.0.0.254", 1234), "headers": []})) == "ip:10.0.0.254"
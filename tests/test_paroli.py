@@ -0,0 +1,40 @@
+"""Вход пересчитывает хэш пароля, если стоимость bcrypt изменилась в настройках."""
+import itertools
+
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+import paroli
+from models import Polzovatel
+
+_nomer = itertools.count(1)
+
+
+def test_khesh_obnovlyaetsya_pri_vkhode(klient, v_bd):
+    username = f"parol{next(_nomer)}"
+    # Хэш, созданный при другой стоимости (до смены BCRYPT_ROUNDS)
+    staraya_stoimost = paroli.BCRYPT_ROUNDS + 1
+    staryj_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=staraya_stoimost).hash("sekret")
+    assert staryj_hash.startswith(f"$2b${staraya_stoimost:02d}$")
+
+    async def dobavit(db):
+        db.add(Polzovatel(username=username, hashed_password=staryj_hash))
+
+    async def khesh(db):
+        return await db.scalar(select(Polzovatel.hashed_password).where(Polzovatel.username == username))
+
+    def vojti(parol: str):
+        return klient.post("/auth/login", data={"username": username, "password": parol})
+
+    v_bd(dobavit)
+    assert vojti("ne tot").status_code == 401
+    assert v_bd(khesh) == staryj_hash
+
+    assert vojti("sekret").status_code == 200
+    novyj_hash = v_bd(khesh)
+    assert novyj_hash.startswith(f"$2b${paroli.BCRYPT_ROUNDS:02d}$")
+    assert paroli.verify_password("sekret", novyj_hash)
+
+    # Хэш уже нужной стоимости не переписывается
+    assert vojti("sekret").status_code == 200
+    assert v_bd(khesh) == novyj_hash
@@ -0,0 +1,48 @@
+"""Планы SQLite для запросов, которые роутеры действительно выполняют.
+
+Маршруты и проверка плана — из benchmark/plany.py (там же команда
+python -m benchmark plany): команды перехватываются во время запросов к API и
+повторяются через EXPLAIN QUERY PLAN с теми же параметрами.
+"""
+import httpx
+import pytest
+
+from benchmark.plany import MARSHRUTY, plany_marshruta, plokhoj_shag
+from database import ETO_SQLITE
+from main import app
+from models import PozitsiyaZakaza, RolPolzovatelya, StatusZakaza, Zakaz
+
+pytestmark = pytest.mark.skipif(not ETO_SQLITE, reason="EXPLAIN QUERY PLAN — только SQLite")
+
+
+@pytest.fixture(scope="module")
+def polzovateli(v_bd, sozdat_polzovatelya, menyu):
+    klient_id, klient = sozdat_polzovatelya()
+    kurer_id, kurer = sozdat_polzovatelya(RolPolzovatelya.kurer)
+
+    async def dobavit(db):
+        def zakaz(status, **polya):
+            return Zakaz(polzovatel_id=klient_id, status=status, summa=0.0, pozitsii=[
+                PozitsiyaZakaza(blyudo_id=blyudo_id, kolichestvo=1, cena_na_moment=cena)
+                for blyudo_id, cena in menyu[:3]
+            ], **polya)
+
+        db.add_all(zakaz(StatusZakaza.zavershen) for _ in range(5))
+        db.add_all(zakaz(StatusZakaza.oformlen, adres_dostavki="adres") for _ in range(5))
+        db.add_all(zakaz(StatusZakaza.v_dostavke, kurer_id=kurer_id) for _ in range(5))
+        db.add(zakaz(StatusZakaza.v_korzine))
+
+    v_bd(dobavit)
+    return {"klient": klient, "kurer": kurer}
+
+
+@pytest.mark.parametrize("url, kto", MARSHRUTY)
+def test_bez_polnykh_prokhodov_i_sortirovok(klient, polzovateli, url, kto):
+    async def sobrat():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            return await plany_marshruta(ac, url, polzovateli.get(kto))
+
+    plany = klient.portal.call(sobrat)
+    assert plany
+    oshibki = [f"{shag}: {sql}" for sql, plan in plany for shag in plan if plokhoj_shag(shag)]
+    assert not oshibki, "\n".join(oshibki)
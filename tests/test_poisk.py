@@ -0,0 +1,91 @@
+"""Поиск: FTS5 на SQLite (префиксы, вес названия, триггеры синхронизации) и поиск
+по подстроке на PostgreSQL (% и _ в запросе — обычные символы)."""
+import pytest
+from sqlalchemy import delete
+
+from database import ETO_SQLITE
+from models import Blyudo, Restoran, RolPolzovatelya
+from routers.poisk_router import _nayti, _nayti_ilike
+
+tolko_sqlite = pytest.mark.skipif(not ETO_SQLITE, reason="FTS5 только в SQLite")
+
+
+def _dobavit(v_bd, *blyuda, restoran="Poisk"):
+    """Блюда (название, описание) в новом ресторане; id ресторана"""
+    async def dobavit(db):
+        zapis = Restoran(nazvanie=restoran, adres="ulitsa 3")
+        db.add(zapis)
+        db.add_all([Blyudo(nazvanie=nazvanie, opisanie=opisanie, cena=1.0, restoran=zapis)
+                    for nazvanie, opisanie in blyuda])
+        await db.flush()
+        return zapis.id
+
+    return v_bd(dobavit)
+
+
+def _nazvaniya(v_bd, zapros: str) -> list[str]:
+    async def nayti(db):
+        return [b.nazvanie for b in await _nayti(db, Blyudo, zapros.split(), 10)]
+
+    return v_bd(nayti)
+
+
+@tolko_sqlite
+def test_fts_prefiksy(klient, v_bd):
+    _dobavit(v_bd, ("Kvazarnyj borshch", "so smetanoj"), ("Kvazarnyj chaj", None), restoran="Kvazarnaya kukhnya")
+
+    otvet = klient.get("/poisk/", params={"q": "kvaz bor"}).json()
+    assert [b["nazvanie"] for b in otvet["blyuda"]] == ["Kvazarnyj borshch"]
+    assert otvet["restorany"] == []
+    assert [r["nazvanie"] for r in klient.get("/poisk/", params={"q": "kvazarn"}).json()["restorany"]] \
+        == ["Kvazarnaya kukhnya"]
+    # Слово в описании тоже ищется; префикс длиннее слова — нет
+    assert _nazvaniya(v_bd, "kvaz smet") == ["Kvazarnyj borshch"]
+    assert _nazvaniya(v_bd, "kvazarnyjx") == []
+
+
+@tolko_sqlite
+def test_fts_nazvanie_vazhnee_opisaniya(v_bd):
+    """Без веса bm25 выше оказалось бы более короткое первое блюдо"""
+    _dobavit(v_bd, ("Obed", "pulsarnyj"), ("Pulsarnyj salat", "svezhij"))
+    assert _nazvaniya(v_bd, "pulsar") == ["Pulsarnyj salat", "Obed"]
+
+
+@tolko_sqlite
+def test_fts_sledit_za_izmeneniyami(klient, v_bd, sozdat_polzovatelya):
+    _, admin = sozdat_polzovatelya(RolPolzovatelya.admin)
+    restoran_id = _dobavit(v_bd)
+
+    otvet = klient.post("/blyuda/", headers=admin,
+                        data={"nazvanie": "Meteoritnyj plov", "cena": "5", "restoran_id": str(restoran_id)})
+    assert otvet.status_code == 200, otvet.text
+    blyudo_id = otvet.json()["id"]
+    assert _nazvaniya(v_bd, "meteorit") == ["Meteoritnyj plov"]
+
+    otvet = klient.put(f"/blyuda/{blyudo_id}", headers=admin,
+                       data={"nazvanie": "Kometnyj plov", "opisanie": "s izyumom"})
+    assert otvet.status_code == 200, otvet.text
+    assert _nazvaniya(v_bd, "meteorit") == []
+    assert _nazvaniya(v_bd, "komet izyum") == ["Kometnyj plov"]
+
+    async def udalit(db):
+        await db.execute(delete(Blyudo).where(Blyudo.id == blyudo_id))
+
+    v_bd(udalit)
+    assert _nazvaniya(v_bd, "komet") == []
+
+
+def test_ilike_ekraniruet_maski(v_bd):
+    async def dobavit(db):
+        restoran = Restoran(nazvanie="Poisk", adres="ulitsa 3")
+        db.add_all([Blyudo(nazvanie=nazvanie, cena=1.0, restoran=restoran)
+                    for nazvanie in ("sup_dnya", "supXdnya", "sup 100%", "sup 1000")])
+
+    v_bd(dobavit)
+
+    async def nayti(db, slova):
+        return sorted(b.nazvanie for b in await _nayti_ilike(db, Blyudo, slova, 10))
+
+    assert v_bd(lambda db: nayti(db, ["sup_dnya"])) == ["sup_dnya"]
+    assert v_bd(lambda db: nayti(db, ["100%"])) == ["sup 100%"]
+    assert v_bd(lambda db: nayti(db, ["SUP", "dnya"])) == ["supXdnya", "sup_dnya"]
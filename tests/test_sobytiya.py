@@ -0,0 +1,83 @@
+"""Брокер событий: рассылка всем подписчикам канала, отключение медленного подписчика,
+удаление пустых каналов; поток не оставляет подписку, если снимок не построился."""
+from fastapi import HTTPException
+
+from models import RolPolzovatelya, StatusZakaza, Zakaz
+from routers import zakazy_router
+from sobytiya import KANAL_KURERY, Broker, _PEREPOLNENIE, broker, kanal_polzovatelya
+
+
+def _sobytiya(ochered) -> list:
+    sobytiya = []
+    while not ochered.empty():
+        sobytiya.append(ochered.get_nowait())
+    return sobytiya
+
+
+def test_rassylka_vsem_podpischikam_kanala():
+    b = Broker()
+    pervyj, vtoroj = b.podpisatsya("a"), b.podpisatsya("a")
+    chuzhoj = b.podpisatsya("b")
+
+    b.opublikovat("a", "novyj", '{"id": 1}')
+    assert _sobytiya(pervyj) == _sobytiya(vtoroj) == [("novyj", '{"id": 1}')]
+    assert _sobytiya(chuzhoj) == []
+
+
+def test_medlennyj_podpischik_otklyuchaetsya():
+    """Переполненная очередь: накопленное выбрасывается, остаётся маркер, подписка снята"""
+    b = Broker(razmer_ocheredi=8)
+    medlennyj = b.podpisatsya("a", razmer_ocheredi=2)
+    bystryj = b.podpisatsya("a")
+
+    for i in range(4):
+        b.opublikovat("a", "status", str(i))
+    assert _sobytiya(medlennyj) == [_PEREPOLNENIE]
+    assert _sobytiya(bystryj) == [("status", str(i)) for i in range(4)]
+
+    b.opublikovat("a", "status", "4")
+    assert _sobytiya(medlennyj) == []
+    assert _sobytiya(bystryj) == [("status", "4")]
+
+
+def test_pustoj_kanal_udalyaetsya():
+    b = Broker()
+    pervyj, vtoroj = b.podpisatsya("a"), b.podpisatsya("a")
+    b.otpisatsya("a", pervyj)
+    assert "a" in b._podpischiki
+    b.otpisatsya("a", vtoroj)
+    b.otpisatsya("a", vtoroj)  # повторная отписка безопасна
+    assert "a" not in b._podpischiki
+
+    # Канал, из которого выпал последний медленный подписчик, тоже удаляется
+    b.podpisatsya("b", razmer_ocheredi=1)
+    b.opublikovat("b", "status", "1")
+    b.opublikovat("b", "status", "2")
+    assert "b" not in b._podpischiki
+
+
+def test_oshibka_snimka_ne_ostavlyaet_podpisku(klient, sozdat_polzovatelya, monkeypatch):
+    _, kurer = sozdat_polzovatelya(RolPolzovatelya.kurer)
+
+    async def upast(db, stroki):
+        raise HTTPException(status_code=503, detail="Baza nedostupna")
+
+    monkeypatch.setattr(zakazy_router, "zakazy_v_dict", upast)
+    bylo = len(broker._podpischiki.get(KANAL_KURERY, ()))
+    assert klient.get("/zakazy/dostupnye-dlya-dostavki/potok", headers=kurer).status_code == 503
+    assert len(broker._podpischiki.get(KANAL_KURERY, ())) == bylo
+
+
+def test_oshibka_snimka_statusov_ne_ostavlyaet_podpisku(klient, sozdat_polzovatelya, v_bd, monkeypatch):
+    polzovatel_id, zagolovki = sozdat_polzovatelya()
+
+    async def oformit(db):
+        db.add(Zakaz(polzovatel_id=polzovatel_id, status=StatusZakaza.oformlen))
+
+    def upast(*zakaz):
+        raise HTTPException(status_code=503, detail="Baza nedostupna")
+
+    v_bd(oformit)
+    monkeypatch.setattr(zakazy_router, "status_json", upast)
+    assert klient.get("/zakazy/status-potok", headers=zagolovki).status_code == 503
+    assert kanal_polzovatelya(polzovatel_id) not in broker._podpischiki
@@ -0,0 +1,33 @@
+"""Фото блюд: вечное кэширование у клиента, маленькие файлы — из памяти, Range — с диска."""
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from staticheskie_fajly import CACHE_CONTROL, FotoStaticFiles
+
+
+@pytest.fixture
+def statika(tmp_path):
+    (tmp_path / "malenkoe.png").write_bytes(b"\x89PNG" + bytes(1000))
+    (tmp_path / "bolshoe.jpg").write_bytes(b"\xff\xd8" + bytes(5000))
+    foto = FotoStaticFiles(directory=tmp_path, maks_razmer_v_pamyati=2000)
+    with TestClient(Starlette(routes=[Mount("/s", foto)])) as klient:
+        yield klient, foto
+
+
+def test_kesh_v_pamyati_tolko_dlya_malenkikh(statika):
+    klient, foto = statika
+    for imya, razmer in (("malenkoe.png", 1004), ("bolshoe.jpg", 5002)):
+        otvet = klient.get(f"/s/{imya}", headers={"Accept-Encoding": "gzip, br"})
+        assert otvet.status_code == 200 and len(otvet.content) == razmer
+        assert otvet.headers["cache-control"] == CACHE_CONTROL
+        assert "content-encoding" not in otvet.headers and "vary" not in otvet.headers
+    assert [put.rsplit("/", 1)[1] for put, *_ in foto._kesh] == ["malenkoe.png"]
+
+
+def test_range_s_diska(statika):
+    klient, _ = statika
+    otvet = klient.get("/s/malenkoe.png", headers={"Range": "bytes=0-3"})
+    assert otvet.status_code == 206
+    assert otvet.content == b"\x89PNG"